@@ -0,0 +1,45 @@
+# -*- coding: UTF-8 -*-
+
+import timeit
+
+import fire
+from loguru import logger
+
+from src.classes.languages import LanguageDetector
+from src.classes.preprocessors import MyPreprocessor
+
+from .timelines import make_timeline
+
+
+def main(tweets: int = 3200, repeat: int = 5, filter_stopwords: bool = False):
+    """
+    Compare step by step and compiled cleaning of a synthetic timeline
+    Exec:
+    python -m benchmarks.clean_timeline --tweets 3200
+    """
+    logger.remove()
+    timeline = make_timeline(tweets)
+    kwargs = {'filter_stopwords': filter_stopwords}
+    stepwise = MyPreprocessor.clean_timeline_stepwise(timeline, **kwargs)
+    compiled = MyPreprocessor.clean_timeline(timeline, **kwargs)
+    assert stepwise['cleaned_tweets'] == compiled['cleaned_tweets']
+    results = {}
+    for name, func in (
+        ('stepwise', MyPreprocessor.clean_timeline_stepwise),
+        ('compiled', MyPreprocessor.clean_timeline),
+    ):
+        results[name] = min(
+            timeit.repeat(
+                lambda: func(timeline, **kwargs),
+                # Languages detected by the assert or previous runs
+                setup=LanguageDetector.clear,
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(f'{name}: {results[name]:.4f}s for {tweets} tweets')
+    print(f'speedup: {results["stepwise"] / results["compiled"]:.2f}x')
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
@@ -0,0 +1,41 @@
+# -*- coding: UTF-8 -*-
+
+import re
+import timeit
+
+import fire
+
+from src.classes.emojis import EMOJIS_SOURCE, compile_emojis_regex, load_table
+
+from .timelines import make_timeline
+
+
+def main(texts: int = 3200, emoji_density: float = 0.3, repeat: int = 5):
+    """
+    Compare the emojis.txt alternation regex with the regex built from the
+    emojis table replacing emojis of synthetic tweets
+    Exec:
+    python -m benchmarks.emojis --texts 3200 --emoji_density 0.3
+    """
+    with open(EMOJIS_SOURCE) as file:
+        alternation = re.compile(file.read().strip())
+    table = compile_emojis_regex(load_table())
+    timeline = make_timeline(texts, emoji_density=emoji_density)
+    samples = [tweet['text'] for tweet in timeline['tweets']]
+    for text in samples:
+        assert alternation.sub('<EMOJI>', text) == table.sub('<EMOJI>', text)
+    results = {}
+    for name, regex in (('alternation', alternation), ('table', table)):
+        results[name] = min(
+            timeit.repeat(
+                lambda: [regex.sub('<EMOJI>', text) for text in samples],
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(f'{name}: {results[name]:.4f}s for {texts} texts')
+    print(f'speedup: {results["alternation"] / results["table"]:.2f}x')
+
+
+if __name__ == '__main__':
+    fire.Fire(main)
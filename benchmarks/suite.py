@@ -0,0 +1,450 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+import platform
+import sys
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+
+import fire
+from loguru import logger
+
+from .timelines import make_timeline
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), 'baselines')
+REGEX_STEPS = (
+    'fix_strange_quotes',
+    'normalize_whitespace',
+    'replace_urls',
+    'replace_mentions',
+    'replace_emails',
+    'replace_currencies',
+    'replace_numbers',
+    'replace_digits',
+    'replace_emojis',
+    'remove_punct',
+    'remove_multiple_spaces',
+)
+ENGINE_NAMES = ('online', 'multicore', 'gibbs')
+
+# Setup of each benchmark by name, returning the function to time, the
+# number of items (tweets or documents) it processes and optionally a
+# function run before each timed run, i.e. to clear caches
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def get_texts(timeline: dict) -> list:
+    return [tweet['text'] for tweet in timeline['tweets']]
+
+
+def get_cleaned_timeline(timeline: dict) -> dict:
+    from src.classes.preprocessors import MyPreprocessor
+
+    return MyPreprocessor.clean_timeline(timeline, filter_stopwords=False)
+
+
+def make_regex_benchmark(step: str):
+    @benchmark(f'regex.{step}')
+    def setup(timeline: dict, **options):
+        from src.classes.preprocessors import MyPreprocessor
+
+        func = getattr(MyPreprocessor, step)
+        texts = get_texts(timeline)
+        return lambda: [func(text) for text in texts], len(texts)
+
+
+for step in REGEX_STEPS:
+    make_regex_benchmark(step)
+
+
+@benchmark('clean_timeline')
+def clean_timeline(timeline: dict, **options):
+    from src.classes.preprocessors import MyPreprocessor
+
+    return (
+        lambda: MyPreprocessor.clean_timeline(timeline, filter_stopwords=False),
+        len(timeline['tweets']),
+    )
+
+
+@benchmark('clean_timeline.stepwise')
+def clean_timeline_stepwise(timeline: dict, **options):
+    from src.classes.preprocessors import MyPreprocessor
+
+    return (
+        lambda: MyPreprocessor.clean_timeline_stepwise(
+            timeline, filter_stopwords=False
+        ),
+        len(timeline['tweets']),
+    )
+
+
+@benchmark('clean_timeline.stopwords')
+def clean_timeline_stopwords(timeline: dict, **options):
+    from src.classes.languages import LanguageDetector
+    from src.classes.preprocessors import MyPreprocessor
+
+    return (
+        lambda: MyPreprocessor.clean_timeline(timeline, filter_stopwords=True),
+        len(timeline['tweets']),
+        # Languages of every run are detected again
+        LanguageDetector.clear,
+    )
+
+
+@benchmark('lda.prepare_data')
+def prepare_data(timeline: dict, min_df: int = 5, **options):
+    from src.classes.lda import LDA
+
+    lda = LDA(None, min_df=min_df)
+    cleaned_timeline = get_cleaned_timeline(timeline)
+    return (
+        lambda: lda.prepare_data(cleaned_timeline),
+        len(cleaned_timeline['cleaned_tweets']),
+    )
+
+
+@benchmark('lda.make_bigrams')
+def make_bigrams(timeline: dict, **options):
+    from src.classes.lda import LDA
+
+    texts = [
+        tweet['text'].split()
+        for tweet in get_cleaned_timeline(timeline)['cleaned_tweets']
+    ]
+    return lambda: list(LDA.make_bigrams(texts)), len(texts)
+
+
+def make_engine_benchmark(name: str):
+    @benchmark(f'engine.{name}')
+    def setup(
+        timeline: dict,
+        n_topics: int = 5,
+        n_passes: int = 5,
+        min_df: int = 5,
+        cores: int = None,
+        **options,
+    ):
+        from src.classes.engines import ENGINES
+        from src.classes.lda import LDA
+
+        engine = ENGINES[name]()
+        engine.set_cores(cores or os.cpu_count() or 1)
+        lda = LDA(None, min_df=min_df)
+        bow, dictionary = lda.prepare_data(get_cleaned_timeline(timeline))
+        return (
+            lambda: engine.infer(bow, dictionary, n_topics, n_passes),
+            len(bow),
+        )
+
+
+for name in ENGINE_NAMES:
+    make_engine_benchmark(name)
+
+
+class NoModels:
+    """
+    Model bucket of the in-memory stand-in, since GridFS only accepts
+    pymongo databases and round trips never save models
+    """
+
+    @staticmethod
+    def find(query: dict) -> list:
+        return []
+
+
+@contextmanager
+def use_mongo_client(client, mongo_url: str, mongo_port: int):
+    """
+    Make backends use ``client`` as the client cached for their server,
+    restoring the clients and checked databases of the process afterwards
+    """
+    from src.classes.backends import MongoBackend
+
+    # Shared by every backend layout
+    clients = MongoBackend._clients
+    checked_dbs = MongoBackend._checked_dbs
+    previous = dict(clients), set(checked_dbs)
+    clients[(mongo_url, mongo_port)] = client
+    try:
+        yield
+    finally:
+        clients.clear()
+        clients.update(previous[0])
+        checked_dbs.clear()
+        checked_dbs.update(previous[1])
+
+
+def get_mongo_client(mongo: str, mongo_url: str, mongo_port: int):
+    """
+    :param mongo: 'mock' for an in-memory stand-in, which needs mongomock,
+    or 'local' for the mongod at ``mongo_url`` and ``mongo_port``. Times of
+    the stand-in are only comparable between runs with the stand-in
+    """
+    if mongo == 'mock':
+        # Only needed to benchmark backends without a Mongo server
+        import mongomock
+
+        return mongomock.MongoClient()
+    import pymongo
+
+    return pymongo.MongoClient(mongo_url, mongo_port)
+
+
+def make_backend_benchmark(layout: str, backend_name: str):
+    @benchmark(f'mongo.{layout}')
+    def setup(
+        timeline: dict,
+        mongo: str = 'mock',
+        mongo_url: str = 'localhost',
+        mongo_port: int = 27017,
+        **options,
+    ):
+        """
+        Round trip of a timeline: insert it, read it, save its cleaned
+        tweets, read them and delete the timeline
+        """
+        from src.classes import backends
+
+        backend_class = getattr(backends, backend_name)
+        if mongo == 'mock':
+            backend_class = type(
+                backend_class.__name__,
+                (backend_class,),
+                {'model_bucket': NoModels()},
+            )
+        client = get_mongo_client(mongo, mongo_url, mongo_port)
+        backend = backend_class(mongo_url, mongo_port, 'profiler_benchmark')
+        user = timeline['user']
+        cleaned_tweets = get_cleaned_timeline(timeline)['cleaned_tweets']
+
+        def round_trip():
+            # Backends reuse the client cached for their server
+            with use_mongo_client(client, mongo_url, mongo_port), backend:
+                backend.delete_timeline(user)
+                backend.insert_timeline(
+                    {'user': user, 'tweets': timeline['tweets']}
+                )
+                backend.get_timeline(user)
+                backend.update_timeline(
+                    user, {'cleaned_tweets': cleaned_tweets}
+                )
+                backend.get_timeline(user, ['cleaned_tweets'])
+                backend.delete_timeline(user)
+
+        return round_trip, len(timeline['tweets'])
+
+
+make_backend_benchmark('timeline', 'MongoBackend')
+make_backend_benchmark('tweet', 'MongoTweetsBackend')
+
+
+def get_metadata(**options) -> dict:
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        **options,
+    }
+
+
+def get_path(name: str) -> str:
+    if os.path.dirname(name) or name.endswith('.json'):
+        return name
+    return os.path.join(BASELINES_PATH, f'{name}.json')
+
+
+def load_results(name: str) -> dict:
+    with open(get_path(name)) as file:
+        return json.load(file)
+
+
+def save_results(results: dict, name: str) -> str:
+    path = get_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write('\n')
+    return path
+
+
+def run_benchmarks(
+    only: str = None,
+    tweets: int = 3200,
+    seed: int = 0,
+    repeat: int = 5,
+    languages: dict = None,
+    url_density: float = 0.05,
+    emoji_density: float = 0.05,
+    mention_density: float = 0.05,
+    **options,
+) -> dict:
+    """
+    :param only: Comma separated prefixes of the benchmarks to run
+    :param languages: Weight of each language of the synthetic tweets
+    :return: Metadata of the run, best time and throughput of each
+    benchmark and the error of each failed one
+    """
+    timeline = make_timeline(
+        tweets,
+        seed,
+        languages,
+        url_density=url_density,
+        emoji_density=emoji_density,
+        mention_density=mention_density,
+    )
+    if isinstance(only, str):
+        only = only.split(',')
+    elif only:
+        only = list(only)
+    results = {}
+    skipped = {}
+    for name, setup in BENCHMARKS.items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        try:
+            func, items, *reset = setup(timeline, **options)
+            best = min(
+                timeit.repeat(
+                    func,
+                    setup=reset[0] if reset else 'pass',
+                    number=1,
+                    repeat=repeat,
+                )
+            )
+        except Exception as e:
+            skipped[name] = f'{type(e).__name__}: {e}'
+            print(f'{name:36} skipped: {skipped[name]}')
+            continue
+        results[name] = {
+            'time': best,
+            'items': items,
+            'throughput': items / max(best, 1e-9),
+        }
+        print(
+            f'{name:36} {best:10.4f}s '
+            f'{results[name]["throughput"]:14.1f} items/s'
+        )
+    return {
+        'metadata': get_metadata(
+            tweets=tweets,
+            seed=seed,
+            repeat=repeat,
+            languages=languages,
+            url_density=url_density,
+            emoji_density=emoji_density,
+            mention_density=mention_density,
+            **options,
+        ),
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare_results(
+    baseline: dict, current: dict, tolerance: float = 0.1
+) -> list:
+    """
+    :return: Names of the benchmarks of both runs whose time is more than
+    ``tolerance`` times slower than in ``baseline``, and of the benchmarks
+    of ``baseline`` that failed in ``current``
+    """
+    regressions = []
+    skipped = current.get('skipped', {})
+    for name, error in skipped.items():
+        failed = name in baseline['results']
+        if failed:
+            regressions.append(name)
+        print(f'{name:36} skipped: {error}{"  REGRESSION" if failed else ""}')
+    for name in baseline['results']:
+        if name not in current['results'] and name not in skipped:
+            print(f'{name:36} not run')
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        ratio = result['time'] / baseline['results'][name]['time']
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+        print(
+            f'{name:36} {ratio:6.2f}x time'
+            f'{"  REGRESSION" if regressed else ""}'
+        )
+    return regressions
+
+
+class Suite:
+    @staticmethod
+    def names():
+        """
+        Exec:
+        python -m benchmarks.suite names
+        """
+        for name in BENCHMARKS:
+            print(name)
+
+    @staticmethod
+    def run(
+        save: str = 'latest',
+        compare: str = None,
+        tolerance: float = 0.1,
+        **kwargs,
+    ):
+        """
+        Run the benchmarks on a synthetic timeline and save the results as
+        a JSON baseline, by name in benchmarks/baselines or at a path
+        :param compare: Baseline to compare the results with, exits with
+        an error if there are regressions
+        Exec:
+        python -m benchmarks.suite run --only regex,clean_timeline --save base
+        python -m benchmarks.suite run --languages '{es: 3, en: 1}'
+        python -m benchmarks.suite run --mongo local --mongo_url mongodb
+        python -m benchmarks.suite run --compare base --tolerance 0.2
+        """
+        logger.remove()
+        results = run_benchmarks(**kwargs)
+        if save:
+            print(f'Results saved at {save_results(results, save)}')
+        if compare:
+            Suite.exit(
+                compare_results(load_results(compare), results, tolerance)
+            )
+
+    @staticmethod
+    def compare(baseline: str, current: str = 'latest', tolerance: float = 0.1):
+        """
+        Compare two saved runs and exit with an error if ``current`` has
+        regressions
+        Exec:
+        python -m benchmarks.suite compare base latest --tolerance 0.2
+        """
+        Suite.exit(
+            compare_results(
+                load_results(baseline), load_results(current), tolerance
+            )
+        )
+
+    @staticmethod
+    def exit(regressions: list):
+        if regressions:
+            print(
+                f'{len(regressions)} regressions or failures: '
+                f'{", ".join(regressions)}'
+            )
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    fire.Fire(Suite)
@@ -0,0 +1,111 @@
+# -*- coding: UTF-8 -*-
+
+import random
+from datetime import datetime, timedelta
+
+LANGUAGE_WORDS = {
+    'es': (
+        'hola que tal el partido de hoy ha sido increíble gracias a todos '
+        'nos vemos mañana en la playa con los amigos para celebrar el gol'
+    ).split(),
+    'ca': (
+        'avui fem una festa a casa bon dia a tothom quina calor que fa '
+        'aquesta nit anirem al concert de la plaça amb els companys'
+    ).split(),
+    'en': (
+        'the game tonight was amazing thanks everyone new post about python '
+        'and data science check it out what a great day for a long walk'
+    ).split(),
+}
+URLS = (
+    'https://t.co/aBc123XyZ',
+    'http://example.com/a?b=1',
+    'www.pou.dev/blog',
+)
+EMOJIS = ('😀', '🇪🇸', '🎉', '⚽', '❤', '🙏', '🔥', '✅', '👏', '😂')
+MENTIONS = ('@joanfont', '@vidamoderna', '@python_es', '@benchmark')
+# Tokens of the rest of cleaning steps
+OTHERS = (
+    'test@test.com',
+    '15€',
+    '$20',
+    '3,200',
+    '12.5',
+    '!!!',
+    '¿',
+    '...',
+    '#python',
+    '“quoted”',
+)
+
+
+def make_tweet(
+    rand: random.Random,
+    words: list,
+    url_density: float,
+    emoji_density: float,
+    mention_density: float,
+    other_density: float,
+) -> str:
+    """
+    :param words: Vocabulary of the tweet
+    :return: Tweet where each token is a URL, emoji, mention or another
+    special token with its density as probability, or else a word
+    """
+    tokens = []
+    for _ in range(rand.randint(5, 25)):
+        value = rand.random()
+        for kind, density in (
+            (URLS, url_density),
+            (EMOJIS, emoji_density),
+            (MENTIONS, mention_density),
+            (OTHERS, other_density),
+        ):
+            if value < density:
+                tokens.append(rand.choice(kind))
+                break
+            value -= density
+        else:
+            tokens.append(rand.choice(words))
+    return ' '.join(tokens)
+
+
+def make_timeline(
+    n_tweets: int = 3200,
+    seed: int = 0,
+    languages: dict = None,
+    url_density: float = 0.05,
+    emoji_density: float = 0.05,
+    mention_density: float = 0.05,
+    other_density: float = 0.05,
+    user: str = '@benchmark',
+) -> dict:
+    """
+    Make the same timeline for the same arguments
+    :param languages: Weight of each language of LANGUAGE_WORDS in tweets,
+    the same for every language by default
+    """
+    rand = random.Random(seed)
+    languages = languages or dict.fromkeys(LANGUAGE_WORDS, 1)
+    names = list(languages)
+    weights = [languages[name] for name in names]
+    newest = datetime(2020, 11, 1)
+    tweets = []
+    for i in range(n_tweets):
+        lang = rand.choices(names, weights)[0]
+        text = make_tweet(
+            rand,
+            LANGUAGE_WORDS[lang],
+            url_density,
+            emoji_density,
+            mention_density,
+            other_density,
+        )
+        tweets.append(
+            {
+                'id': n_tweets - i,
+                'created_at': newest - timedelta(minutes=i * 37),
+                'text': text,
+            }
+        )
+    return {'user': user, 'tweets': tweets}
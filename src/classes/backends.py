@@ -1,13 +1,29 @@
 # -*- coding: UTF-8 -*-
 
+import os
+import threading
 from abc import ABC, abstractmethod, abstractproperty
+from datetime import datetime
+from itertools import islice
 
+import gridfs
 import pymongo
+from gridfs.errors import NoFile
 from loguru import logger
+from pymongo.errors import BulkWriteError
 
 from .exceptions import DatabaseDoesNotExist
 
 
+def batches(iterable: iter, size: int) -> iter:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
 class Backend(ABC):
     def __repr__(self):
         return self.name
@@ -29,8 +45,10 @@ class Backend(ABC):
         pass
 
     @abstractmethod
-    def get_timeline(self, user: str):
+    def get_timeline(self, user: str, fields: list = None):
         """
+        :param fields: Fields to get, as 'cleaned_tweets' or
+        'cleaned_tweets.text', or all of them if None
         :return:
         {
             'user': 'x',
@@ -55,13 +73,131 @@ class Backend(ABC):
     def delete_timeline(self, user: str):
         pass
 
+    @abstractmethod
+    def get_newest_tweet_id(self, user: str):
+        pass
+
+    @abstractmethod
+    def append_tweets(self, user: str, tweets: list):
+        """
+        Add ``tweets``, newer than the stored ones, to ``user`` timeline
+        """
+        pass
+
+    @abstractmethod
+    def save_model(
+        self, user: str, key: str, model: bytes, metadata: dict = None
+    ):
+        """
+        Save a serialized ``model`` of ``user`` without rewriting the rest
+        of the timeline
+        :param metadata: Fields saved with the model size and dates
+        """
+        pass
+
+    @abstractmethod
+    def load_model(self, user: str, key: str) -> bytes:
+        """
+        Load a model and mark it as used
+        :return: Serialized model or None if it is not saved
+        """
+        pass
+
+    @abstractmethod
+    def list_models(self) -> list:
+        """
+        :return: Saved models of all users
+        [
+            {'user': 'x', 'key': 'y', 'size': 1024, 'last_used': datetime},
+            ...
+        ]
+        """
+        pass
+
+    @abstractmethod
+    def delete_model(self, user: str, key: str):
+        pass
+
+    def insert_timelines(self, timelines: list) -> list:
+        return [self.insert_timeline(timeline) for timeline in timelines]
+
+    def get_timelines(self, users: list, fields: list = None) -> dict:
+        """
+        :return: Saved timelines by user, with only ``fields`` if given
+        """
+        timelines = {}
+        for user in users:
+            timeline = self.get_timeline(user, fields)
+            if timeline:
+                timelines[user] = timeline
+        return timelines
+
+    def update_timelines(self, new_values: dict):
+        """
+        :param new_values: New values of the timeline by user
+        """
+        for user, values in new_values.items():
+            self.update_timeline(user, values)
+
+    def iter_tweets(
+        self, user: str, field: str = 'tweets', batch_size: int = 1000
+    ) -> iter:
+        """
+        Iterate ``field`` tweets of ``user`` reading ``batch_size`` tweets
+        at once when the backend allows it
+        """
+        timeline = self.get_timeline(user, [field]) or {}
+        yield from timeline.get(field, [])
+
+    def write_tweets(
+        self, user: str, field: str, tweets: iter, batch_size: int = 1000
+    ) -> int:
+        """
+        Replace ``field`` tweets of ``user`` writing ``batch_size`` tweets
+        at once when the backend allows it
+        :return: Number of written tweets
+        """
+        tweets = list(tweets)
+        self.update_timeline(user, {field: tweets})
+        return len(tweets)
+
     def exists_timeline(self, user: str) -> bool:
-        if self.get_timeline(user):
+        if self.get_timeline(user, ['user']):
             return True
         return False
 
+    def get_timeline_metadata(self, user: str) -> dict:
+        """
+        :return: Size of the timeline without reading it, or None if it does
+        not exist
+        {
+            'user': 'x',
+            'tweets': 3200,
+            'cleaned_tweets': 3150,
+            'models': ['x-t5-p20', ...],
+        }
+        """
+        timeline = self.get_timeline(user)
+        if not timeline:
+            return None
+        return {
+            'user': user,
+            'tweets': len(timeline.get('tweets', [])),
+            'cleaned_tweets': len(timeline.get('cleaned_tweets', [])),
+            'models': list(timeline.get('models', {})),
+        }
+
 
 class MongoBackend(Backend):
+    """
+    Backends of a process share one connection pool per server, which is
+    reused across context entries and created again after a fork
+    """
+
+    _clients = {}
+    _checked_dbs = set()
+    _clients_lock = threading.Lock()
+
     def __init__(
         self,
         mongo_url: str,
@@ -82,10 +218,48 @@ class MongoBackend(Backend):
     def timeline_collection(self):
         return self.db.timelines
 
+    @property
+    def model_bucket(self):
+        return gridfs.GridFSBucket(self.db, bucket_name='models')
+
+    @classmethod
+    def get_client(cls, url: str, port: str) -> pymongo.MongoClient:
+        with cls._clients_lock:
+            try:
+                return cls._clients[(url, port)]
+            except KeyError:
+                client = cls._clients[(url, port)] = pymongo.MongoClient(
+                    url, port
+                )
+                return client
+
+    @staticmethod
+    def reset_clients():
+        """
+        Forget the clients of the parent process, MongoClient is not fork
+        safe
+        """
+        # Set on MongoBackend so they keep being shared by all the layouts
+        MongoBackend._clients = {}
+        MongoBackend._checked_dbs = set()
+        MongoBackend._clients_lock = threading.Lock()
+
+    @staticmethod
+    def close_clients():
+        for client in MongoBackend._clients.values():
+            client.close()
+        MongoBackend.reset_clients()
+
     @logger.catch
     def __enter__(self):
-        self.client = pymongo.MongoClient(self.url, self.port)
-        self.db = self.get_db()
+        self.client = self.get_client(self.url, self.port)
+        key = (self.name, self.url, self.port, self.db_name)
+        if key in self._checked_dbs:
+            self.db = self.client[self.db_name]
+        else:
+            self.db = self.get_db()
+            self.prepare_db()
+            self._checked_dbs.add(key)
         return self
 
     def get_db(self):
@@ -101,23 +275,602 @@ class MongoBackend(Backend):
             logger.info('Database doesn\'t exist, it will be created')
         return self.client[self.db_name]
 
-    @logger.catch
+    def prepare_db(self):
+        """
+        Create the indexes of the layout, once per process
+        """
+        pass
+
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.client.close()
+        # The client is kept open to be reused by the next context entry
+        pass
 
     def insert_timeline(self, timeline: dict) -> int:
         logger.info(f'Inserting {len(timeline["tweets"])} tweets with {self}')
         result = self.timeline_collection.insert_one(timeline)
         return result.inserted_id
 
-    def get_timeline(self, user: str) -> dict:
-        return self.timeline_collection.find_one({'user': user})
+    def insert_timelines(self, timelines: list) -> list:
+        if not timelines:
+            return []
+        logger.info(f'Inserting {len(timelines)} timelines with {self}')
+        result = self.timeline_collection.insert_many(timelines, ordered=False)
+        return result.inserted_ids
+
+    def get_timeline(self, user: str, fields: list = None) -> dict:
+        projection = ['user', *fields] if fields else None
+        return self.timeline_collection.find_one({'user': user}, projection)
+
+    def exists_timeline(self, user: str) -> bool:
+        return bool(
+            self.timeline_collection.count_documents({'user': user}, limit=1)
+        )
+
+    def get_timeline_metadata(self, user: str) -> dict:
+        result = list(
+            self.timeline_collection.aggregate(
+                [
+                    {'$match': {'user': user}},
+                    {
+                        '$project': {
+                            '_id': False,
+                            'user': True,
+                            'tweets': {'$size': {'$ifNull': ['$tweets', []]}},
+                            'cleaned_tweets': {
+                                '$size': {'$ifNull': ['$cleaned_tweets', []]}
+                            },
+                            'models': {
+                                '$map': {
+                                    'input': {
+                                        '$objectToArray': {
+                                            '$ifNull': ['$models', {}]
+                                        }
+                                    },
+                                    'in': '$$this.k',
+                                }
+                            },
+                        }
+                    },
+                ]
+            )
+        )
+        return result[0] if result else None
+
+    def get_timelines(self, users: list, fields: list = None) -> dict:
+        projection = ['user', *fields] if fields else None
+        cursor = self.timeline_collection.find(
+            {'user': {'$in': list(users)}}, projection
+        )
+        return {timeline['user']: timeline for timeline in cursor}
 
     def update_timeline(self, user: str, new_values: dict):
         logger.info(f'Updating {user} timeline')
         query = {'user': user}
         self.timeline_collection.update_one(query, {'$set': new_values})
 
+    def update_timelines(self, new_values: dict):
+        if not new_values:
+            return
+        logger.info(f'Updating {len(new_values)} timelines')
+        self.timeline_collection.bulk_write(
+            [
+                pymongo.UpdateOne({'user': user}, {'$set': values})
+                for user, values in new_values.items()
+            ],
+            ordered=False,
+        )
+
     def delete_timeline(self, user: str):
         logger.info(f'Deleting {user} timeline')
         self.timeline_collection.remove({'user': user})
+        self.delete_models(user)
+
+    def get_newest_tweet_id(self, user: str):
+        result = list(
+            self.timeline_collection.aggregate(
+                [
+                    {'$match': {'user': user}},
+                    {'$project': {'newest_id': {'$max': '$tweets.id'}}},
+                ]
+            )
+        )
+        return result[0]['newest_id'] if result else None
+
+    def append_tweets(self, user: str, tweets: list):
+        logger.info(f'Appending {len(tweets)} tweets to {user} timeline')
+        # Tweets are stored from newest to oldest
+        self.timeline_collection.update_one(
+            {'user': user},
+            {'$push': {'tweets': {'$each': tweets, '$position': 0}}},
+        )
+
+    def iter_tweets(
+        self, user: str, field: str = 'tweets', batch_size: int = 1000
+    ) -> iter:
+        yield from self.timeline_collection.aggregate(
+            [
+                {'$match': {'user': user}},
+                {'$unwind': f'${field}'},
+                {'$replaceRoot': {'newRoot': f'${field}'}},
+            ],
+            batchSize=batch_size,
+        )
+
+    def write_tweets(
+        self, user: str, field: str, tweets: iter, batch_size: int = 1000
+    ) -> int:
+        query = {'user': user}
+        self.timeline_collection.update_one(query, {'$set': {field: []}})
+        written = 0
+        for batch in batches(tweets, batch_size):
+            self.timeline_collection.update_one(
+                query, {'$push': {field: {'$each': batch}}}
+            )
+            written += len(batch)
+        return written
+
+    def get_model_metadata(self, user: str, key: str):
+        timeline = self.timeline_collection.find_one(
+            {'user': user}, {f'models.{key}': True}
+        )
+        return ((timeline or {}).get('models') or {}).get(key)
+
+    def set_model_metadata(self, user: str, key: str, metadata: dict):
+        self.timeline_collection.update_one(
+            {'user': user}, {'$set': {f'models.{key}': metadata}}
+        )
+
+    def update_model_metadata(self, user: str, key: str, values: dict):
+        self.timeline_collection.update_one(
+            {'user': user},
+            {
+                '$set': {
+                    f'models.{key}.{field}': value
+                    for field, value in values.items()
+                }
+            },
+        )
+
+    def unset_model_metadata(self, user: str, key: str):
+        self.timeline_collection.update_one(
+            {'user': user}, {'$unset': {f'models.{key}': True}}
+        )
+
+    def save_model(
+        self, user: str, key: str, model: bytes, metadata: dict = None
+    ):
+        logger.info(f'Saving {key} model ({len(model)} bytes) with {self}')
+        previous = self.get_model_metadata(user, key)
+        file_id = self.model_bucket.upload_from_stream(
+            key, model, metadata={'user': user}
+        )
+        now = datetime.utcnow()
+        self.set_model_metadata(
+            user,
+            key,
+            {
+                'file_id': file_id,
+                'size': len(model),
+                'saved_at': now,
+                'last_used': now,
+                **(metadata or {}),
+            },
+        )
+        if isinstance(previous, dict):
+            self.delete_model_file(previous['file_id'])
+
+    def load_model(self, user: str, key: str) -> bytes:
+        metadata = self.get_model_metadata(user, key)
+        if metadata is None:
+            return None
+        if isinstance(metadata, bytes):
+            # Model saved inside the timeline document by older versions
+            return metadata
+        self.update_model_metadata(user, key, {'last_used': datetime.utcnow()})
+        return self.model_bucket.open_download_stream(
+            metadata['file_id']
+        ).read()
+
+    def iter_model_metadata(self) -> iter:
+        """
+        Iterate (user, key, metadata) of all saved models
+        """
+        timelines = self.timeline_collection.find(
+            {'models': {'$exists': True}}, ['user', 'models']
+        )
+        for timeline in timelines:
+            for key, metadata in timeline['models'].items():
+                yield timeline['user'], key, metadata
+
+    def list_models(self) -> list:
+        models = []
+        for user, key, metadata in self.iter_model_metadata():
+            if isinstance(metadata, bytes):
+                metadata = {'size': len(metadata)}
+            models.append(
+                {
+                    'user': user,
+                    'key': key,
+                    'size': metadata.get('size', 0),
+                    'last_used': metadata.get(
+                        'last_used', metadata.get('saved_at', datetime.min)
+                    ),
+                }
+            )
+        return models
+
+    def delete_model(self, user: str, key: str):
+        logger.info(f'Deleting {key} model of {user}')
+        metadata = self.get_model_metadata(user, key)
+        self.unset_model_metadata(user, key)
+        if isinstance(metadata, dict):
+            self.delete_model_file(metadata['file_id'])
+
+    def delete_model_file(self, file_id):
+        try:
+            self.model_bucket.delete(file_id)
+        except NoFile:
+            # Already deleted by another writer
+            pass
+
+    def delete_models(self, user: str):
+        for file in self.model_bucket.find({'metadata.user': user}):
+            self.delete_model_file(file._id)
+
+
+class MongoTweetsBackend(MongoBackend):
+    """
+    Mongo layout with a document per tweet instead of per timeline, so big
+    timelines do not reach the document size limit and parts of them can
+    be read alone. Collections:
+    - users: timeline fields other than tweets, cleaned tweets and models
+    - tweets and cleaned_tweets: {'user', 'id', 'created_at', 'text'}
+    - models: {'user', 'key', 'file_id', 'size', 'saved_at'} with the
+      model bytes saved in GridFS
+    """
+
+    TWEET_FIELDS = ('tweets', 'cleaned_tweets')
+    SPLIT_FIELDS = ('_id', 'tweets', 'cleaned_tweets', 'models')
+
+    @property
+    def name(self):
+        return 'Mongo tweets backend'
+
+    @property
+    def user_collection(self):
+        return self.db.users
+
+    @property
+    def model_collection(self):
+        return self.db.models
+
+    def prepare_db(self):
+        self.user_collection.create_index('user', unique=True)
+        for field in self.TWEET_FIELDS:
+            self.db[field].create_index(
+                [('user', pymongo.ASCENDING), ('id', pymongo.DESCENDING)],
+                unique=True,
+            )
+            self.db[field].create_index(
+                [('user', pymongo.ASCENDING), ('created_at', pymongo.ASCENDING)]
+            )
+        self.model_collection.create_index(
+            [('user', pymongo.ASCENDING), ('key', pymongo.ASCENDING)],
+            unique=True,
+        )
+
+    @staticmethod
+    def to_documents(user: str, tweets: list) -> list:
+        return [{'user': user, **tweet} for tweet in tweets]
+
+    @staticmethod
+    def insert_documents(collection, documents: list) -> list:
+        """
+        Insert ``documents``, skipping the ones already saved
+        :return: Inserted documents, with the ids they were given
+        """
+        if not documents:
+            return []
+        skipped = set()
+        try:
+            collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            skipped = {error['index'] for error in errors}
+        return [
+            document for i, document in enumerate(documents) if i not in skipped
+        ]
+
+    def insert_tweets(self, field: str, user: str, tweets: list):
+        if tweets:
+            self.insert_documents(
+                self.db[field], self.to_documents(user, tweets)
+            )
+
+    def get_projections(self, fields: list = None):
+        """
+        Split timeline ``fields`` in the projection of the users collection,
+        the projections of the requested tweet collections and whether
+        models are requested
+        """
+        if not fields:
+            return (
+                None,
+                {field: {'_id': False} for field in self.TWEET_FIELDS},
+                True,
+            )
+        user_projection = ['user']
+        tweet_projections = {}
+        for field in fields:
+            name, _, subfield = field.partition('.')
+            if name in self.TWEET_FIELDS:
+                projection = tweet_projections.setdefault(name, {'_id': False})
+                if subfield:
+                    projection.update({'user': True, subfield: True})
+            elif name not in self.SPLIT_FIELDS:
+                user_projection.append(field)
+        for field in self.TWEET_FIELDS:
+            # A whole collection was requested
+            if field in fields:
+                tweet_projections[field] = {'_id': False}
+        return user_projection, tweet_projections, 'models' in fields
+
+    def get_tweets(self, field: str, user: str, projection: dict) -> list:
+        # Newest tweets first, as timelines are downloaded
+        tweets = list(
+            self.db[field]
+            .find({'user': user}, projection)
+            .sort('id', pymongo.DESCENDING)
+        )
+        for tweet in tweets:
+            tweet.pop('user', None)
+        return tweets
+
+    @staticmethod
+    def to_metadata(model: dict) -> dict:
+        return {
+            field: value
+            for field, value in model.items()
+            if field not in ('_id', 'user', 'key')
+        }
+
+    def get_models(self, user: str) -> dict:
+        return {
+            model['key']: self.to_metadata(model)
+            for model in self.model_collection.find({'user': user})
+        }
+
+    def set_models(self, user: str, models: dict):
+        self.model_collection.delete_many(
+            {'user': user, 'key': {'$nin': list(models)}}
+        )
+        for key, model in models.items():
+            if isinstance(model, bytes):
+                # Serialized model of the document per timeline layout
+                self.save_model(user, key, model)
+            else:
+                self.set_model_metadata(user, key, model)
+
+    def get_model_metadata(self, user: str, key: str):
+        model = self.model_collection.find_one({'user': user, 'key': key})
+        return self.to_metadata(model) if model else None
+
+    def set_model_metadata(self, user: str, key: str, metadata: dict):
+        self.model_collection.update_one(
+            {'user': user, 'key': key}, {'$set': metadata}, upsert=True
+        )
+
+    def update_model_metadata(self, user: str, key: str, values: dict):
+        self.model_collection.update_one(
+            {'user': user, 'key': key}, {'$set': values}
+        )
+
+    def unset_model_metadata(self, user: str, key: str):
+        self.model_collection.delete_one({'user': user, 'key': key})
+
+    def iter_model_metadata(self) -> iter:
+        for model in self.model_collection.find():
+            yield model['user'], model['key'], self.to_metadata(model)
+
+    def insert_timeline(self, timeline: dict) -> int:
+        """
+        Insert the tweets and models of ``timeline`` before its user, so a
+        timeline with a user document is complete
+        """
+        logger.info(f'Inserting {len(timeline["tweets"])} tweets with {self}')
+        user = timeline['user']
+        for field in self.TWEET_FIELDS:
+            self.insert_tweets(field, user, timeline.get(field))
+        if timeline.get('models'):
+            self.set_models(user, timeline['models'])
+        result = self.user_collection.insert_one(
+            {
+                field: value
+                for field, value in timeline.items()
+                if field not in self.SPLIT_FIELDS
+            }
+        )
+        return result.inserted_id
+
+    def get_timeline(self, user: str, fields: list = None) -> dict:
+        user_projection, tweet_projections, with_models = self.get_projections(
+            fields
+        )
+        timeline = self.user_collection.find_one(
+            {'user': user}, user_projection
+        )
+        if not timeline:
+            return None
+        for field, projection in tweet_projections.items():
+            tweets = self.get_tweets(field, user, projection)
+            if tweets or field == 'tweets':
+                timeline[field] = tweets
+        if with_models:
+            models = self.get_models(user)
+            if models:
+                timeline['models'] = models
+        return timeline
+
+    def exists_timeline(self, user: str) -> bool:
+        return bool(
+            self.user_collection.count_documents({'user': user}, limit=1)
+        )
+
+    def iter_tweets(
+        self, user: str, field: str = 'tweets', batch_size: int = 1000
+    ) -> iter:
+        yield from (
+            self.db[field]
+            .find({'user': user}, {'_id': False, 'user': False})
+            .sort('id', pymongo.DESCENDING)
+            .batch_size(batch_size)
+        )
+
+    def write_tweets(
+        self, user: str, field: str, tweets: iter, batch_size: int = 1000
+    ) -> int:
+        self.db[field].delete_many({'user': user})
+        written = 0
+        for batch in batches(tweets, batch_size):
+            self.insert_tweets(field, user, batch)
+            written += len(batch)
+        return written
+
+    def get_timeline_metadata(self, user: str) -> dict:
+        if not self.exists_timeline(user):
+            return None
+        return {
+            'user': user,
+            **{
+                field: self.db[field].count_documents({'user': user})
+                for field in self.TWEET_FIELDS
+            },
+            'models': self.model_collection.distinct('key', {'user': user}),
+        }
+
+    def update_timeline(self, user: str, new_values: dict):
+        logger.info(f'Updating {user} timeline')
+        for field in self.TWEET_FIELDS:
+            if field in new_values:
+                self.db[field].delete_many({'user': user})
+                self.insert_tweets(field, user, new_values[field])
+        if 'models' in new_values:
+            self.set_models(user, new_values['models'])
+        values = {
+            field: value
+            for field, value in new_values.items()
+            if field not in self.SPLIT_FIELDS
+        }
+        if values:
+            self.user_collection.update_one({'user': user}, {'$set': values})
+
+    def update_timelines(self, new_values: dict):
+        for user, values in new_values.items():
+            self.update_timeline(user, values)
+
+    def get_timelines(self, users: list, fields: list = None) -> dict:
+        user_projection, tweet_projections, with_models = self.get_projections(
+            fields
+        )
+        timelines = {
+            timeline['user']: timeline
+            for timeline in self.user_collection.find(
+                {'user': {'$in': list(users)}}, user_projection
+            )
+        }
+        query = {'user': {'$in': list(timelines)}}
+        for field, projection in tweet_projections.items():
+            if field == 'tweets':
+                for timeline in timelines.values():
+                    timeline['tweets'] = []
+            tweets = (
+                self.db[field]
+                .find(query, projection)
+                .sort([('user', pymongo.ASCENDING), ('id', pymongo.DESCENDING)])
+            )
+            for tweet in tweets:
+                timeline = timelines[tweet.pop('user')]
+                timeline.setdefault(field, []).append(tweet)
+        if with_models:
+            for model in self.model_collection.find(query):
+                timeline = timelines[model['user']]
+                timeline.setdefault('models', {})[model['key']] = (
+                    self.to_metadata(model)
+                )
+        return timelines
+
+    def insert_timelines(self, timelines: list) -> list:
+        if not timelines:
+            return []
+        logger.info(f'Inserting {len(timelines)} timelines with {self}')
+        for field in self.TWEET_FIELDS:
+            self.insert_documents(
+                self.db[field],
+                [
+                    document
+                    for timeline in timelines
+                    for document in self.to_documents(
+                        timeline['user'], timeline.get(field) or []
+                    )
+                ],
+            )
+        for timeline in timelines:
+            if timeline.get('models'):
+                self.set_models(timeline['user'], timeline['models'])
+        users = self.insert_documents(
+            self.user_collection,
+            [
+                {
+                    field: value
+                    for field, value in timeline.items()
+                    if field not in self.SPLIT_FIELDS
+                }
+                for timeline in timelines
+            ],
+        )
+        return [user['_id'] for user in users]
+
+    def delete_timeline(self, user: str):
+        logger.info(f'Deleting {user} timeline')
+        for collection in (
+            self.user_collection,
+            self.db.tweets,
+            self.db.cleaned_tweets,
+            self.model_collection,
+        ):
+            collection.delete_many({'user': user})
+        self.delete_models(user)
+
+    def get_newest_tweet_id(self, user: str):
+        tweet = self.db.tweets.find_one(
+            {'user': user}, {'id': True}, sort=[('id', pymongo.DESCENDING)]
+        )
+        return tweet['id'] if tweet else None
+
+    def append_tweets(self, user: str, tweets: list):
+        logger.info(f'Appending {len(tweets)} tweets to {user} timeline')
+        self.insert_tweets('tweets', user, tweets)
+
+    def migrate(self, batch_size: int = 100) -> int:
+        """
+        Copy the timelines saved with the document per timeline layout of
+        MongoBackend which are not in this layout yet. Users are written
+        after their tweets, so timelines of an interrupted migration are
+        completed when it runs again
+        :return: Number of migrated timelines
+        """
+        migrated = 0
+        for timeline in self.timeline_collection.find(batch_size=batch_size):
+            if self.user_collection.count_documents(
+                {'user': timeline['user']}, limit=1
+            ):
+                continue
+            self.insert_timeline(timeline)
+            migrated += 1
+        logger.info(f'{migrated} timelines migrated to {self}')
+        return migrated
+
+
+os.register_at_fork(after_in_child=MongoBackend.reset_clients)
@@ -0,0 +1,83 @@
+# -*- coding: UTF-8 -*-
+
+import os
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+from threadpoolctl import threadpool_limits
+
+# Thread pools of numeric libraries, read when they are loaded by processes
+# started afterwards
+THREAD_VARIABLES = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+)
+
+
+class CpuBudget:
+    """
+    Cores shared by the stages of a run. Each stage splits them between
+    the workers processing users at the same time and the cores each
+    worker can use for its own processes and threads (i.e. LdaMulticore
+    workers or BLAS threads), so nested pools do not take more cores than
+    the budget. The cores actually used by a stage are measured as the CPU
+    time of the process and its finished children over elapsed time
+    """
+
+    def __init__(self, cores: int = None):
+        self.cores = cores or os.cpu_count() or 1
+        self.usage = {}
+
+    def __repr__(self):
+        return f'budget of {self.cores} cores'
+
+    def split(self, workers: int) -> (int, int):
+        """
+        :return: Workers, not more than cores, and cores of each worker
+        """
+        workers = max(1, min(workers, self.cores))
+        return workers, max(1, self.cores // workers)
+
+    @staticmethod
+    def get_cpu_time() -> float:
+        times = os.times()
+        return (
+            times.user
+            + times.system
+            + times.children_user
+            + times.children_system
+        )
+
+    @contextmanager
+    def measure(self, stage: str, workers: int, cores: int):
+        start = time.perf_counter()
+        cpu_time = self.get_cpu_time()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            used = (self.get_cpu_time() - cpu_time) / max(elapsed, 1e-9)
+            self.usage[stage] = {
+                'workers': workers,
+                'cores_per_worker': cores,
+                'cores_used': round(used, 2),
+                'time': round(elapsed, 2),
+            }
+            logger.info(
+                f'{stage} used {used:.2f} of {self.cores} cores with '
+                f'{workers} workers of {cores} cores'
+            )
+
+    @staticmethod
+    def limit_threads(threads: int):
+        """
+        Limit the thread pools of numeric libraries of this process, which
+        workers forked after importing numpy have already loaded, and of
+        the processes it starts
+        """
+        for variable in THREAD_VARIABLES:
+            os.environ[variable] = str(threads)
+        threadpool_limits(threads)
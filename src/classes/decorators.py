@@ -1,15 +1,29 @@
 # -*- coding: UTF-8 -*-
 
 import time
+from functools import wraps
 
 from loguru import logger
 
+from .metrics import MetricsRegistry
+
 
 def timeit(func):
+    """
+    Log the time of ``func`` and record it in the metrics registry as a
+    stage named after it, labelled with the user when it is the first
+    argument of a method
+    """
+
+    @wraps(func)
     def wrapper(*args, **kwargs):
-        t1 = time.time()
-        result = func(*args, **kwargs)
-        t2 = time.time()
+        user = kwargs.get('user')
+        if user is None and len(args) > 1 and isinstance(args[1], str):
+            user = args[1]
+        t1 = time.perf_counter()
+        with MetricsRegistry.timer(func.__qualname__, user):
+            result = func(*args, **kwargs)
+        t2 = time.perf_counter()
         logger.info(f'Time {func.__name__}: {round(t2-t1, 2)}s')
         return result
 
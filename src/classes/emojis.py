@@ -0,0 +1,91 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+import re
+
+# Alternation regex the table is generated from
+EMOJIS_SOURCE = os.path.join(os.path.dirname(__file__), 'emojis.txt')
+# Codepoint ranges of EMOJIS_SOURCE, generated again by save_table when it
+# changes
+EMOJIS_TABLE = os.path.join(os.path.dirname(__file__), 'emojis.json')
+
+ATOM_REGEX = re.compile(r'\[\\U(\w{8})-\\U(\w{8})\]|\\U(\w{8})')
+
+
+def merge_ranges(ranges: iter) -> list:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def parse_pattern(pattern: str) -> dict:
+    """
+    Turn an alternation of codepoints, codepoint ranges and sequences of
+    them (i.e. flags) into a table of merged codepoint ranges matching a
+    single character and sequences of ranges matching several ones
+    """
+    ranges = []
+    sequences = []
+    for alternative in pattern.strip().strip('()').split('|'):
+        atoms = [
+            [int(start or single, 16), int(end or single, 16)]
+            for start, end, single in ATOM_REGEX.findall(alternative)
+        ]
+        if len(atoms) == 1:
+            ranges.extend(atoms)
+        elif atoms:
+            sequences.append(atoms)
+    return {'ranges': merge_ranges(ranges), 'sequences': sequences}
+
+
+def save_table(source: str = EMOJIS_SOURCE, path: str = EMOJIS_TABLE):
+    with open(source) as file:
+        table = parse_pattern(file.read())
+    with open(path, 'w') as file:
+        json.dump(table, file, indent=1)
+        file.write('\n')
+
+
+def load_table(path: str = EMOJIS_TABLE) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def to_class(ranges: iter) -> str:
+    return '[{}]'.format(
+        ''.join(
+            (
+                f'\\U{start:08X}'
+                if start == end
+                else f'\\U{start:08X}-\\U{end:08X}'
+            )
+            for start, end in ranges
+        )
+    )
+
+
+def compile_emojis_regex(table: dict) -> re.Pattern:
+    """
+    Single character emojis are matched by one character class, which the
+    regex engine checks with a lookup per character instead of trying every
+    alternative of the source pattern at every position
+    """
+    alternatives = [
+        ''.join(to_class([atom]) for atom in sequence)
+        for sequence in table['sequences']
+    ]
+    alternatives.append(to_class(table['ranges']))
+    return re.compile('|'.join(alternatives))
+
+
+def compile_candidate_regex(table: dict) -> re.Pattern:
+    """
+    Characters any emoji starts with
+    """
+    starts = [sequence[0] for sequence in table['sequences']]
+    return re.compile(to_class(merge_ranges(table['ranges'] + starts)))
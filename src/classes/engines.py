@@ -0,0 +1,233 @@
+# -*- coding: UTF-8 -*-
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+from gensim import corpora
+from gensim.models import LdaModel
+from gensim.models.ldamulticore import LdaMulticore
+from loguru import logger
+
+
+class InferenceEngine(ABC):
+    """
+    Way of inferring a LDA model. Every engine returns a gensim LdaModel,
+    or a subclass of it, so models can be reported, saved and updated
+    whatever engine inferred them
+    """
+
+    name = None
+    # Cores the engine can use, all of them if None
+    cores = None
+
+    def __repr__(self):
+        return f'{self.name} engine'
+
+    def set_cores(self, cores: int):
+        self.cores = cores
+
+    @abstractmethod
+    def infer(
+        self,
+        bow: iter,
+        dictionary: corpora.Dictionary,
+        n_topics: int,
+        n_passes: int,
+    ) -> LdaModel:
+        pass
+
+
+class MulticoreEngine(InferenceEngine):
+    """
+    Online variational Bayes of gensim in ``workers`` processes besides
+    the calling one, all CPUs but one if None. Workers are limited to the
+    cores of the engine but one, and without any the model is inferred in
+    the calling process
+    """
+
+    name = 'multicore'
+
+    def __init__(self, workers: int = None):
+        self.workers = workers
+
+    def get_workers(self):
+        if self.cores is None:
+            return self.workers
+        return min(self.workers or self.cores, self.cores - 1)
+
+    def infer(self, bow, dictionary, n_topics, n_passes) -> LdaModel:
+        workers = self.get_workers()
+        if workers == 0:
+            return OnlineEngine().infer(bow, dictionary, n_topics, n_passes)
+        return LdaMulticore(
+            bow,
+            id2word=dictionary,
+            num_topics=n_topics,
+            passes=n_passes,
+            workers=workers,
+            random_state=0,
+        )
+
+
+class OnlineEngine(InferenceEngine):
+    """
+    Online variational Bayes of gensim in the calling process
+    """
+
+    name = 'online'
+
+    def infer(self, bow, dictionary, n_topics, n_passes) -> LdaModel:
+        return LdaModel(
+            bow,
+            id2word=dictionary,
+            num_topics=n_topics,
+            passes=n_passes,
+            random_state=0,
+        )
+
+
+class GibbsEngine(InferenceEngine):
+    """
+    Gibbs sampler vectorized with NumPy for small corpora, which resamples
+    the topic of every token at once in each sweep (instead of token by
+    token) from the counts of the previous sweep, with
+    ``iterations_per_pass`` sweeps per pass of the other engines, so it
+    approximates the sequential sampler.
+    Topic-term counts of the last sweep become the sufficient statistics
+    of a gensim model, with the same symmetric priors gensim uses by
+    default
+    """
+
+    name = 'gibbs'
+
+    def __init__(self, iterations_per_pass: int = 10):
+        self.iterations_per_pass = iterations_per_pass
+
+    @staticmethod
+    def get_tokens(bow: iter) -> (np.ndarray, np.ndarray, int):
+        """
+        :return: Document and term of each token and number of documents
+        """
+        documents = []
+        terms = []
+        counts = []
+        n_documents = 0
+        for document in bow:
+            for term_id, count in document:
+                documents.append(n_documents)
+                terms.append(term_id)
+                counts.append(int(count))
+            n_documents += 1
+        counts = np.asarray(counts, dtype=np.int64)
+        return (
+            np.repeat(np.asarray(documents, dtype=np.int64), counts),
+            np.repeat(np.asarray(terms, dtype=np.int64), counts),
+            n_documents,
+        )
+
+    def infer(self, bow, dictionary, n_topics, n_passes) -> LdaModel:
+        # Fails as gensim engines do when there are no terms
+        model = LdaModel(
+            id2word=dictionary, num_topics=n_topics, random_state=0
+        )
+        documents, terms, n_documents = self.get_tokens(bow)
+        n_terms = len(dictionary)
+        alpha = 1.0 / n_topics
+        eta = 1.0 / n_topics
+        random_state = np.random.RandomState(0)
+        topics = random_state.randint(n_topics, size=len(terms))
+        tokens = np.arange(len(terms))
+        for _ in range(n_passes * self.iterations_per_pass):
+            document_topics, topic_terms = self.count(
+                documents, terms, topics, n_documents, n_terms, n_topics
+            )
+            # Counts without the current topic of each token
+            own = np.zeros((len(terms), n_topics))
+            own[tokens, topics] = 1
+            probabilities = (
+                (document_topics[documents] - own + alpha)
+                * (topic_terms[:, terms].T - own + eta)
+                / (topic_terms.sum(axis=1) - own + n_terms * eta)
+            )
+            cumulative = probabilities.cumsum(axis=1)
+            draws = random_state.rand(len(terms)) * cumulative[:, -1]
+            topics = (cumulative < draws[:, None]).sum(axis=1)
+        _, topic_terms = self.count(
+            documents, terms, topics, n_documents, n_terms, n_topics
+        )
+        model.state.sstats = topic_terms.astype(model.state.sstats.dtype)
+        model.sync_state()
+        return model
+
+    @staticmethod
+    def count(
+        documents: np.ndarray,
+        terms: np.ndarray,
+        topics: np.ndarray,
+        n_documents: int,
+        n_terms: int,
+        n_topics: int,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        :return: Tokens of each topic by document and of each term by topic
+        """
+        document_topics = np.bincount(
+            documents * n_topics + topics, minlength=n_documents * n_topics
+        ).reshape(n_documents, n_topics)
+        topic_terms = np.bincount(
+            topics * n_terms + terms, minlength=n_topics * n_terms
+        ).reshape(n_topics, n_terms)
+        return document_topics, topic_terms
+
+
+class AutoEngine(InferenceEngine):
+    """
+    Chooses the engine by the number of documents of the corpus: the Gibbs
+    sampler up to ``gibbs_max_documents``, the online engine up to
+    ``online_max_documents`` and the multicore engine for bigger corpora,
+    whose worker processes only pay off with enough documents
+    """
+
+    name = 'auto'
+
+    def __init__(
+        self,
+        gibbs_max_documents: int = 1000,
+        online_max_documents: int = 10000,
+        workers: int = None,
+    ):
+        self.gibbs_max_documents = gibbs_max_documents
+        self.online_max_documents = online_max_documents
+        self.engines = (
+            GibbsEngine(),
+            OnlineEngine(),
+            MulticoreEngine(workers),
+        )
+
+    def set_cores(self, cores: int):
+        super().set_cores(cores)
+        for engine in self.engines:
+            engine.set_cores(cores)
+
+    def choose(self, bow: iter) -> InferenceEngine:
+        try:
+            n_documents = len(bow)
+        except TypeError:
+            # Streamed corpus, which is only worth streaming when it is big
+            return self.engines[2]
+        if n_documents <= self.gibbs_max_documents:
+            return self.engines[0]
+        if n_documents <= self.online_max_documents:
+            return self.engines[1]
+        return self.engines[2]
+
+    def infer(self, bow, dictionary, n_topics, n_passes) -> LdaModel:
+        engine = self.choose(bow)
+        logger.info(f'Inferring LDA with {engine}')
+        return engine.infer(bow, dictionary, n_topics, n_passes)
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in (MulticoreEngine, OnlineEngine, GibbsEngine, AutoEngine)
+}
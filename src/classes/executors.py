@@ -0,0 +1,160 @@
+# -*- coding: UTF-8 -*-
+
+import multiprocessing as mp
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    BrokenExecutor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from itertools import chain
+from multiprocessing.util import Finalize
+
+from loguru import logger
+
+from .budgets import CpuBudget
+from .metrics import FLUSH_INTERVAL, MetricsRegistry
+
+# Task of the worker, set once when the worker starts so objects that can
+# only be inherited (i.e. locks) never need to be pickled
+_task = None
+
+
+def init_worker(
+    func, kwargs: dict, threads: int = None, metrics_path: str = None
+):
+    global _task
+    _task = (func, kwargs)
+    if threads:
+        CpuBudget.limit_threads(threads)
+    if metrics_path:
+        MetricsRegistry.start(metrics_path)
+        # Run by process workers when the pool shuts down
+        Finalize(None, MetricsRegistry.flush, exitpriority=0)
+
+
+def run_task(user: str) -> dict:
+    func, kwargs = _task
+    start = time.perf_counter()
+    try:
+        func(user, **kwargs)
+        status = 'done'
+    except Exception as e:
+        status = f'failed: {e}'
+    MetricsRegistry.count(
+        'users', stage=func.__qualname__, status=status.split(':')[0]
+    )
+    MetricsRegistry.flush(FLUSH_INTERVAL)
+    return {'status': status, 'time': round(time.perf_counter() - start, 2)}
+
+
+class Executor:
+    """
+    Runs a task for each user in a bounded pool of long lived workers,
+    which are fed from a queue of at most ``max_pending`` users so user
+    iterables can be consumed lazily. Thread pools of numeric libraries of
+    process workers are limited to ``threads``. Process workers are started
+    with ``start_method``, the platform default if None, and a forkserver
+    imports the module of the task once for all of them. Process workers
+    flush their metrics to ``metrics_path`` at most every FLUSH_INTERVAL
+    seconds and when they exit
+    """
+
+    KINDS = ('process', 'thread')
+
+    def __init__(
+        self,
+        workers: int = 4,
+        kind: str = 'process',
+        max_pending: int = None,
+        threads: int = None,
+        start_method: str = None,
+        metrics_path: str = None,
+    ):
+        if kind not in self.KINDS:
+            raise ValueError(f'Worker kind {kind} is not one of {self.KINDS}')
+        self.workers = workers
+        self.kind = kind
+        self.max_pending = max_pending or 2 * workers
+        self.threads = threads
+        self.start_method = start_method
+        self.metrics_path = metrics_path
+
+    def __repr__(self):
+        return f'{self.workers} {self.kind} workers'
+
+    def get_pool(self, func, kwargs: dict):
+        if self.kind == 'thread':
+            # Thread pools of numeric libraries are shared by all threads
+            return ThreadPoolExecutor(
+                max_workers=self.workers,
+                initializer=init_worker,
+                initargs=(func, kwargs),
+            )
+        context = mp.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            context.set_forkserver_preload([func.__module__])
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(func, kwargs, self.threads, self.metrics_path),
+        )
+
+    def run(self, func, users: iter, **kwargs) -> dict:
+        """
+        Call ``func(user, **kwargs)`` for each user of ``users``
+        :return: Status and elapsed time of each user
+        """
+        logger.info(f'Running {func.__name__} with {self}')
+        stage = func.__qualname__
+        results = {}
+        pending = {}
+        users = iter(users)
+        with self.get_pool(func, kwargs) as pool:
+            try:
+                for user in users:
+                    if len(pending) >= self.max_pending:
+                        self.collect(pending, results, stage)
+                    pending[pool.submit(run_task, user)] = user
+            except BrokenExecutor as e:
+                # A worker died (i.e. killed for running out of memory) and
+                # the pool does not take more users
+                logger.error(f'Workers are broken: {e}')
+                for user in chain([user], users):
+                    self.fail(results, user, stage, e)
+            while pending:
+                self.collect(pending, results, stage)
+        self.report(results)
+        return results
+
+    @staticmethod
+    def collect(pending: dict, results: dict, stage: str):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            user = pending.pop(future)
+            try:
+                results[user] = future.result()
+            except Exception as e:
+                # Worker died before finishing the task
+                Executor.fail(results, user, stage, e)
+
+    @staticmethod
+    def fail(results: dict, user: str, stage: str, error: Exception):
+        results[user] = {'status': f'failed: {error}', 'time': None}
+        MetricsRegistry.count('users', stage=stage, status='failed')
+
+    @staticmethod
+    def report(results: dict):
+        failed = [
+            user
+            for user, result in results.items()
+            if result['status'] != 'done'
+        ]
+        for user, result in results.items():
+            logger.info(f'{user}: {result["status"]} ({result["time"]}s)')
+        logger.info(
+            f'{len(results) - len(failed)} users done, {len(failed)} failed'
+        )
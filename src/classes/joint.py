@@ -0,0 +1,180 @@
+# -*- coding: UTF-8 -*-
+
+import os
+from collections import Counter
+
+import numpy as np
+from gensim import corpora
+from gensim.models import LdaModel
+from loguru import logger
+
+from .backends import batches
+from .decorators import timeit
+from .engines import MulticoreEngine
+from .lda import LDA
+from .stores import CorpusStore
+
+
+class JointTexts:
+    """
+    Cleaned tweets of ``users`` read from the backend in batches every time
+    they are iterated, so no timeline is kept in memory
+    """
+
+    def __init__(self, backend, users: list, batch_size: int = 1000):
+        self.backend = backend
+        self.users = users
+        self.batch_size = batch_size
+
+    def iter_texts(self) -> iter:
+        for user in self.users:
+            for tweet in self.backend.iter_tweets(
+                user, 'cleaned_tweets', self.batch_size
+            ):
+                yield tweet['text']
+
+    def __iter__(self):
+        for text in self.iter_texts():
+            yield text.split()
+
+
+class BagsOfWords:
+    def __init__(self, texts: iter, dictionary: corpora.Dictionary):
+        self.texts = texts
+        self.dictionary = dictionary
+
+    def __iter__(self):
+        for text in self.texts:
+            yield self.dictionary.doc2bow(text)
+
+
+class JointLDA(LDA):
+    """
+    A single model inferred with the tweets of many users, which gives them
+    a shared vocabulary of topics. The mixture of topics of each user is
+    saved in its timeline as float32 bytes under ``topic_vectors.<key>``,
+    where key is the key of the joint model saved at ``path``
+    """
+
+    def __init__(
+        self,
+        storage_backend,
+        path: str = 'output/joint',
+        batch_size: int = 500,
+        cpu_budget: int = None,
+        **kwargs,
+    ):
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+        kwargs.setdefault('engine', MulticoreEngine())
+        super().__init__(storage_backend, **kwargs)
+        self.engine.set_cores(self.cpu_budget)
+        self.path = path
+        self.batch_size = batch_size
+
+    def get_model_path(self, key: str) -> str:
+        return os.path.join(self.path, f'{key}.lda')
+
+    def get_joint_key(self, corpus_key: str) -> str:
+        return self._model_registry.get_key(
+            'joint', [corpus_key], **self.get_params()
+        )
+
+    @timeit
+    def run(self, users: list, save: bool = True, verbose: bool = False):
+        """
+        Infer the joint model of ``users``, or load it if it was already
+        inferred with the same tweets, and save their topic vectors
+        :return: Key of the joint model
+        """
+        users = list(users)
+        logger.info(f'Run joint LDA for {len(users)} users')
+        with self._storage_backend as backend:
+            texts = JointTexts(backend, users)
+            corpus_key = CorpusStore.get_key(
+                texts.iter_texts(), self.use_bigrams, self.min_df
+            )
+            key = self.get_joint_key(corpus_key)
+            model_path = self.get_model_path(key)
+            if os.path.exists(model_path):
+                logger.info('Joint model is already inferred')
+                model = LdaModel.load(model_path)
+            else:
+                model = self.infer_joint_model(texts, corpus_key)
+                if model is None:
+                    return None
+                if save:
+                    os.makedirs(self.path, exist_ok=True)
+                    model.save(model_path)
+            if verbose:
+                self.print_terms(model)
+            if save:
+                self.save_topic_vectors(backend, model, users, key)
+            return key
+
+    def infer_joint_model(self, texts: JointTexts, corpus_key: str):
+        logger.info('Preparing data for joint LDA...')
+        if self.use_bigrams:
+            texts = self.make_bigrams(texts)
+        dictionary = self.make_dictionary(texts)
+        if not len(dictionary):
+            logger.error(
+                'Cannot compute LDA, there are no terms enough. '
+                'Maybe you need to decrease LDA_MIN_DF setting'
+            )
+            return None
+        if self._corpus_store:
+            # Passes read the corpus from disk instead of the backend
+            bow, dictionary = self._corpus_store.save(
+                corpus_key, BagsOfWords(texts, dictionary), dictionary
+            )
+        else:
+            bow = BagsOfWords(texts, dictionary)
+        logger.info('Inferring joint LDA...')
+        return self.engine.infer(bow, dictionary, self.n_topics, self.n_passes)
+
+    def get_user_bow(self, backend, user: str, model: LdaModel) -> list:
+        """
+        Bag of words of all cleaned tweets of ``user``
+        """
+        counts = Counter()
+        for tweet in backend.iter_tweets(user, 'cleaned_tweets'):
+            tokens = self.apply_known_bigrams(
+                tweet['text'].split(), model.id2word
+            )
+            counts.update(dict(model.id2word.doc2bow(tokens)))
+        return sorted(counts.items())
+
+    def get_topic_vectors(self, backend, model: LdaModel, users: list):
+        """
+        :return: Normalized topic mixtures of ``users`` as float32 rows
+        """
+        gamma, _ = model.inference(
+            [self.get_user_bow(backend, user, model) for user in users]
+        )
+        gamma /= gamma.sum(axis=1, keepdims=True)
+        return gamma.astype(np.float32)
+
+    def save_topic_vectors(
+        self, backend, model: LdaModel, users: list, key: str
+    ):
+        for batch in batches(users, self.batch_size):
+            vectors = self.get_topic_vectors(backend, model, batch)
+            backend.update_timelines(
+                {
+                    user: {f'topic_vectors.{key}': vector.tobytes()}
+                    for user, vector in zip(batch, vectors)
+                }
+            )
+        logger.info(f'Topic vectors of {len(users)} users saved as {key}')
+
+    @staticmethod
+    def load_topic_vectors(backend, users: list, key: str) -> dict:
+        """
+        :return: Topic vector by user of the users with one for ``key``
+        """
+        timelines = backend.get_timelines(users, [f'topic_vectors.{key}'])
+        return {
+            user: np.frombuffer(timeline['topic_vectors'][key], np.float32)
+            for user, timeline in timelines.items()
+            if key in timeline.get('topic_vectors', {})
+        }
@@ -0,0 +1,122 @@
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+from langdetect import DetectorFactory, detect
+from langdetect.lang_detect_exception import LangDetectException
+
+from .stopwords import StopwordRegistry
+
+# Without a seed langdetect results are random for ambiguous texts
+DetectorFactory.seed = 0
+
+
+class LanguageDetector:
+    """
+    Detects the language of tweets to choose which stopwords filter.
+    Modes:
+    - tweet: each tweet is filtered with the stopwords of its language
+    - timeline: all tweets are filtered with the stopwords of the majority
+      language of a timeline sample
+    - histogram: all tweets are filtered with the stopwords of every
+      language with a share of the timeline sample over ``threshold``
+    Timeline modes detect batches of ``batch_size`` joined tweets, which is
+    faster and more accurate than detecting short tweets one by one.
+    Detections are cached by text hash for the whole process, and the
+    cache is shared by its threads
+    """
+
+    MODES = ('tweet', 'timeline', 'histogram')
+    CACHE_SIZE = 100000
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        mode: str = 'tweet',
+        sample_size: int = 200,
+        batch_size: int = 10,
+        threshold: float = 0.2,
+        default_lang: str = 'en',
+    ):
+        if mode not in self.MODES:
+            raise ValueError(
+                f'Language detection mode {mode} is not one of {self.MODES}'
+            )
+        self.mode = mode
+        self.sample_size = sample_size
+        self.batch_size = batch_size
+        self.threshold = threshold
+        self.default_lang = default_lang
+
+    @classmethod
+    def detect(cls, text: str, default_lang: str = 'en') -> str:
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        with cls._lock:
+            try:
+                cls._cache.move_to_end(key)
+                return cls._cache[key]
+            except KeyError:
+                pass
+        # Detected without the lock so other threads are not blocked
+        try:
+            lang = detect(text)
+        except LangDetectException:
+            lang = default_lang
+        with cls._lock:
+            cls._cache[key] = lang
+            if len(cls._cache) > cls.CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return lang
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._cache.clear()
+
+    def sample(self, texts: list) -> list:
+        """
+        Take up to ``sample_size`` not empty texts evenly spaced along
+        the timeline
+        """
+        texts = [text for text in texts if text]
+        step = max(1, len(texts) // self.sample_size)
+        return texts[::step][: self.sample_size]
+
+    def histogram(self, texts: list) -> dict:
+        """
+        Share of the sampled tweets written in each language
+        """
+        sample = self.sample(texts)
+        counter = Counter()
+        for i in range(0, len(sample), self.batch_size):
+            batch = sample[i : i + self.batch_size]
+            lang = self.detect(' '.join(batch), self.default_lang)
+            counter[lang] += len(batch)
+        if not counter:
+            return {self.default_lang: 1.0}
+        return {lang: n / len(sample) for lang, n in counter.most_common()}
+
+    def get_languages(self, texts: list) -> list:
+        histogram = self.histogram(texts)
+        majority = next(iter(histogram))
+        if self.mode == 'histogram':
+            return [
+                lang
+                for lang, share in histogram.items()
+                if share >= self.threshold
+            ] or [majority]
+        return [majority]
+
+    def get_stopwords(self, texts: list):
+        """
+        Get the stopwords for all ``texts`` of a timeline or None when
+        they have to be chosen tweet by tweet
+        """
+        if self.mode == 'tweet':
+            return None
+        return frozenset().union(
+            *(StopwordRegistry.get(lang) for lang in self.get_languages(texts))
+        )
@@ -1,21 +1,19 @@
 # -*- coding: UTF-8 -*-
 
 import pickle
-import warnings
 from pprint import pprint
 
-import pandas as pd
+import numpy as np
 from gensim import corpora
-from gensim.models.ldamulticore import LdaMulticore
+from gensim.models import LdaModel
 from gensim.models.phrases import Phraser, Phrases
 from loguru import logger
 
 from .decorators import timeit
+from .engines import InferenceEngine, MulticoreEngine
 from .exceptions import TimelineDoesNotExist
-
-with warnings.catch_warnings():
-    warnings.simplefilter('ignore', DeprecationWarning)
-    import pyLDAvis.gensim
+from .reports import ReportGenerator
+from .stores import ModelRegistry
 
 
 class Sentences:
@@ -35,17 +33,29 @@ class LDA:
         n_passes=200,
         use_bigrams=False,
         min_df=50,
+        corpus_store=None,
+        model_registry=None,
+        incremental=False,
+        max_drift=0.3,
+        engine: InferenceEngine = None,
+        reports: ReportGenerator = None,
     ):
+        self.engine = engine or MulticoreEngine()
+        self._reports = reports or ReportGenerator()
         logger.info(
             f'Latent Dirichlet Allocation with n_topics={n_topics}, '
             f'n_passes={n_passes}, use_bigrams={use_bigrams},'
-            f' min_df={min_df} and using {storage_backend}'
+            f' min_df={min_df}, {self.engine} and using {storage_backend}'
         )
         self._storage_backend = storage_backend
         self.n_topics = n_topics
         self.n_passes = n_passes
         self.use_bigrams = use_bigrams
         self.min_df = min_df
+        self._corpus_store = corpus_store
+        self._model_registry = model_registry or ModelRegistry(storage_backend)
+        self.incremental = incremental
+        self.max_drift = max_drift
 
     @timeit
     def run(self, user: str, save: bool = True, verbose: bool = False):
@@ -59,16 +69,24 @@ class LDA:
         with self._storage_backend as backend:
             try:
                 timeline = self.__class__.get_timeline(user, backend)
-                exec_key = self.get_execution_key(user)
+                exec_key = self.get_execution_key(timeline)
+                # Loading a saved model already marks it as used
+                is_new = not self.model_is_already_inferred(timeline, exec_key)
                 model = self.infer_model(timeline, exec_key, verbose)
                 if model and save:
-                    self.save_model(model, timeline)
+                    if is_new:
+                        self.save_model(model, timeline, exec_key)
+                    self._reports.defer(user, exec_key)
             except Exception as e:
                 logger.error(e)
+                raise
 
     @staticmethod
     def get_timeline(user: str, backend):
-        timeline = backend.get_timeline(user)
+        # Raw tweets and model bytes are not needed
+        timeline = backend.get_timeline(
+            user, ['cleaned_tweets.id', 'cleaned_tweets.text', 'models']
+        )
         if not timeline:
             raise TimelineDoesNotExist(
                 f'There is no timeline for {user} saved in '
@@ -77,19 +95,25 @@ class LDA:
         return timeline
 
     def infer_model(self, timeline: dict, exec_key, verbose: bool = False):
-        bow, dictionary = self.prepare_data(timeline)
+        bow = dictionary = None
         if self.__class__.model_is_already_inferred(timeline, exec_key):
             logger.info('Model is already inferred')
-            model = pickle.loads(timeline['models'][exec_key])
+            model = pickle.loads(
+                self._model_registry.load(timeline['user'], exec_key)
+            )
+            # Data is only prepared to generate a missing report
+            needs_html = not self.html_is_already_generated(exec_key)
+        elif self.incremental and self.can_update_model(timeline):
+            model = self.update_model(timeline)
+            dictionary = model.id2word
+            needs_html = True
         else:
+            bow, dictionary = self.prepare_data(timeline)
+            needs_html = True
             logger.info('Inferring LDA...')
             try:
-                model = LdaMulticore(
-                    bow,
-                    id2word=dictionary,
-                    num_topics=self.n_topics,
-                    passes=self.n_passes,
-                    random_state=0,
+                model = self.engine.infer(
+                    bow, dictionary, self.n_topics, self.n_passes
                 )
             except ValueError as e:
                 error = 'cannot compute LDA over an empty collection (no terms)'
@@ -99,26 +123,204 @@ class LDA:
                         'Maybe you need to decrease LDA_MIN_DF setting'
                     )
                 return None
+            # Documents of the last full training, to measure drift
+            model.base_documents = len(timeline['cleaned_tweets'])
         if verbose:
             self.print_terms(model)
-        self.generate_html(model, bow, dictionary, timeline['user'])
+        if needs_html and self._reports.mode == 'inline':
+            if bow is None and dictionary is not None:
+                # Corpus of an updated model, only built for its report
+                bow = self.get_model_bow(timeline, dictionary)
+            elif bow is None and not self._reports.is_cached(exec_key):
+                bow, dictionary = self.prepare_data(timeline)
+            self.generate_html(model, bow, dictionary, exec_key)
         return model
 
     @staticmethod
     def model_is_already_inferred(timeline: dict, exec_key: str):
         return 'models' in timeline and exec_key in timeline['models']
 
-    def get_execution_key(self, user: str):
-        return f'{user}-t{self.n_topics}-p{self.n_passes}'
+    def get_execution_key(self, timeline: dict) -> str:
+        """
+        Key of the model inferred with the cleaned tweets of ``timeline``
+        and the current settings
+        """
+        return self._model_registry.get_key(
+            timeline['user'],
+            [tweet['text'] for tweet in timeline['cleaned_tweets']],
+            **self.get_params(),
+        )
 
-    def prepare_data(self, timeline: dict) -> (list, corpora.Dictionary):
-        df = pd.DataFrame(
-            timeline['cleaned_tweets'], columns=['id', 'created_at', 'text']
+    def get_model_family(self, user: str) -> str:
+        """
+        Key shared by the models of ``user`` inferred with the current
+        settings, whatever the tweets they were inferred with
+        """
+        return self._model_registry.get_key(user, [], **self.get_params())
+
+    def get_params(self) -> dict:
+        """
+        Settings that change the inferred model
+        """
+        return {
+            'n_topics': self.n_topics,
+            'n_passes': self.n_passes,
+            'use_bigrams': self.use_bigrams,
+            'min_df': self.min_df,
+            'engine': self.engine.name,
+        }
+
+    def get_base_model(self, timeline: dict):
+        """
+        :return: Key and metadata of the newest model of the family or None
+        """
+        family = self.get_model_family(timeline['user'])
+        models = [
+            (key, metadata)
+            for key, metadata in (timeline.get('models') or {}).items()
+            if isinstance(metadata, dict) and metadata.get('family') == family
+        ]
+        if not models:
+            return None
+        return max(models, key=lambda model: model[1]['newest_id'])
+
+    def can_update_model(self, timeline: dict) -> bool:
+        """
+        A model can be updated with the new tweets while they have not
+        drifted more than ``max_drift`` from its last full training
+        """
+        base_model = self.get_base_model(timeline)
+        if not base_model:
+            return False
+        _, metadata = base_model
+        tweets = timeline['cleaned_tweets']
+        new_tweets = [t for t in tweets if t['id'] > metadata['newest_id']]
+        if not new_tweets or len(tweets) < metadata['n_documents']:
+            # Tweets have been changed or removed
+            return False
+        drift = (len(tweets) - metadata['base_documents']) / max(
+            metadata['base_documents'], 1
         )
-        logger.info(f'Preparing data for LDA...({df.shape[0]} tweets)')
-        texts = Sentences([text.split() for text in list(df['text'])])
+        if drift > self.max_drift:
+            logger.info(f'Drift of {drift:.2f} is too large to update model')
+            return False
+        return True
+
+    def update_model(self, timeline: dict):
+        """
+        Update the newest model of the family with the new tweets only
+        :return: Updated model
+        """
+        key, metadata = self.get_base_model(timeline)
+        model = pickle.loads(self._model_registry.load(timeline['user'], key))
+        dictionary = model.id2word
+        new_texts = [
+            self.apply_known_bigrams(tweet['text'].split(), dictionary)
+            for tweet in timeline['cleaned_tweets']
+            if tweet['id'] > metadata['newest_id']
+        ]
+        logger.info(f'Updating LDA with {len(new_texts)} new tweets...')
+        self.extend_model(model, new_texts)
+        model.update([dictionary.doc2bow(text) for text in new_texts])
+        return model
+
+    def get_model_bow(
+        self, timeline: dict, dictionary: corpora.Dictionary
+    ) -> list:
+        """
+        Bag of words corpus of the cleaned tweets with the dictionary of a
+        model, which could have been updated after preparing the data
+        """
+        return [
+            dictionary.doc2bow(
+                self.apply_known_bigrams(tweet['text'].split(), dictionary)
+            )
+            for tweet in timeline['cleaned_tweets']
+        ]
+
+    def apply_known_bigrams(
+        self, tokens: list, dictionary: corpora.Dictionary
+    ) -> list:
+        """
+        Join pairs of tokens that are a bigram of the dictionary, instead of
+        training bigrams again
+        """
+        if not self.use_bigrams:
+            return tokens
+        joined = []
+        i = 0
+        while i < len(tokens):
+            bigram = '_'.join(tokens[i : i + 2])
+            if i + 1 < len(tokens) and bigram in dictionary.token2id:
+                joined.append(bigram)
+                i += 2
+            else:
+                joined.append(tokens[i])
+                i += 1
+        return joined
+
+    def extend_model(self, model: LdaModel, texts: list):
+        """
+        Add the tokens of ``texts`` with at least ``min_df`` occurrences to
+        the model dictionary, with no evidence of any topic yet
+        """
+        dictionary = model.id2word
+        new_dictionary = corpora.Dictionary(texts)
+        new_dictionary.filter_extremes(
+            no_below=self.min_df, no_above=1.0, keep_n=None
+        )
+        n_terms = len(dictionary)
+        dictionary.add_documents(
+            [
+                [token]
+                for token in new_dictionary.token2id
+                if token not in dictionary.token2id
+            ]
+        )
+        added = len(dictionary) - n_terms
+        if not added:
+            return
+        logger.info(f'Adding {added} new terms to LDA')
+        eta = np.asarray(model.eta)
+        model.eta = model.state.eta = np.concatenate(
+            [eta, np.full(added, eta.mean(), dtype=eta.dtype)]
+        )
+        model.state.sstats = np.hstack(
+            [
+                model.state.sstats,
+                np.zeros(
+                    (model.num_topics, added), dtype=model.state.sstats.dtype
+                ),
+            ]
+        )
+        model.num_terms = len(dictionary)
+        model.sync_state()
+
+    def html_is_already_generated(self, exec_key: str) -> bool:
+        return self._reports.is_fresh(exec_key)
+
+    def prepare_data(self, timeline: dict) -> (list, corpora.Dictionary):
+        """
+        Build the bag of words corpus of the cleaned tweets, or load it
+        from the corpus store if it was already built
+        """
+        texts = [tweet['text'] for tweet in timeline['cleaned_tweets']]
+        logger.info(f'Preparing data for LDA...({len(texts)} tweets)')
+        if self._corpus_store:
+            key = self._corpus_store.get_key(
+                texts, self.use_bigrams, self.min_df
+            )
+            prepared_data = self._corpus_store.load(key)
+            if prepared_data:
+                return prepared_data
+        texts = Sentences([text.split() for text in texts])
         if self.use_bigrams:
             texts = self.make_bigrams(texts)
+        if self._corpus_store:
+            dictionary = self.make_dictionary(texts)
+            return self._corpus_store.save(
+                key, map(dictionary.doc2bow, texts), dictionary
+            )
         return self.make_bag_of_words(texts)
 
     @staticmethod
@@ -127,14 +329,18 @@ class LDA:
         bigrams = Phraser(Phrases(texts))
         return Sentences(bigrams[texts])
 
-    def make_bag_of_words(self, texts: iter) -> (list, corpora.Dictionary):
+    def make_dictionary(self, texts: iter) -> corpora.Dictionary:
         dictionary = corpora.Dictionary(texts)
         dictionary.filter_extremes(no_below=self.min_df)
         dictionary.filter_n_most_frequent(2)
+        return dictionary
+
+    def make_bag_of_words(self, texts: iter) -> (list, corpora.Dictionary):
+        dictionary = self.make_dictionary(texts)
         bow = list(map(dictionary.doc2bow, texts))
         return bow, dictionary
 
-    def print_terms(self, model: LdaMulticore):
+    def print_terms(self, model: LdaModel):
         topics = []
         for topic in model.print_topics(num_topics=self.n_topics, num_words=10):
             topics.append(
@@ -147,19 +353,59 @@ class LDA:
 
     def generate_html(
         self,
-        model: LdaMulticore,
+        model: LdaModel,
         bow: list,
         dictionary: corpora.Dictionary,
-        user: str,
+        exec_key: str,
     ):
-        data = pyLDAvis.gensim.prepare(model, bow, dictionary)
-        pyLDAvis.save_html(data, f'output/{self.get_execution_key(user)}.html')
+        self._reports.build(exec_key, model, bow, dictionary)
 
-    def save_model(self, model: LdaMulticore, timeline: dict):
+    def generate_report(self, user: str, exec_key: str = None):
+        """
+        Generate the missing or stale report of a saved model of ``user``,
+        or of the model of the current settings if ``exec_key`` is None
+        """
+        if exec_key and self._reports.is_cached(exec_key):
+            if not self._reports.is_fresh(exec_key):
+                self._reports.build(exec_key)
+            return
+        with self._storage_backend as backend:
+            timeline = self.__class__.get_timeline(user, backend)
+            exec_key = exec_key or self.get_execution_key(timeline)
+            if self._reports.is_fresh(exec_key):
+                return
+            if self._reports.is_cached(exec_key):
+                self._reports.build(exec_key)
+                return
+            model = self._model_registry.load(user, exec_key)
+            if model is None:
+                raise ValueError(f'There is no model {exec_key} saved')
+            model = pickle.loads(model)
+            self._reports.build(
+                exec_key,
+                model,
+                self.get_model_bow(timeline, model.id2word),
+                model.id2word,
+            )
+
+    def evict_models(self):
+        """
+        Keep the saved models under their storage budget, once every model
+        of a run is saved
+        """
+        self._model_registry.evict()
+
+    def save_model(self, model: LdaModel, timeline: dict, exec_key: str):
         logger.info(f'Saving lda model at {self._storage_backend}')
-        serialized_model = pickle.dumps(model)
-        exec_key = self.get_execution_key(timeline['user'])
-        if 'models' not in timeline:
-            timeline['models'] = {}
-        timeline['models'][exec_key] = serialized_model
-        self._storage_backend.update_timeline(timeline['user'], timeline)
+        tweets = timeline['cleaned_tweets']
+        self._model_registry.save(
+            timeline['user'],
+            exec_key,
+            pickle.dumps(model),
+            {
+                'family': self.get_model_family(timeline['user']),
+                'newest_id': max((tweet['id'] for tweet in tweets), default=0),
+                'n_documents': len(tweets),
+                'base_documents': getattr(model, 'base_documents', len(tweets)),
+            },
+        )
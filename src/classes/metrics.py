@@ -0,0 +1,324 @@
+# -*- coding: UTF-8 -*-
+
+import copy
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Upper bounds of histogram buckets, in seconds for stage timers
+BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+# Least seconds between flushes of a process, besides the one when it exits
+FLUSH_INTERVAL = 10
+PROMETHEUS_PREFIX = 'profiler'
+
+
+def to_key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def get_peak_memory() -> int:
+    """
+    :return: Peak resident memory of this process in bytes, 0 if unknown
+    """
+    if resource is None:
+        return 0
+    # Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MetricsRegistry:
+    """
+    Process wide registry of counters, histograms and gauges, each of them
+    kept by name and labels. Metrics recorded inside a ``timer`` get its
+    stage and user labels. Stage timers are histograms of their monotonic
+    elapsed seconds, and the peak memory of each process, which is a high
+    water mark of the whole process, is a gauge without labels.
+    Every process writes its own metrics to ``path`` with ``flush``, so
+    worker processes never share state, and ``export`` merges the files of
+    all the processes of a run into JSON and Prometheus text files
+    """
+
+    _counters = {}
+    _histograms = {}
+    _gauges = {}
+    _lock = threading.Lock()
+    _context = threading.local()
+    _flushed_at = None
+    path = None
+
+    @classmethod
+    def start(cls, path: str = None, clean: bool = False):
+        """
+        Forget the metrics of this process, i.e. the ones inherited from the
+        parent of a forked worker, and flush them to ``path`` from now on
+        :param clean: Remove the files of previous processes at ``path``
+        """
+        with cls._lock:
+            cls._counters = {}
+            cls._histograms = {}
+            cls._gauges = {}
+        cls._flushed_at = None
+        cls.path = path
+        if path and clean:
+            for file_path in cls.get_process_files(path):
+                os.remove(file_path)
+
+    @classmethod
+    def get_labels(cls, labels: dict) -> dict:
+        return {**getattr(cls._context, 'labels', {}), **labels}
+
+    @classmethod
+    def count(cls, name: str, value: float = 1, **labels):
+        key = to_key(name, cls.get_labels(labels))
+        with cls._lock:
+            cls._counters[key] = cls._counters.get(key, 0) + value
+
+    @classmethod
+    def observe(cls, name: str, value: float, **labels):
+        key = to_key(name, cls.get_labels(labels))
+        with cls._lock:
+            histogram = cls._histograms.get(key)
+            if histogram is None:
+                histogram = cls._histograms[key] = {
+                    'buckets': [0] * (len(BUCKETS) + 1),
+                    'count': 0,
+                    'sum': 0.0,
+                    'min': value,
+                    'max': value,
+                }
+            bucket = next(
+                (i for i, bound in enumerate(BUCKETS) if value <= bound),
+                len(BUCKETS),
+            )
+            histogram['buckets'][bucket] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['min'] = min(histogram['min'], value)
+            histogram['max'] = max(histogram['max'], value)
+
+    @classmethod
+    def set_max(cls, name: str, value: float, **labels):
+        key = to_key(name, cls.get_labels(labels))
+        with cls._lock:
+            cls._gauges[key] = max(cls._gauges.get(key, value), value)
+
+    @classmethod
+    @contextmanager
+    def timer(cls, stage: str, user: str = None):
+        """
+        Time the code run inside as ``stage`` of ``user``, or of the user
+        of the enclosing timer
+        """
+        previous = getattr(cls._context, 'labels', {})
+        labels = {**previous, 'stage': stage}
+        if user is not None:
+            labels['user'] = user
+        cls._context.labels = labels
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe('stage_seconds', time.perf_counter() - start)
+            cls._context.labels = previous
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """
+        :return: Metrics of this process as JSON serializable series
+        """
+        with cls._lock:
+            return {
+                kind: [
+                    {
+                        'name': name,
+                        'labels': dict(labels),
+                        'value': copy.deepcopy(value),
+                    }
+                    for (name, labels), value in metrics.items()
+                ]
+                for kind, metrics in (
+                    ('counters', cls._counters),
+                    ('histograms', cls._histograms),
+                    ('gauges', cls._gauges),
+                )
+            }
+
+    @staticmethod
+    def get_process_files(path: str) -> list:
+        return glob.glob(os.path.join(path, 'processes', '*.json'))
+
+    @classmethod
+    def flush(cls, interval: float = None):
+        """
+        Write the metrics of this process to its own file, which is
+        rewritten as a whole, unless it was written less than ``interval``
+        seconds ago
+        """
+        if not cls.path:
+            return
+        now = time.monotonic()
+        if interval and cls._flushed_at and now - cls._flushed_at < interval:
+            return
+        cls._flushed_at = now
+        with cls._lock:
+            key = to_key('process_peak_memory_bytes', {})
+            cls._gauges[key] = get_peak_memory()
+        directory = os.path.join(cls.path, 'processes')
+        os.makedirs(directory, exist_ok=True)
+        file_path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{file_path}.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(cls.snapshot(), file)
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def merge(snapshots: iter) -> dict:
+        """
+        Add up counters and histograms of the same name and labels and keep
+        the highest value of gauges
+        """
+        merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        for snapshot in snapshots:
+            for kind, series in snapshot.items():
+                for metric in series:
+                    key = to_key(metric['name'], metric['labels'])
+                    value = metric['value']
+                    if key not in merged[kind]:
+                        merged[kind][key] = (
+                            {**value, 'buckets': list(value['buckets'])}
+                            if kind == 'histograms'
+                            else value
+                        )
+                    elif kind == 'counters':
+                        merged[kind][key] += value
+                    elif kind == 'gauges':
+                        merged[kind][key] = max(merged[kind][key], value)
+                    else:
+                        histogram = merged[kind][key]
+                        histogram['buckets'] = [
+                            a + b
+                            for a, b in zip(
+                                histogram['buckets'], value['buckets']
+                            )
+                        ]
+                        histogram['count'] += value['count']
+                        histogram['sum'] += value['sum']
+                        histogram['min'] = min(histogram['min'], value['min'])
+                        histogram['max'] = max(histogram['max'], value['max'])
+        return {
+            kind: [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in metrics.items()
+            ]
+            for kind, metrics in merged.items()
+        }
+
+    @classmethod
+    def collect(cls, path: str) -> dict:
+        snapshots = []
+        for file_path in cls.get_process_files(path):
+            with open(file_path) as file:
+                snapshots.append(json.load(file))
+        return cls.merge(snapshots)
+
+    @staticmethod
+    def without_users(metrics: dict) -> dict:
+        return MetricsRegistry.merge(
+            [
+                {
+                    kind: [
+                        {
+                            **metric,
+                            'labels': {
+                                label: value
+                                for label, value in metric['labels'].items()
+                                if label != 'user'
+                            },
+                        }
+                        for metric in series
+                    ]
+                    for kind, series in metrics.items()
+                }
+            ]
+        )
+
+    @staticmethod
+    def to_prometheus(metrics: dict) -> str:
+        """
+        Text exposition format of ``metrics``, as read by the textfile
+        collector of node_exporter
+        """
+
+        def format_labels(labels: dict) -> str:
+            if not labels:
+                return ''
+            values = ','.join(
+                '{}="{}"'.format(
+                    label,
+                    str(value)
+                    .replace('\\', '\\\\')
+                    .replace('"', '\\"')
+                    .replace('\n', '\\n'),
+                )
+                for label, value in sorted(labels.items())
+            )
+            return f'{{{values}}}'
+
+        lines = []
+        typed = set()
+        for kind, suffix, metric_type in (
+            ('counters', '_total', 'counter'),
+            ('gauges', '', 'gauge'),
+            ('histograms', '', 'histogram'),
+        ):
+            for metric in sorted(
+                metrics[kind],
+                key=lambda metric: to_key(metric['name'], metric['labels']),
+            ):
+                name = f'{PROMETHEUS_PREFIX}_{metric["name"]}{suffix}'
+                if name not in typed:
+                    lines.append(f'# TYPE {name} {metric_type}')
+                    typed.add(name)
+                labels, value = metric['labels'], metric['value']
+                if kind != 'histograms':
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), value['buckets']):
+                    cumulative += count
+                    bucket_labels = format_labels({**labels, 'le': bound})
+                    lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+                lines.append(
+                    f'{name}_sum{format_labels(labels)} {value["sum"]}'
+                )
+                lines.append(
+                    f'{name}_count{format_labels(labels)} {value["count"]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def export(cls, path: str, name: str, users: bool = False) -> dict:
+        """
+        Merge the metrics flushed by every process to ``path`` and save them
+        as ``name``.json and ``name``.prom, without user labels in the
+        Prometheus file unless ``users``
+        """
+        metrics = cls.collect(path)
+        os.makedirs(path, exist_ok=True)
+        base = os.path.join(path, name)
+        with open(f'{base}.json', 'w') as file:
+            json.dump(metrics, file, indent=2)
+        prometheus = metrics if users else cls.without_users(metrics)
+        # The textfile collector could read a partially written file
+        with open(f'{base}.prom.tmp', 'w') as file:
+            file.write(cls.to_prometheus(prometheus))
+        os.replace(f'{base}.prom.tmp', f'{base}.prom')
+        return metrics
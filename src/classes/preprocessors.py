@@ -3,17 +3,17 @@
 import re
 import string
 from abc import ABC, abstractmethod
+from functools import lru_cache
+from itertools import chain, islice, tee
 
-import nltk
-import pandas as pd
-from langdetect import detect
-from langdetect.lang_detect_exception import LangDetectException
 from loguru import logger
-from nltk.corpus import stopwords as nltk_stopwords
-from stop_words import LANGUAGE_MAPPING, get_stop_words
 
 from .decorators import timeit
+from .emojis import compile_candidate_regex, compile_emojis_regex, load_table
 from .exceptions import TimelineDoesNotExist
+from .languages import LanguageDetector
+from .metrics import MetricsRegistry
+from .stopwords import StopwordRegistry
 
 # Sources:
 # - https://github.com/jfilter/clean-text/
@@ -70,7 +70,10 @@ NUMBERS_REGEX = re.compile(
     r'|([1-9]\d{0,2}([ .]\d{3})+(,\d*)?)|(\d*?[.,]\d+)|\d+)(?:$|(?=\b))'
 )
 
+DIGITS_REGEX = re.compile(r'\d')
+
 LINEBREAK_REGEX = re.compile(r'((\r\n)|[\n\v])+')
+MULTIPLE_SPACES_REGEX = re.compile(' +')
 MULTI_WHITESPACE_TO_ONE_REGEX = re.compile(r'\s+')
 NONBREAKING_SPACE_REGEX = re.compile(r'(?!\n)\s+')
 
@@ -118,8 +121,108 @@ strange_single_quotes = ['‘', '‛', '’', '❛', '❜', '`', '´', '‘', '
 DOUBLE_QUOTE_REGEX = re.compile('|'.join(strange_double_quotes))
 SINGLE_QUOTE_REGEX = re.compile('|'.join(strange_single_quotes))
 
-with open('src/classes/emojis.txt') as f:
-    EMOJIS_REGEX = re.compile(''.join(f.readlines()).strip())
+EMOJIS_TABLE = load_table()
+EMOJIS_REGEX = compile_emojis_regex(EMOJIS_TABLE)
+EMOJI_CANDIDATE_REGEX = compile_candidate_regex(EMOJIS_TABLE)
+
+
+REPLACEMENTS = {
+    'mention': '<MENTION>',
+    'email': '<EMAIL>',
+    'currency': '<CURRENCY>',
+    'url': '<URL>',
+    'number': '<NUMBER>',
+    'digit': '0',
+    'emoji': '<EMOJI>',
+    'punct': ' ',
+}
+# Characters any match of a step must contain, searched before its regex
+# since lookarounds make regexes like URL_REGEX slow to scan a whole tweet
+CANDIDATE_REGEXES = {
+    'mention': re.compile('@'),
+    'email': re.compile('@'),
+    'url': re.compile('https?://|ftp://|www', flags=re.IGNORECASE),
+    'number': DIGITS_REGEX,
+    'emoji': EMOJI_CANDIDATE_REGEX,
+}
+
+
+class CleaningPlan:
+    """
+    Preprocessing flags compiled once into the chain of substitutions of
+    the step by step cleaning, followed by a single lowercase/tokenize/
+    stopwords step. Steps are skipped for texts without any character
+    their matches contain (i.e. mentions without any @), so most tweets
+    are only scanned by the cheap steps
+    """
+
+    def __init__(
+        self,
+        replace_mentions: bool = True,
+        filter_mentions: bool = True,
+        replace_emails: bool = True,
+        filter_emails: bool = True,
+        replace_currencies: bool = True,
+        filter_currencies: bool = True,
+        replace_urls: bool = True,
+        filter_urls: bool = True,
+        replace_numbers: bool = True,
+        filter_numbers: bool = True,
+        replace_digits: bool = True,
+        filter_digits: bool = True,
+        replace_emojis: bool = True,
+        filter_emojis: bool = True,
+        remove_punct: bool = True,
+        remove_multiple_spaces: bool = True,
+        to_lower: bool = True,
+        filter_stopwords: bool = True,
+    ):
+        steps = (
+            ('mention', replace_mentions, filter_mentions, MENTION_REGEX),
+            ('email', replace_emails, filter_emails, EMAIL_REGEX),
+            ('currency', replace_currencies, filter_currencies, CURRENCY_REGEX),
+            ('url', replace_urls, filter_urls, URL_REGEX),
+            ('number', replace_numbers, filter_numbers, NUMBERS_REGEX),
+            ('digit', replace_digits, filter_digits, DIGITS_REGEX),
+            ('emoji', replace_emojis, filter_emojis, EMOJIS_REGEX),
+            ('punct', remove_punct, False, PUNCTUATION_REGEX),
+        )
+        self.steps = [
+            (
+                CANDIDATE_REGEXES.get(name),
+                regex,
+                '' if filter_ else REPLACEMENTS[name],
+            )
+            for name, replace, filter_, regex in steps
+            if replace
+        ]
+        self.remove_multiple_spaces = remove_multiple_spaces
+        self.to_lower = to_lower
+        self.filter_stopwords = filter_stopwords
+
+    def normalize(self, text: str) -> str:
+        """
+        Apply every step but stopwords filtering to ``text``
+        """
+        for candidate, regex, replace_with in self.steps:
+            if candidate is None or candidate.search(text):
+                text = regex.sub(replace_with, text)
+        if self.remove_multiple_spaces:
+            text = MULTIPLE_SPACES_REGEX.sub(' ', text)
+        if self.to_lower:
+            text = text.lower()
+        return text
+
+    def clean(self, text: str, stopwords: frozenset = None) -> str:
+        text = self.normalize(text)
+        if self.filter_stopwords:
+            text = MyPreprocessor.filter_stopwords(text, stopwords)
+        return text
+
+
+@lru_cache(maxsize=None)
+def compile_cleaning_plan(**flags) -> CleaningPlan:
+    return CleaningPlan(**flags)
 
 
 class Preprocessor(ABC):
@@ -152,9 +255,9 @@ class Preprocessor(ABC):
 
 
 class MyPreprocessor(Preprocessor):
-    def __init__(self, storage_backend):
+    def __init__(self, storage_backend, language_detector=None):
         self._storage_backend = storage_backend
-        nltk.download('stopwords')
+        self._language_detector = language_detector or LanguageDetector()
 
     @timeit
     def run(
@@ -180,12 +283,17 @@ class MyPreprocessor(Preprocessor):
         to_lower: bool = True,
         filter_stopwords: bool = True,
         filter_empty_rows: bool = True,
+        stream: bool = False,
+        batch_size: int = 1000,
     ) -> dict:
         """
         This function gets a timeline from storage backend and
         clean text of each tweet for future procedures
         :param user: Twitter username
         :param save: If True cleaned timeline will be saved at backend storage
+        :param stream: Read, clean and save tweets lazily in batches of
+        ``batch_size`` tweets, so memory does not grow with the timeline.
+        Nothing is returned in this mode
         :param replace_mentions: Replace mentions with <MENTION>
         :param filter_mentions: Filter tweet <MENTION>s
         :param replace_emails: Replace mentions with <EMAIL>
@@ -207,9 +315,40 @@ class MyPreprocessor(Preprocessor):
         :param filter_empty_rows: Filter empty tweets after preprocessing
         """
         logger.info(f'Preprocessing {user} timeline')
+        flags = {
+            'replace_mentions': replace_mentions,
+            'filter_mentions': filter_mentions,
+            'replace_emails': replace_emails,
+            'filter_emails': filter_emails,
+            'replace_currencies': replace_currencies,
+            'filter_currencies': filter_currencies,
+            'replace_urls': replace_urls,
+            'filter_urls': filter_urls,
+            'replace_numbers': replace_numbers,
+            'filter_numbers': filter_numbers,
+            'replace_digits': replace_digits,
+            'filter_digits': filter_digits,
+            'replace_emojis': replace_emojis,
+            'filter_emojis': filter_emojis,
+            'remove_punct': remove_punct,
+            'remove_multiple_spaces': remove_multiple_spaces,
+            'to_lower': to_lower,
+            'filter_stopwords': filter_stopwords,
+        }
+        cleaned_timeline = None
         with self._storage_backend as backend:
             try:
-                timeline = backend.get_timeline(user)
+                if stream:
+                    self.run_stream(
+                        user,
+                        backend,
+                        save,
+                        batch_size,
+                        filter_empty_rows=filter_empty_rows,
+                        **flags,
+                    )
+                    return None
+                timeline = backend.get_timeline(user, ['tweets'])
                 if not timeline:
                     raise TimelineDoesNotExist(
                         f'There is no timeline for {user} saved in '
@@ -217,32 +356,98 @@ class MyPreprocessor(Preprocessor):
                     )
                 cleaned_timeline = self.clean_timeline(
                     timeline,
-                    replace_mentions=replace_mentions,
-                    filter_mentions=filter_mentions,
-                    replace_emails=replace_emails,
-                    filter_emails=replace_emails,
-                    replace_currencies=replace_currencies,
-                    filter_currencies=filter_currencies,
-                    replace_urls=replace_urls,
-                    filter_urls=filter_urls,
-                    replace_numbers=replace_numbers,
-                    filter_numbers=filter_numbers,
-                    replace_digits=replace_digits,
-                    filter_digits=filter_digits,
-                    replace_emojis=replace_emojis,
-                    filter_emojis=filter_emojis,
-                    remove_punct=remove_punct,
-                    remove_multiple_spaces=remove_multiple_spaces,
-                    to_lower=to_lower,
-                    filter_stopwords=filter_stopwords,
                     filter_empty_rows=filter_empty_rows,
+                    language_detector=self._language_detector,
+                    **flags,
                 )
                 if save:
-                    backend.update_timeline(user, cleaned_timeline)
+                    backend.update_timeline(
+                        user,
+                        {'cleaned_tweets': cleaned_timeline['cleaned_tweets']},
+                    )
             except Exception as e:
                 logger.error(e)
+                raise
         return cleaned_timeline
 
+    def run_stream(
+        self,
+        user: str,
+        backend,
+        save: bool = True,
+        batch_size: int = 1000,
+        filter_empty_rows: bool = True,
+        **flags,
+    ):
+        if not backend.exists_timeline(user):
+            raise TimelineDoesNotExist(
+                f'There is no timeline for {user} saved in '
+                f'{backend}. Please first, download it'
+            )
+        cleaned_tweets = self.clean_tweet_stream(
+            backend.iter_tweets(user, 'tweets', batch_size),
+            filter_empty_rows=filter_empty_rows,
+            language_detector=self._language_detector,
+            **flags,
+        )
+        if save:
+            n_tweets = backend.write_tweets(
+                user, 'cleaned_tweets', cleaned_tweets, batch_size
+            )
+        else:
+            n_tweets = sum(1 for _ in cleaned_tweets)
+        logger.info(f'There are {n_tweets} cleaned tweets of {user}')
+
+    @staticmethod
+    def clean_stream(
+        texts: iter, language_detector: LanguageDetector = None, **flags
+    ) -> iter:
+        """
+        Clean ``texts`` lazily, yielding a cleaned text per text. Stopwords
+        of timeline language detection modes are chosen with the first
+        ``sample_size`` texts
+        :param flags: Cleaning steps, as in ``clean_timeline``
+        """
+        plan = compile_cleaning_plan(**flags)
+        texts = (plan.normalize(text) for text in texts)
+        if not flags.get('filter_stopwords', True):
+            return texts
+        language_detector = language_detector or LanguageDetector()
+        sample = list(islice(texts, language_detector.sample_size))
+        stopwords = language_detector.get_stopwords(sample)
+        return (
+            MyPreprocessor.filter_stopwords(text, stopwords)
+            for text in chain(sample, texts)
+        )
+
+    @staticmethod
+    def clean_tweet_stream(
+        tweets: iter,
+        filter_empty_rows: bool = True,
+        language_detector: LanguageDetector = None,
+        **flags,
+    ) -> iter:
+        """
+        Clean ``tweets`` lazily, yielding cleaned tweets
+        """
+        tweets, texts = tee(tweets)
+        texts = MyPreprocessor.clean_stream(
+            (tweet['text'] for tweet in texts), language_detector, **flags
+        )
+        n_in = n_out = 0
+        for tweet, text in zip(tweets, texts):
+            n_in += 1
+            if filter_empty_rows and not text:
+                continue
+            n_out += 1
+            yield {
+                'id': tweet['id'],
+                'created_at': tweet['created_at'],
+                'text': text,
+            }
+        MetricsRegistry.count('tweets_in', n_in)
+        MetricsRegistry.count('tweets_out', n_out)
+
     @staticmethod
     def clean_timeline(
         timeline: dict,
@@ -265,11 +470,98 @@ class MyPreprocessor(Preprocessor):
         to_lower: bool = True,
         filter_stopwords: bool = True,
         filter_empty_rows: bool = True,
+        language_detector: LanguageDetector = None,
     ) -> dict:
         """
-        This function will do all text
-        transformations for each tweet in timeline
+        This function will do all text transformations for each tweet
+        in timeline with a cleaning plan compiled once for its flags
+        :param language_detector: Chooses stopwords of each tweet, by
+        default using the language of each tweet
         """
+        plan = compile_cleaning_plan(
+            replace_mentions=replace_mentions,
+            filter_mentions=filter_mentions,
+            replace_emails=replace_emails,
+            filter_emails=filter_emails,
+            replace_currencies=replace_currencies,
+            filter_currencies=filter_currencies,
+            replace_urls=replace_urls,
+            filter_urls=filter_urls,
+            replace_numbers=replace_numbers,
+            filter_numbers=filter_numbers,
+            replace_digits=replace_digits,
+            filter_digits=filter_digits,
+            replace_emojis=replace_emojis,
+            filter_emojis=filter_emojis,
+            remove_punct=remove_punct,
+            remove_multiple_spaces=remove_multiple_spaces,
+            to_lower=to_lower,
+            filter_stopwords=filter_stopwords,
+        )
+        tweets = timeline['tweets']
+        logger.info(f'Preprocessing {len(tweets)} tweets of {timeline["user"]}')
+        texts = [plan.normalize(tweet['text']) for tweet in tweets]
+        if filter_stopwords:
+            language_detector = language_detector or LanguageDetector()
+            stopwords = language_detector.get_stopwords(texts)
+            texts = [
+                MyPreprocessor.filter_stopwords(text, stopwords)
+                for text in texts
+            ]
+        cleaned_tweets = []
+        for tweet, text in zip(tweets, texts):
+            if filter_empty_rows and not text:
+                continue
+            cleaned_tweets.append(
+                {
+                    'id': tweet['id'],
+                    'created_at': tweet['created_at'],
+                    'text': text,
+                }
+            )
+        if filter_empty_rows:
+            logger.info(
+                f'There are {len(cleaned_tweets)} not null tweets '
+                f'of {timeline["user"]}'
+            )
+        MetricsRegistry.count('tweets_in', len(tweets))
+        MetricsRegistry.count('tweets_out', len(cleaned_tweets))
+
+        return {
+            'user': timeline['user'],
+            'tweets': tweets,
+            'cleaned_tweets': cleaned_tweets,
+        }
+
+    @staticmethod
+    def clean_timeline_stepwise(
+        timeline: dict,
+        replace_mentions: bool = True,
+        filter_mentions: bool = True,
+        replace_emails: bool = True,
+        filter_emails: bool = True,
+        replace_currencies: bool = True,
+        filter_currencies: bool = True,
+        replace_urls: bool = True,
+        filter_urls: bool = True,
+        replace_numbers: bool = True,
+        filter_numbers: bool = True,
+        replace_digits: bool = True,
+        filter_digits: bool = True,
+        replace_emojis: bool = True,
+        filter_emojis: bool = True,
+        remove_punct: bool = True,
+        remove_multiple_spaces: bool = True,
+        to_lower: bool = True,
+        filter_stopwords: bool = True,
+        filter_empty_rows: bool = True,
+    ) -> dict:
+        """
+        Reference implementation of ``clean_timeline`` applying each step
+        as a separate pass over the timeline
+        """
+        import pandas as pd
+
         df = pd.DataFrame(
             timeline['tweets'], columns=['id', 'created_at', 'text']
         )
@@ -388,7 +680,7 @@ class MyPreprocessor(Preprocessor):
         Replace all digits in ``text`` str with `
         `replace_with`` str, i.e., 123.34 to 000.00
         """
-        return re.sub(r'\d', replace_with, text)
+        return DIGITS_REGEX.sub(replace_with, text)
 
     @staticmethod
     def replace_currencies(text: str, replace_with: str = '<CURRENCY>') -> str:
@@ -435,33 +727,24 @@ class MyPreprocessor(Preprocessor):
         """
         Replace multiple spaces by single one
         """
-        return re.sub(' +', ' ', text)
+        return MULTIPLE_SPACES_REGEX.sub(' ', text)
 
     @staticmethod
-    def get_stopwords(text):
+    def get_stopwords(text) -> frozenset:
         """
         Get stopwords using text language
         """
-        try:
-            lang = detect(text)
-        except LangDetectException:
-            lang = 'en'
-        stopwords = []
-        if lang in LANGUAGE_MAPPING:
-            stopwords = get_stop_words(lang)
-            try:
-                stopwords.extend(nltk_stopwords.words(LANGUAGE_MAPPING[lang]))
-            except OSError:
-                # NLTK does not have lang stopwords
-                pass
-        return stopwords
+        return StopwordRegistry.get(LanguageDetector.detect(text))
 
     @staticmethod
-    def filter_stopwords(text: str):
+    def filter_stopwords(text: str, stopwords: frozenset = None):
         """
         Filter language specified stopwords from ``text``
+        :param stopwords: Timeline stopwords, if None they
+        are chosen using ``text`` language
         """
-        stopwords = MyPreprocessor.get_stopwords(text)
+        if stopwords is None:
+            stopwords = MyPreprocessor.get_stopwords(text)
         filtered_words = [
             word for word in text.split() if word not in stopwords
         ]
@@ -8,6 +8,8 @@ from loguru import logger
 
 from .decorators import timeit
 from .exceptions import UserDoesNotExist
+from .metrics import MetricsRegistry
+from .rate_limits import RateLimitScheduler
 
 
 class Provider(ABC):
@@ -28,23 +30,39 @@ class Provider(ABC):
 
     @abstractmethod
     def download_timeline(
-        self, user: str, limit=None, filter_retweets: bool = True
+        self,
+        user: str,
+        limit=None,
+        filter_retweets: bool = True,
+        since_id: int = None,
     ) -> dict:
         pass
 
 
 class TweepyProvider(Provider):
+    # Maximum number of tweets per user timeline request
+    PAGE_SIZE = 200
+
     def __init__(
         self,
         public_key: str,
         secret_key: str,
         access_token: str,
         secret_token: str,
+        scheduler: RateLimitScheduler = None,
+        retry_delay: int = 60,
     ):
+        """
+        :param scheduler: Rate limit scheduler, share it between
+        providers of different processes to share rate limits
+        :param retry_delay: Seconds to wait after an API error
+        """
         self._public_key = public_key
         self._secret_key = secret_key
         self._access_token = access_token
         self._access_token_secret = secret_token
+        self._scheduler = scheduler or RateLimitScheduler()
+        self.retry_delay = retry_delay
 
     @property
     def name(self):
@@ -66,29 +84,36 @@ class TweepyProvider(Provider):
 
     @timeit
     def download_timeline(
-        self, user: str, limit: int = None, filter_rts: bool = False
+        self,
+        user: str,
+        limit: int = None,
+        filter_rts: bool = False,
+        since_id: int = None,
     ) -> dict:
         """
         Download user tweets ignoring retweets
         :param user: Twitter username
         :param limit: Number of tweets to download
         :param filter_rts: Filter user retweets
+        :param since_id: Only download tweets newer than this tweet id
         """
         logger.info(f'Downloading {user} timeline')
         timeline = {'user': user, 'tweets': []}
-        cursor = tweepy.Cursor(
-            self.api.user_timeline, screen_name=user, tweet_mode='extended'
-        ).items()
-        try:
-            tweet = cursor.next()
-        except tweepy.TweepError as e:
-            print(e)
-            raise UserDoesNotExist(
-                f'User {user} does not exist '
-                f'or it has not registered tweets. e: {e}'
-            )
+        kwargs = {'since_id': since_id} if since_id else {}
+        pages = tweepy.Cursor(
+            self.api.user_timeline,
+            screen_name=user,
+            tweet_mode='extended',
+            count=self.PAGE_SIZE,
+            **kwargs,
+        ).pages()
+        first = True
         while True:
-            try:
+            page = self.download_page(pages, user, first)
+            if page is None:
+                break
+            first = False
+            for tweet in page:
                 if filter_rts and self.__class__.is_retweet(tweet):
                     continue
                 timeline['tweets'].append(
@@ -99,12 +124,40 @@ class TweepyProvider(Provider):
                     }
                 )
                 if limit and len(timeline['tweets']) >= limit:
-                    break
-                tweet = cursor.next()
-            except tweepy.TweepError:
-                logger.warning('TweepError: Delaying...')
-                time.sleep(60 * 15)
-                continue
-            except StopIteration:
-                break
+                    MetricsRegistry.count('tweets_out', len(timeline['tweets']))
+                    return timeline
+        if not timeline['tweets']:
+            logger.info(f'There are no new tweets of {user}')
+        MetricsRegistry.count('tweets_out', len(timeline['tweets']))
         return timeline
+
+    def download_page(self, pages, user: str, first: bool = False):
+        """
+        Download next timeline page waiting for the rate limit scheduler
+        :return: Page tweets or None if there are no more pages
+        """
+        while True:
+            self._scheduler.acquire()
+            try:
+                page = pages.next()
+            except StopIteration:
+                return None
+            except tweepy.RateLimitError as e:
+                logger.warning('Rate limit exceeded')
+                MetricsRegistry.count('api_retries', reason='rate_limit')
+                self._scheduler.exhaust(e.response)
+                continue
+            except tweepy.TweepError as e:
+                if first:
+                    raise UserDoesNotExist(
+                        f'User {user} does not exist '
+                        f'or it has not registered tweets. e: {e}'
+                    )
+                logger.warning(f'TweepError: Retrying in {self.retry_delay}s')
+                MetricsRegistry.count('api_retries', reason='error')
+                time.sleep(self.retry_delay)
+                MetricsRegistry.count('sleep_seconds', self.retry_delay)
+                continue
+            MetricsRegistry.count('api_pages')
+            self._scheduler.update(getattr(self.api, 'last_response', None))
+            return page
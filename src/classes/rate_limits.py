@@ -0,0 +1,83 @@
+# -*- coding: UTF-8 -*-
+
+import multiprocessing as mp
+import time
+
+from loguru import logger
+
+from .metrics import MetricsRegistry
+
+
+class RateLimitScheduler:
+    """
+    Token bucket of API calls shared by every worker process created after
+    it. Tokens are synchronized with the x-rate-limit-remaining and
+    x-rate-limit-reset headers of API responses, and workers without tokens
+    sleep exactly until the rate limit window resets
+    """
+
+    def __init__(self, limit: int = 900, window: int = 15 * 60):
+        self.limit = limit
+        self.window = window
+        self._lock = mp.Lock()
+        self._remaining = mp.Value('i', limit, lock=False)
+        self._reset_at = mp.Value('d', 0.0, lock=False)
+
+    @property
+    def remaining(self) -> int:
+        return self._remaining.value
+
+    @property
+    def reset_at(self) -> float:
+        return self._reset_at.value
+
+    def acquire(self) -> float:
+        """
+        Take a token to call the API, waiting for the next window if there
+        are none left
+        :return: Seconds slept waiting for a token
+        """
+        slept = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                if now >= self._reset_at.value:
+                    self._remaining.value = self.limit
+                    self._reset_at.value = now + self.window
+                if self._remaining.value > 0:
+                    self._remaining.value -= 1
+                    return slept
+                wait = self._reset_at.value - now
+            logger.warning(f'Rate limit reached: Waiting {round(wait)}s...')
+            time.sleep(wait)
+            MetricsRegistry.count('sleep_seconds', wait)
+            slept += wait
+
+    def update(self, response):
+        """
+        Synchronize tokens with the rate limit headers of an API ``response``
+        """
+        headers = getattr(response, 'headers', None) or {}
+        try:
+            remaining = int(headers['x-rate-limit-remaining'])
+            reset_at = float(headers['x-rate-limit-reset'])
+        except (KeyError, ValueError):
+            return
+        with self._lock:
+            if reset_at > self._reset_at.value:
+                # A new window has started
+                self._remaining.value = remaining
+            else:
+                # Requests of other workers could still be in flight
+                self._remaining.value = min(remaining, self._remaining.value)
+            self._reset_at.value = reset_at
+
+    def exhaust(self, response=None):
+        """
+        Mark the window as exhausted after a rate limit error
+        """
+        self.update(response)
+        with self._lock:
+            self._remaining.value = 0
+            if self._reset_at.value <= time.time():
+                self._reset_at.value = time.time() + self.window
@@ -0,0 +1,152 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import multiprocessing as mp
+import os
+import warnings
+
+from loguru import logger
+
+
+def import_pyldavis():
+    # Imported only to build reports since it takes long to import
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        import pyLDAvis
+        import pyLDAvis.gensim
+    return pyLDAvis
+
+
+class PreparedReport:
+    """
+    Visualization data in the JSON format pyLDAvis renders
+    """
+
+    def __init__(self, data: str):
+        self.data = data
+
+    def to_json(self) -> str:
+        return self.data
+
+
+def run_reports(queue: mp.Queue, lda):
+    for user, key in iter(queue.get, None):
+        try:
+            lda.generate_report(user, key)
+        except Exception as e:
+            logger.error(f'Cannot generate report {key}: {e}')
+
+
+class ReportGenerator:
+    """
+    pyLDAvis reports of models saved at ``path`` as HTML, built from their
+    visualization data which is cached by model key as compact JSON, so
+    HTML files are only built again when they are missing or older than
+    their data. Modes:
+    - inline: reports are generated right after inferring models
+    - background: reports of saved models are generated by a process of
+      the generator while models are being inferred
+    - lazy: reports are only generated when requested with
+      `python profiler.py generate_reports`
+    - off: reports are never generated
+    """
+
+    MODES = ('inline', 'background', 'lazy', 'off')
+
+    def __init__(self, path: str = 'output', mode: str = 'inline'):
+        if mode not in self.MODES:
+            raise ValueError(f'Report mode {mode} is not one of {self.MODES}')
+        self.path = path
+        self.mode = mode
+        self._queue = None
+        self._process = None
+
+    def __repr__(self):
+        return f'{self.mode} reports at {self.path}'
+
+    def __getstate__(self):
+        # Workers started after the process only need its queue
+        return {**self.__dict__, '_process': None}
+
+    def get_paths(self, key: str) -> (str, str):
+        base = os.path.join(self.path, key)
+        return f'{base}.html', f'{base}.json'
+
+    def is_cached(self, key: str) -> bool:
+        return os.path.exists(self.get_paths(key)[1])
+
+    def is_fresh(self, key: str) -> bool:
+        html_path, data_path = self.get_paths(key)
+        try:
+            html_time = os.path.getmtime(html_path)
+        except OSError:
+            return False
+        try:
+            return html_time >= os.path.getmtime(data_path)
+        except OSError:
+            # Report built before data was cached
+            return True
+
+    @staticmethod
+    def prepare(model, bow: iter, dictionary) -> str:
+        data = import_pyldavis().gensim.prepare(model, bow, dictionary)
+        return json.dumps(json.loads(data.to_json()), separators=(',', ':'))
+
+    @staticmethod
+    def write(path: str, content: str):
+        # Concurrent workers could be writing the same report
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+
+    def build(self, key: str, model=None, bow: iter = None, dictionary=None):
+        """
+        Build the report of ``key`` from its cached data or, if it is not
+        cached, from ``model``, ``bow`` and ``dictionary``
+        """
+        os.makedirs(self.path, exist_ok=True)
+        html_path, data_path = self.get_paths(key)
+        if self.is_cached(key):
+            with open(data_path) as file:
+                data = file.read()
+        else:
+            logger.info(f'Preparing report {key}...')
+            data = self.prepare(model, bow, dictionary)
+            self.write(data_path, data)
+        self.write(
+            html_path,
+            import_pyldavis().prepared_data_to_html(PreparedReport(data)),
+        )
+        logger.info(f'Report {key} saved at {html_path}')
+
+    def start(self, lda):
+        """
+        Start the process generating the reports deferred by ``lda`` and
+        the workers forked after it, in background mode
+        """
+        if self.mode != 'background':
+            return
+        self._queue = mp.Queue()
+        self._process = mp.Process(
+            target=run_reports, args=(self._queue, lda), daemon=True
+        )
+        self._process.start()
+
+    def defer(self, user: str, key: str):
+        if self.mode != 'background':
+            return
+        if self._queue is None:
+            logger.warning(f'Reports are not running, {key} is left for later')
+            return
+        self._queue.put((user, key))
+
+    def stop(self):
+        """
+        Wait for the deferred reports
+        """
+        if self._process is None:
+            return
+        self._queue.put(None)
+        self._process.join()
+        self._queue = self._process = None
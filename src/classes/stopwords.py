@@ -0,0 +1,118 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+
+from loguru import logger
+from stop_words import LANGUAGE_MAPPING, get_stop_words
+
+
+class StopwordRegistry:
+    """
+    Process wide registry with a frozenset of stopwords per language which
+    is built the first time the language is requested. Languages preloaded
+    before forking worker processes are shared with them.
+    Stopwords are read from a bundle saved by ``save_bundle`` when it is
+    loaded, so they never need network access, or else from the stop-words
+    package and NLTK, whose data is downloaded once if it is missing
+    """
+
+    _stopwords = {}
+    _bundle = {}
+    _download_tried = False
+
+    @classmethod
+    def get(cls, lang: str) -> frozenset:
+        try:
+            return cls._stopwords[lang]
+        except KeyError:
+            stopwords = cls._stopwords[lang] = cls.build(lang)
+            return stopwords
+
+    @classmethod
+    def preload(cls, languages: iter):
+        for lang in languages:
+            cls.get(lang)
+        logger.info(f'Stopwords loaded for {", ".join(cls._stopwords)}')
+
+    @classmethod
+    def clear(cls):
+        cls._stopwords.clear()
+        cls._bundle.clear()
+
+    @classmethod
+    def build(cls, lang: str) -> frozenset:
+        if lang in cls._bundle:
+            return frozenset(cls._bundle[lang])
+        return cls.build_from_packages(lang)
+
+    @classmethod
+    def build_from_packages(cls, lang: str, download: bool = True) -> frozenset:
+        if lang not in LANGUAGE_MAPPING:
+            return frozenset()
+        stopwords = set(get_stop_words(lang))
+        try:
+            stopwords.update(cls.get_nltk_stopwords(lang))
+        except LookupError:
+            # NLTK stopwords are not downloaded
+            if download and cls.download_nltk():
+                return cls.build_from_packages(lang, download=False)
+        except OSError:
+            # NLTK does not have lang stopwords
+            pass
+        return frozenset(stopwords)
+
+    @staticmethod
+    def get_nltk_stopwords(lang: str) -> list:
+        # NLTK takes long to import and is only needed without a bundle
+        from nltk.corpus import stopwords
+
+        return stopwords.words(LANGUAGE_MAPPING[lang])
+
+    @classmethod
+    def download_nltk(cls) -> bool:
+        """
+        Download NLTK stopwords, only tried once per process
+        :return: Whether they have been downloaded
+        """
+        if cls._download_tried:
+            return False
+        cls._download_tried = True
+        import nltk
+
+        logger.info('Downloading NLTK stopwords')
+        return nltk.download('stopwords', quiet=True)
+
+    @classmethod
+    def load_bundle(cls, path: str) -> bool:
+        """
+        :return: Whether there is a bundle at ``path``
+        """
+        try:
+            with open(path) as file:
+                cls._bundle.update(json.load(file))
+        except FileNotFoundError:
+            logger.warning(
+                f'There is no stopwords bundle at {path}, NLTK stopwords '
+                'will be downloaded if missing. Please run `python '
+                'profiler.py bundle_stopwords --download` to create it'
+            )
+            return False
+        return True
+
+    @classmethod
+    def save_bundle(cls, path: str, download: bool = False):
+        """
+        Save the stopwords of every language of the stop-words package,
+        with the NLTK ones which are downloaded first if ``download``
+        """
+        if download:
+            cls._download_tried = False
+        bundle = {
+            lang: sorted(cls.build_from_packages(lang, download))
+            for lang in LANGUAGE_MAPPING
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(bundle, file, ensure_ascii=False, sort_keys=True)
+        logger.info(f'Stopwords of {len(bundle)} languages saved at {path}')
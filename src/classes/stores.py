@@ -0,0 +1,184 @@
+# -*- coding: UTF-8 -*-
+
+import hashlib
+import os
+from collections import OrderedDict
+from glob import glob
+
+from gensim import corpora
+from loguru import logger
+
+
+class CorpusStore:
+    """
+    Bag of words corpora serialized in Matrix Market format with an index,
+    plus their dictionary, once per cleaned timeline and LDA data
+    preparation settings. Loaded corpora are streamed from disk document
+    by document instead of being kept in memory.
+    The ``cache_size`` last used corpora of the process are also kept in
+    memory and only the ``max_corpora`` last used ones are kept on disk.
+    Without ``path`` corpora are only kept in memory
+    """
+
+    def __init__(
+        self,
+        path: str = 'output/corpora',
+        max_corpora: int = 1000,
+        cache_size: int = 8,
+    ):
+        self.path = path
+        self.max_corpora = max_corpora
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def __repr__(self):
+        return f'corpus store at {self.path or "memory"}'
+
+    @staticmethod
+    def get_key(texts: list, use_bigrams: bool, min_df: int) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f'bigrams={use_bigrams},min_df={min_df}'.encode())
+        for text in texts:
+            digest.update(b'\n')
+            digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_paths(self, key: str) -> (str, str):
+        base = os.path.join(self.path, key)
+        return f'{base}.mm', f'{base}.dict'
+
+    def exists(self, key: str) -> bool:
+        if key in self._cache:
+            return True
+        # The dictionary is written last so it marks a complete corpus
+        return bool(self.path) and os.path.exists(self.get_paths(key)[1])
+
+    def load(self, key: str):
+        """
+        :return: Corpus and dictionary or None if they are not saved
+        """
+        try:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        except KeyError:
+            pass
+        if not self.exists(key):
+            return None
+        corpus_path, dictionary_path = self.get_paths(key)
+        logger.info(f'Loading corpus {key} from {self}')
+        try:
+            # Modification time tracks the last use of the corpus
+            os.utime(dictionary_path)
+            prepared_data = (
+                corpora.MmCorpus(corpus_path),
+                corpora.Dictionary.load(dictionary_path),
+            )
+        except OSError:
+            # Evicted by another worker
+            return None
+        self.remember(key, prepared_data)
+        return prepared_data
+
+    def save(
+        self, key: str, bow: iter, dictionary: corpora.Dictionary
+    ) -> (corpora.MmCorpus, corpora.Dictionary):
+        """
+        Serialize ``bow`` documents while they are generated
+        :return: Saved corpus and dictionary
+        """
+        if not self.path:
+            prepared_data = (list(bow), dictionary)
+            self.remember(key, prepared_data)
+            return prepared_data
+        os.makedirs(self.path, exist_ok=True)
+        corpus_path, dictionary_path = self.get_paths(key)
+        # Concurrent workers could be saving the same corpus
+        tmp_corpus_path = f'{corpus_path}.{os.getpid()}.tmp'
+        corpora.MmCorpus.serialize(tmp_corpus_path, bow, id2word=dictionary)
+        os.replace(f'{tmp_corpus_path}.index', f'{corpus_path}.index')
+        os.replace(tmp_corpus_path, corpus_path)
+        tmp_dictionary_path = f'{dictionary_path}.{os.getpid()}.tmp'
+        dictionary.save(tmp_dictionary_path)
+        os.replace(tmp_dictionary_path, dictionary_path)
+        logger.info(f'Corpus {key} saved at {self}')
+        prepared_data = (corpora.MmCorpus(corpus_path), dictionary)
+        self.remember(key, prepared_data)
+        self.evict()
+        return prepared_data
+
+    def remember(self, key: str, prepared_data: tuple):
+        self._cache[key] = prepared_data
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def get_last_use(path: str) -> float:
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0.0
+
+    def evict(self):
+        """
+        Delete the least recently used corpora over ``max_corpora``
+        """
+        dictionary_paths = glob(os.path.join(self.path, '*.dict'))
+        if len(dictionary_paths) <= self.max_corpora:
+            return
+        dictionary_paths.sort(key=self.get_last_use)
+        for dictionary_path in dictionary_paths[: -self.max_corpora]:
+            key = os.path.basename(dictionary_path)[: -len('.dict')]
+            corpus_path, _ = self.get_paths(key)
+            self._cache.pop(key, None)
+            logger.info(f'Evicting corpus {key} from {self}')
+            for path in (dictionary_path, corpus_path, f'{corpus_path}.index'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+class ModelRegistry:
+    """
+    Models saved in a storage backend under keys made from every inference
+    parameter and the hash of the corpus, so a model is only reused for the
+    exact same input. Saved models are kept under a storage budget of
+    ``max_size`` bytes by deleting the least recently used ones with
+    ``evict``, once per run since it lists the models of every user
+    """
+
+    def __init__(self, storage_backend, max_size: int = None):
+        self._storage_backend = storage_backend
+        self.max_size = max_size
+
+    @staticmethod
+    def get_key(user: str, texts: list, **params) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        for name, value in sorted(params.items()):
+            digest.update(f'{name}={value},'.encode())
+        digest.update(CorpusStore.get_key(texts, None, None).encode())
+        return f'{user}-{digest.hexdigest()}'
+
+    def load(self, user: str, key: str) -> bytes:
+        return self._storage_backend.load_model(user, key)
+
+    def save(self, user: str, key: str, model: bytes, metadata: dict = None):
+        self._storage_backend.save_model(user, key, model, metadata)
+
+    def evict(self):
+        """
+        Delete the least recently used models while the saved models take
+        more than ``max_size`` bytes
+        """
+        if self.max_size is None:
+            return
+        with self._storage_backend as backend:
+            models = backend.list_models()
+            size = sum(model['size'] for model in models)
+            for model in sorted(models, key=lambda model: model['last_used']):
+                if size <= self.max_size:
+                    break
+                backend.delete_model(model['user'], model['key'])
+                size -= model['size']
+        logger.info(f'Saved models take {size} bytes')
@@ -0,0 +1,289 @@
+# -*- coding: UTF-8 -*-
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from gensim import corpora
+from gensim.models import CoherenceModel
+from loguru import logger
+
+from .budgets import CpuBudget
+from .decorators import timeit
+from .engines import MulticoreEngine
+from .lda import LDA
+
+
+class SharedCorpus:
+    """
+    Bag of words corpus kept in a single shared memory block as compressed
+    sparse rows (document offsets, term ids and counts), so every worker
+    process reads the same corpus without copying or preparing it again.
+    Pickling a shared corpus only sends the name of its block
+    """
+
+    def __init__(self, name: str, n_documents: int, n_values: int):
+        self.name = name
+        self.n_documents = n_documents
+        self.n_values = n_values
+        self._block = None
+        self._arrays = None
+
+    @classmethod
+    def create(cls, bow: iter) -> 'SharedCorpus':
+        offsets = [0]
+        ids = []
+        counts = []
+        for document in bow:
+            for term_id, count in document:
+                ids.append(term_id)
+                counts.append(count)
+            offsets.append(len(ids))
+        corpus = cls(None, len(offsets) - 1, len(ids))
+        corpus._block = shared_memory.SharedMemory(
+            create=True, size=max(corpus.get_size(), 1)
+        )
+        corpus.name = corpus._block.name
+        indptr, term_ids, term_counts = corpus.arrays
+        indptr[:] = offsets
+        term_ids[:] = ids
+        term_counts[:] = counts
+        return corpus
+
+    def __getstate__(self):
+        return {
+            'name': self.name,
+            'n_documents': self.n_documents,
+            'n_values': self.n_values,
+        }
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def __len__(self):
+        return self.n_documents
+
+    def __iter__(self):
+        indptr, term_ids, term_counts = self.arrays
+        for i in range(self.n_documents):
+            start, end = indptr[i], indptr[i + 1]
+            yield list(
+                zip(
+                    term_ids[start:end].tolist(),
+                    term_counts[start:end].tolist(),
+                )
+            )
+
+    def get_size(self) -> int:
+        return (self.n_documents + 1) * 8 + self.n_values * 8
+
+    @property
+    def arrays(self) -> (np.ndarray, np.ndarray, np.ndarray):
+        if self._arrays is None:
+            if self._block is None:
+                self._block = shared_memory.SharedMemory(self.name)
+            buffer = self._block.buf
+            ids_offset = (self.n_documents + 1) * 8
+            counts_offset = ids_offset + self.n_values * 4
+            self._arrays = (
+                np.ndarray((self.n_documents + 1,), np.int64, buffer),
+                np.ndarray((self.n_values,), np.int32, buffer, ids_offset),
+                np.ndarray((self.n_values,), np.float32, buffer, counts_offset),
+            )
+        return self._arrays
+
+    def close(self):
+        self._arrays = None
+        if self._block is not None:
+            self._block.close()
+            self._block = None
+
+    def unlink(self):
+        """
+        Free the shared memory block, once no worker uses it anymore
+        """
+        block = self._block or shared_memory.SharedMemory(self.name)
+        self._arrays = None
+        block.close()
+        block.unlink()
+        self._block = None
+
+
+# Corpus and dictionary of the sweep worker, set once when the worker starts
+_data = None
+
+
+def init_sweep_worker(
+    corpus: SharedCorpus, dictionary: corpora.Dictionary, threads: int
+):
+    global _data
+    _data = (corpus, dictionary)
+    CpuBudget.limit_threads(threads)
+
+
+def train_model(n_topics: int, n_passes: int, workers: int) -> dict:
+    """
+    Infer a model of the worker corpus with ``workers`` processes and score
+    it by u_mass coherence (higher is better) and perplexity (lower is
+    better)
+    """
+    corpus, dictionary = _data
+    engine = MulticoreEngine()
+    engine.set_cores(workers)
+    model = engine.infer(corpus, dictionary, n_topics, n_passes)
+    coherence = CoherenceModel(
+        model=model, corpus=corpus, dictionary=dictionary, coherence='u_mass'
+    ).get_coherence()
+    # The shared corpus is read in place, without a copy per worker
+    perplexity = float(np.exp2(-model.log_perplexity(corpus)))
+    return {
+        'n_topics': n_topics,
+        'n_passes': n_passes,
+        'coherence': float(coherence),
+        'perplexity': perplexity,
+        'model': model,
+    }
+
+
+class LDASweep(LDA):
+    """
+    Infers a model for every combination of ``topics`` and ``passes`` in
+    parallel and keeps the one with the best coherence, with perplexity to
+    break ties. The corpus is prepared once and shared with the workers,
+    and models are trained with at most ``cpu_budget`` processes in total
+    counting the ones LdaMulticore runs
+    """
+
+    def __init__(
+        self,
+        storage_backend,
+        topics: list = (3, 5, 8, 10),
+        passes: list = None,
+        cpu_budget: int = None,
+        **kwargs,
+    ):
+        self.topics = list(topics)
+        self.passes = list(passes or [kwargs.pop('n_passes', 200)])
+        kwargs.pop('n_topics', None)
+        super().__init__(
+            storage_backend,
+            n_topics=self.topics[0],
+            n_passes=self.passes[0],
+            **kwargs,
+        )
+        self.cpu_budget = cpu_budget or os.cpu_count() or 1
+
+    def get_grid(self) -> list:
+        return [
+            (n_topics, n_passes)
+            for n_topics in self.topics
+            for n_passes in self.passes
+        ]
+
+    def plan(self, n_models: int) -> (int, int):
+        """
+        Split the CPU budget between models trained at the same time and
+        processes of each model
+        :return: Parallel models and processes per model
+        """
+        parallel_models = max(1, min(n_models, self.cpu_budget))
+        return parallel_models, max(1, self.cpu_budget // parallel_models)
+
+    @timeit
+    def run(self, user: str, save: bool = True, verbose: bool = False):
+        logger.info(f'Run LDA sweep for {user} timeline')
+        with self._storage_backend as backend:
+            try:
+                timeline = self.__class__.get_timeline(user, backend)
+                bow, dictionary = self.prepare_data(timeline)
+                results = self.sweep(bow, dictionary)
+                best = self.choose(results)
+                if best and save:
+                    self.save_best(best, timeline, bow, dictionary, verbose)
+                return results
+            except Exception as e:
+                logger.error(e)
+                raise
+
+    def sweep(self, bow: iter, dictionary: corpora.Dictionary) -> list:
+        """
+        :return: Scores and model of each combination, without the failed
+        ones
+        """
+        grid = self.get_grid()
+        parallel_models, model_workers = self.plan(len(grid))
+        logger.info(
+            f'Sweeping {len(grid)} models, {parallel_models} at a time with '
+            f'{model_workers} processes each'
+        )
+        corpus = SharedCorpus.create(bow)
+        results = []
+        try:
+            with ProcessPoolExecutor(
+                max_workers=parallel_models,
+                initializer=init_sweep_worker,
+                initargs=(corpus, dictionary, model_workers),
+            ) as pool:
+                futures = {
+                    pool.submit(train_model, *params, model_workers): params
+                    for params in grid
+                }
+                for future in as_completed(futures):
+                    n_topics, n_passes = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(
+                            f'Cannot infer LDA with n_topics={n_topics} and '
+                            f'n_passes={n_passes}: {e}'
+                        )
+                        continue
+                    logger.info(
+                        f'n_topics={n_topics}, n_passes={n_passes}: '
+                        f'coherence={result["coherence"]:.4f}, '
+                        f'perplexity={result["perplexity"]:.2f}'
+                    )
+                    results.append(result)
+        finally:
+            corpus.unlink()
+        return results
+
+    @staticmethod
+    def choose(results: list):
+        if not results:
+            return None
+        return max(
+            results,
+            key=lambda result: (result['coherence'], -result['perplexity']),
+        )
+
+    def save_best(
+        self,
+        best: dict,
+        timeline: dict,
+        bow: iter,
+        dictionary: corpora.Dictionary,
+        verbose: bool = False,
+    ):
+        """
+        Save the best model under the key it would have if it was inferred
+        with its settings by LDA, so it is reused by later runs
+        """
+        logger.info(
+            f'Best model has n_topics={best["n_topics"]} and '
+            f'n_passes={best["n_passes"]}'
+        )
+        lda = copy.copy(self)
+        lda.n_topics = best['n_topics']
+        lda.n_passes = best['n_passes']
+        model = best['model']
+        model.base_documents = len(timeline['cleaned_tweets'])
+        exec_key = lda.get_execution_key(timeline)
+        if verbose:
+            lda.print_terms(model)
+        if self._reports.mode == 'inline':
+            lda.generate_html(model, bow, dictionary, exec_key)
+        lda.save_model(model, timeline, exec_key)
+        self._reports.defer(timeline['user'], exec_key)
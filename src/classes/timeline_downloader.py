@@ -18,6 +18,7 @@ class TimelineDownloader:
         limit: int = None,
         save: bool = False,
         filter_rts: bool = False,
+        refresh: bool = False,
     ):
         """
         Download user tweets ignoring retweets
@@ -25,11 +26,18 @@ class TimelineDownloader:
         :param limit: Number of tweets to download
         :param save: If True timeline will be saved in backend storage
         :param filter_rts: Filter user retweets
+        :param refresh: If True and timeline is already saved, only tweets
+        newer than the saved ones are downloaded and appended to it
         """
         logger.info(f'Downloading tweets using {self._provider}')
         with self._storage_backend as backend:
             try:
-                if backend.exists_timeline(user):
+                exists = backend.exists_timeline(user)
+                if exists and refresh:
+                    self.refresh_timeline(
+                        user, backend, limit, save, filter_rts
+                    )
+                elif exists:
                     logger.info(
                         f'Timeline already downloaded and saved in {backend}'
                     )
@@ -42,3 +50,21 @@ class TimelineDownloader:
                             self.save_timeline(timeline)
             except Exception as e:
                 logger.error(e)
+                raise
+
+    def refresh_timeline(
+        self,
+        user: str,
+        backend,
+        limit: int = None,
+        save: bool = False,
+        filter_rts: bool = False,
+    ):
+        since_id = backend.get_newest_tweet_id(user)
+        logger.info(f'Refreshing {user} timeline since tweet {since_id}')
+        with self._provider as provider:
+            timeline = provider.download_timeline(
+                user, limit, filter_rts=filter_rts, since_id=since_id
+            )
+        if save and timeline['tweets']:
+            backend.append_tweets(user, timeline['tweets'])
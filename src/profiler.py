@@ -1,15 +1,15 @@
 # -*- coding: UTF-8 -*-
 
-import multiprocessing as mp
+import sys
 
 import fire
 
-from classes.backends import MongoBackend
-from classes.lda import LDA
-from classes.preprocessors import MyPreprocessor
-from classes.providers import TweepyProvider
-from classes.timeline_downloader import TimelineDownloader
+from classes.backends import MongoBackend, MongoTweetsBackend
+from classes.budgets import CpuBudget
+from classes.executors import Executor
+from classes.metrics import MetricsRegistry
 from settings import (
+    CPU_BUDGET,
     FILTER_CURRENCIES,
     FILTER_DIGITS,
     FILTER_EMAILS,
@@ -20,10 +20,30 @@ from settings import (
     FILTER_RTS,
     FILTER_STOPWORDS,
     FILTER_URLS,
+    LANGUAGE_DETECTION_MODE,
+    LANGUAGE_HISTOGRAM_THRESHOLD,
+    LANGUAGE_SAMPLE_SIZE,
+    LDA_CORPUS_CACHE_SIZE,
+    LDA_CORPUS_PATH,
+    LDA_ENGINE,
+    LDA_GIBBS_MAX_DOCUMENTS,
+    LDA_INCREMENTAL,
+    LDA_JOINT_BATCH_SIZE,
+    LDA_JOINT_PATH,
+    LDA_MAX_CORPORA,
+    LDA_MAX_DRIFT,
+    LDA_MODELS_MAX_SIZE,
     LDA_MIN_DF,
     LDA_N_PASSES,
+    LDA_ONLINE_MAX_DOCUMENTS,
+    LDA_REPORTS,
+    LDA_REPORTS_PATH,
+    LDA_SWEEP_PASSES,
+    LDA_SWEEP_TOPICS,
     LDA_USE_BIGRAMS,
+    METRICS_PATH,
     MONGO_DB,
+    MONGO_LAYOUT,
     MONGO_PORT,
     MONGO_URL,
     REMOVE_MULTIPLE_SPACES,
@@ -35,14 +55,26 @@ from settings import (
     REPLACE_MENTIONS,
     REPLACE_NUMBERS,
     REPLACE_URLS,
+    STOPWORDS_LANGUAGES,
+    STREAM_BATCH_SIZE,
+    STOPWORDS_BUNDLE,
+    STREAM_PREPROCESSING,
     TO_LOWER,
     TWITTER_ACCESS_TOKEN,
     TWITTER_PUBLIC_KEY,
+    TWITTER_RATE_LIMIT,
+    TWITTER_RATE_LIMIT_WINDOW,
     TWITTER_SECRET_KEY,
     TWITTER_SECRET_TOKEN,
     USE_EXISTING_DATABASE,
+    WORKER_KIND,
+    WORKER_START_METHOD,
+    WORKERS,
 )
 
+# Cores shared by the workers of every command and their engines
+budget = CpuBudget(CPU_BUDGET)
+
 
 class Profiler:
     @staticmethod
@@ -59,119 +91,378 @@ class Profiler:
             raise Exception('Users param is not in a correct format')
 
     @staticmethod
-    def get_timelines(users: str = 'vidamoderna', save: bool = True):
+    def get_backend(layout: str = MONGO_LAYOUT):
+        backend_class = {
+            'timeline': MongoBackend,
+            'tweet': MongoTweetsBackend,
+        }[layout]
+        return backend_class(
+            MONGO_URL, MONGO_PORT, MONGO_DB, USE_EXISTING_DATABASE
+        )
+
+    @staticmethod
+    def get_engine(name: str = LDA_ENGINE):
+        from classes.engines import ENGINES, AutoEngine
+
+        if name == 'auto':
+            return AutoEngine(LDA_GIBBS_MAX_DOCUMENTS, LDA_ONLINE_MAX_DOCUMENTS)
+        return ENGINES[name]()
+
+    @staticmethod
+    def read_users_file(users_file: str):
+        """
+        Read one user per line of ``users_file`` or stdin when it is '-'
+        """
+        file = sys.stdin if users_file == '-' else open(users_file)
+        try:
+            for line in file:
+                user = line.strip()
+                if user and not user.startswith('#'):
+                    yield user
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+    @staticmethod
+    def get_users(users, users_file: str = None):
+        if users_file:
+            users = Profiler.read_users_file(users_file)
+        else:
+            users = Profiler.parse_users_param(users)
+        return (Profiler.clean_user(user) for user in users)
+
+    @staticmethod
+    def execute(
+        func,
+        users,
+        users_file: str,
+        workers: int,
+        kind: str,
+        engine=None,
+        io_bound: bool = False,
+        **kwargs,
+    ) -> dict:
+        """
+        Run ``func`` for each user with the workers and cores per worker
+        that the CPU budget allows, unless the task is ``io_bound``, and
+        export the metrics of every worker
+        """
+        cores = 1
+        if not io_bound:
+            workers, cores = budget.split(workers)
+        if engine:
+            engine.set_cores(cores)
+        stage = func.__qualname__
+        MetricsRegistry.start(METRICS_PATH, clean=True)
+        with budget.measure(stage, workers, cores):
+            results = Executor(
+                workers,
+                kind,
+                threads=cores,
+                start_method=WORKER_START_METHOD,
+                metrics_path=METRICS_PATH,
+            ).run(func, Profiler.get_users(users, users_file), **kwargs)
+        MetricsRegistry.flush()
+        MetricsRegistry.export(METRICS_PATH, stage)
+        return results
+
+    @staticmethod
+    def get_timelines(
+        users: str = 'vidamoderna',
+        save: bool = True,
+        refresh: bool = False,
+        users_file: str = None,
+        workers: int = WORKERS,
+        kind: str = WORKER_KIND,
+    ):
         """
         Exec:
         python profiler.py get_timelines --users vidamoderna
+        python profiler.py get_timelines --users vidamoderna --refresh
+        python profiler.py get_timelines --users_file users.txt --workers 8
         """
-        users = Profiler.parse_users_param(users)
+        from classes.providers import TweepyProvider
+        from classes.rate_limits import RateLimitScheduler
+        from classes.timeline_downloader import TimelineDownloader
+
         t_downloader = TimelineDownloader(
             TweepyProvider(
                 TWITTER_PUBLIC_KEY,
                 TWITTER_SECRET_KEY,
                 TWITTER_ACCESS_TOKEN,
                 TWITTER_SECRET_TOKEN,
+                # Shared by all worker processes
+                RateLimitScheduler(
+                    TWITTER_RATE_LIMIT, TWITTER_RATE_LIMIT_WINDOW
+                ),
             ),
-            MongoBackend(
-                MONGO_URL, MONGO_PORT, MONGO_DB, USE_EXISTING_DATABASE
-            ),
+            Profiler.get_backend(),
+        )
+        Profiler.execute(
+            t_downloader.get_timeline,
+            users,
+            users_file,
+            workers,
+            kind,
+            io_bound=True,
+            save=save,
+            filter_rts=FILTER_RTS,
+            refresh=refresh,
         )
-        pool = []
-        for user in users:
-            process = mp.Process(
-                target=t_downloader.get_timeline,
-                args=(Profiler.clean_user(user),),
-                kwargs={'save': save, 'filter_rts': FILTER_RTS},
-            )
-            process.start()
-            pool.append(process)
-        for process in pool:
-            process.join()
 
     @staticmethod
-    def clean_timelines(users: str = 'vidamoderna', save: bool = True):
+    def clean_timelines(
+        users: str = 'vidamoderna',
+        save: bool = True,
+        users_file: str = None,
+        workers: int = WORKERS,
+        kind: str = WORKER_KIND,
+    ):
         """
         Exec:
         python profiler.py clean_timelines --users vidamoderna
+        cat users.txt | python profiler.py clean_timelines --users_file -
         """
-        users = Profiler.parse_users_param(users)
+        from classes.languages import LanguageDetector
+        from classes.preprocessors import MyPreprocessor
+        from classes.stopwords import StopwordRegistry
+
+        if FILTER_STOPWORDS:
+            StopwordRegistry.load_bundle(STOPWORDS_BUNDLE)
+            StopwordRegistry.preload(STOPWORDS_LANGUAGES)
         preprocessor = MyPreprocessor(
-            MongoBackend(
-                MONGO_URL, MONGO_PORT, MONGO_DB, USE_EXISTING_DATABASE
+            Profiler.get_backend(),
+            LanguageDetector(
+                LANGUAGE_DETECTION_MODE,
+                sample_size=LANGUAGE_SAMPLE_SIZE,
+                threshold=LANGUAGE_HISTOGRAM_THRESHOLD,
             ),
         )
-        pool = []
-        for user in users:
-            process = mp.Process(
-                target=preprocessor.run,
-                args=(Profiler.clean_user(user),),
-                kwargs={
-                    'save': save,
-                    'replace_mentions': REPLACE_MENTIONS,
-                    'filter_mentions': FILTER_MENTIONS,
-                    'replace_emails': REPLACE_EMAILS,
-                    'filter_emails': FILTER_EMAILS,
-                    'replace_currencies': REPLACE_CURRENCIES,
-                    'filter_currencies': FILTER_CURRENCIES,
-                    'replace_urls': REPLACE_URLS,
-                    'filter_urls': FILTER_URLS,
-                    'replace_numbers': REPLACE_NUMBERS,
-                    'filter_numbers': FILTER_NUMBERS,
-                    'replace_digits': REPLACE_DIGITS,
-                    'filter_digits': FILTER_DIGITS,
-                    'replace_emojis': REPLACE_EMOJIS,
-                    'filter_emojis': FILTER_EMOJIS,
-                    'remove_punct': REMOVE_PUNCT,
-                    'remove_multiple_spaces': REMOVE_MULTIPLE_SPACES,
-                    'to_lower': TO_LOWER,
-                    'filter_stopwords': FILTER_STOPWORDS,
-                    'filter_empty_rows': FILTER_EMPTY_ROWS,
-                },
-            )
-            process.start()
-            pool.append(process)
-        for process in pool:
-            process.join()
+        Profiler.execute(
+            preprocessor.run,
+            users,
+            users_file,
+            workers,
+            kind,
+            save=save,
+            replace_mentions=REPLACE_MENTIONS,
+            filter_mentions=FILTER_MENTIONS,
+            replace_emails=REPLACE_EMAILS,
+            filter_emails=FILTER_EMAILS,
+            replace_currencies=REPLACE_CURRENCIES,
+            filter_currencies=FILTER_CURRENCIES,
+            replace_urls=REPLACE_URLS,
+            filter_urls=FILTER_URLS,
+            replace_numbers=REPLACE_NUMBERS,
+            filter_numbers=FILTER_NUMBERS,
+            replace_digits=REPLACE_DIGITS,
+            filter_digits=FILTER_DIGITS,
+            replace_emojis=REPLACE_EMOJIS,
+            filter_emojis=FILTER_EMOJIS,
+            remove_punct=REMOVE_PUNCT,
+            remove_multiple_spaces=REMOVE_MULTIPLE_SPACES,
+            to_lower=TO_LOWER,
+            filter_stopwords=FILTER_STOPWORDS,
+            filter_empty_rows=FILTER_EMPTY_ROWS,
+            stream=STREAM_PREPROCESSING,
+            batch_size=STREAM_BATCH_SIZE,
+        )
+
+    @staticmethod
+    def get_lda(topics: int = 5, reports=None):
+        from classes.lda import LDA
+        from classes.reports import ReportGenerator
+        from classes.stores import CorpusStore, ModelRegistry
+
+        backend = Profiler.get_backend()
+        return LDA(
+            backend,
+            n_topics=topics,
+            n_passes=LDA_N_PASSES,
+            use_bigrams=LDA_USE_BIGRAMS,
+            min_df=LDA_MIN_DF,
+            corpus_store=CorpusStore(
+                LDA_CORPUS_PATH, LDA_MAX_CORPORA, LDA_CORPUS_CACHE_SIZE
+            ),
+            model_registry=ModelRegistry(backend, LDA_MODELS_MAX_SIZE),
+            incremental=LDA_INCREMENTAL,
+            max_drift=LDA_MAX_DRIFT,
+            engine=Profiler.get_engine(),
+            reports=reports or ReportGenerator(LDA_REPORTS_PATH, LDA_REPORTS),
+        )
 
     @staticmethod
     def find_topics(
-        users: str = 'vidamoderna', topics: int = 5, save: bool = True
+        users: str = 'vidamoderna',
+        topics: int = 5,
+        save: bool = True,
+        users_file: str = None,
+        workers: int = WORKERS,
+        kind: str = WORKER_KIND,
+        reports: str = LDA_REPORTS,
     ):
         """
         Exec:
         python profiler.py find_topics --users vidamoderna
+        python profiler.py find_topics --users vidamoderna --reports lazy
         """
-        users = Profiler.parse_users_param(users)
-        lda = LDA(
-            MongoBackend(
-                MONGO_URL, MONGO_PORT, MONGO_DB, USE_EXISTING_DATABASE
+        from classes.reports import ReportGenerator
+
+        report_generator = ReportGenerator(LDA_REPORTS_PATH, reports)
+        lda = Profiler.get_lda(topics, report_generator)
+        report_generator.start(lda)
+        try:
+            Profiler.execute(
+                lda.run,
+                users,
+                users_file,
+                workers,
+                kind,
+                engine=lda.engine,
+                save=save,
+            )
+            lda.evict_models()
+        finally:
+            report_generator.stop()
+
+    @staticmethod
+    def generate_reports(
+        users: str = 'vidamoderna',
+        topics: int = 5,
+        users_file: str = None,
+        workers: int = WORKERS,
+        kind: str = WORKER_KIND,
+    ):
+        """
+        Generate the missing or stale reports of the saved models inferred
+        with the current settings
+        Exec:
+        python profiler.py generate_reports --users vidamoderna
+        """
+        lda = Profiler.get_lda(topics)
+        Profiler.execute(lda.generate_report, users, users_file, workers, kind)
+
+    @staticmethod
+    def sweep_topics(
+        users: str = 'vidamoderna',
+        topics: list = LDA_SWEEP_TOPICS,
+        passes: list = LDA_SWEEP_PASSES,
+        save: bool = True,
+        users_file: str = None,
+        cpu_budget: int = CPU_BUDGET,
+    ):
+        """
+        Infer a model for each number of topics and passes and keep the one
+        with the best coherence. Users are swept one by one since each sweep
+        takes the whole CPU budget
+        Exec:
+        python profiler.py sweep_topics --users vidamoderna
+        python profiler.py sweep_topics --users vidamoderna --topics [5,10]
+        """
+        from classes.reports import ReportGenerator
+        from classes.stores import CorpusStore, ModelRegistry
+        from classes.sweeps import LDASweep
+
+        backend = Profiler.get_backend()
+        report_generator = ReportGenerator(LDA_REPORTS_PATH, LDA_REPORTS)
+        lda = LDASweep(
+            backend,
+            topics=topics,
+            passes=passes,
+            cpu_budget=cpu_budget,
+            use_bigrams=LDA_USE_BIGRAMS,
+            min_df=LDA_MIN_DF,
+            corpus_store=CorpusStore(
+                LDA_CORPUS_PATH, LDA_MAX_CORPORA, LDA_CORPUS_CACHE_SIZE
             ),
+            model_registry=ModelRegistry(backend, LDA_MODELS_MAX_SIZE),
+            # Models are saved under the keys find_topics uses
+            engine=Profiler.get_engine(),
+            reports=report_generator,
+        )
+        report_generator.start(lda)
+        try:
+            Profiler.execute(lda.run, users, users_file, 1, 'thread', save=save)
+            lda.evict_models()
+        finally:
+            report_generator.stop()
+
+    @staticmethod
+    def find_joint_topics(
+        users: str = 'vidamoderna',
+        topics: int = 5,
+        save: bool = True,
+        users_file: str = None,
+        verbose: bool = False,
+    ):
+        """
+        Infer one model with the tweets of all users and save the topic
+        vector of each user
+        Exec:
+        python profiler.py find_joint_topics --users_file users.txt
+        """
+        from classes.joint import JointLDA
+        from classes.stores import CorpusStore
+
+        backend = Profiler.get_backend()
+        lda = JointLDA(
+            backend,
+            path=LDA_JOINT_PATH,
+            batch_size=LDA_JOINT_BATCH_SIZE,
+            cpu_budget=CPU_BUDGET,
             n_topics=topics,
             n_passes=LDA_N_PASSES,
             use_bigrams=LDA_USE_BIGRAMS,
             min_df=LDA_MIN_DF,
+            corpus_store=CorpusStore(
+                LDA_CORPUS_PATH, LDA_MAX_CORPORA, LDA_CORPUS_CACHE_SIZE
+            ),
         )
-        pool = []
-        for user in users:
-            process = mp.Process(
-                target=lda.run,
-                args=(Profiler.clean_user(user),),
-                kwargs={'save': save},
-            )
-            process.start()
-            pool.append(process)
-        for process in pool:
-            process.join()
+        lda.run(Profiler.get_users(users, users_file), save, verbose)
 
     @staticmethod
-    def run_all(users: str = 'vidamoderna', save: bool = True, topics: int = 5):
+    def run_all(
+        users: str = 'vidamoderna',
+        save: bool = True,
+        topics: int = 5,
+        users_file: str = None,
+        workers: int = WORKERS,
+        kind: str = WORKER_KIND,
+    ):
         """
         Exec:
         python profiler.py run_all --users vidamoderna
         """
-        Profiler.get_timelines(users, save)
-        Profiler.clean_timelines(users, save)
-        Profiler.find_topics(users, save, topics)
+        if users_file:
+            # Users are read once since stdin can not be read by every step
+            users = tuple(Profiler.read_users_file(users_file))
+        pool = {'workers': workers, 'kind': kind}
+        Profiler.get_timelines(users, save, **pool)
+        Profiler.clean_timelines(users, save, **pool)
+        Profiler.find_topics(users, topics, save, **pool)
+
+    @staticmethod
+    def bundle_stopwords(download: bool = False):
+        """
+        Save the stopwords of every language so cleaning timelines does not
+        need NLTK nor network access, downloading NLTK ones if ``download``
+        Exec:
+        python profiler.py bundle_stopwords --download
+        """
+        from classes.stopwords import StopwordRegistry
+
+        StopwordRegistry.save_bundle(STOPWORDS_BUNDLE, download)
+
+    @staticmethod
+    def migrate_backend():
+        """
+        Copy timelines saved in a document per timeline to the document per
+        tweet layout
+        Exec:
+        python profiler.py migrate_backend
+        """
+        with Profiler.get_backend('tweet') as backend:
+            backend.migrate()
 
 
 if __name__ == '__main__':
@@ -1,17 +1,38 @@
 # -*- coding: UTF-8 -*-
 
+import os
+
 from environs import Env
 
 # You can rename -env-sample for use hidden configs
 env = Env()
 env.read_env('.env')
 
+# WORKERS
+# ******************************************************************************
+# Users processed at the same time by each command
+WORKERS = 4
+# Kind of workers: process or thread
+WORKER_KIND = 'process'
+# Start method of process workers: fork, spawn, forkserver (a server process
+# which imports the modules of the task once for all workers) or None for
+# the platform default
+WORKER_START_METHOD = None
+# Processes that can run at the same time, including LdaMulticore ones
+CPU_BUDGET = os.cpu_count() or 1
+# Folder where every command saves the timers, counters and peak memory of
+# each stage and user as <stage>.json and <stage>.prom (Prometheus textfile)
+METRICS_PATH = 'output/metrics'
+
 # MONGO
 # ******************************************************************************
 MONGO_URL = 'mongodb'
 MONGO_PORT = 27017
 MONGO_DB = 'profiler_db'
 USE_EXISTING_DATABASE = True
+# Storage layout: timeline (a document per timeline) or tweet (a document
+# per tweet, run `python profiler.py migrate_backend` to move timelines)
+MONGO_LAYOUT = 'timeline'
 
 # TWITTER
 # ******************************************************************************
@@ -20,6 +41,9 @@ TWITTER_SECRET_KEY = env('TWITTER_SECRET_KEY', default='')
 TWITTER_ACCESS_TOKEN = env('TWITTER_ACCESS_TOKEN', default='')
 TWITTER_SECRET_TOKEN = env('TWITTER_SECRET_TOKEN', default='')
 FILTER_RTS = True
+# User timeline requests allowed per rate limit window
+TWITTER_RATE_LIMIT = 900
+TWITTER_RATE_LIMIT_WINDOW = 15 * 60
 
 # PREPROCESSING
 # ******************************************************************************
@@ -41,10 +65,61 @@ REMOVE_PUNCT = True
 REMOVE_MULTIPLE_SPACES = True
 TO_LOWER = True
 FILTER_STOPWORDS = True
+# Stopwords loaded before starting workers so they are shared with them
+STOPWORDS_LANGUAGES = ['es', 'ca', 'en']
+# Stopwords of every language saved by `python profiler.py bundle_stopwords`
+# so they are loaded without NLTK or network access
+STOPWORDS_BUNDLE = 'output/stopwords.json'
+# Stopwords language of each tweet: tweet (detected tweet by tweet), timeline
+# (the majority language of a timeline sample) or histogram (every language
+# with a share of the sample over LANGUAGE_HISTOGRAM_THRESHOLD)
+LANGUAGE_DETECTION_MODE = 'tweet'
+LANGUAGE_SAMPLE_SIZE = 200
+LANGUAGE_HISTOGRAM_THRESHOLD = 0.2
 FILTER_EMPTY_ROWS = True
+# Read, clean and save tweets lazily in batches so memory does not grow with
+# timeline length (stopwords language is detected with the first tweets)
+STREAM_PREPROCESSING = False
+STREAM_BATCH_SIZE = 1000
 
 # LDA
 # ******************************************************************************
 LDA_N_PASSES = 20
 LDA_USE_BIGRAMS = True
 LDA_MIN_DF = 0
+# Inference engine: multicore, online, gibbs (an approximate sampler with 10
+# iterations per pass) or auto to choose it by the tweets of each timeline
+# (gibbs up to LDA_GIBBS_MAX_DOCUMENTS, online up to LDA_ONLINE_MAX_DOCUMENTS
+# and multicore for bigger timelines)
+LDA_ENGINE = 'multicore'
+LDA_GIBBS_MAX_DOCUMENTS = 1000
+LDA_ONLINE_MAX_DOCUMENTS = 10000
+# pyLDAvis reports of models: inline (right after inference, with the corpus
+# the model was inferred with), background (by a process while models are
+# inferred), lazy (only with `python profiler.py generate_reports`) or off.
+# Background and lazy reports rebuild the corpus with the model dictionary,
+# so they can differ from inline ones
+LDA_REPORTS = 'inline'
+LDA_REPORTS_PATH = 'output'
+# Folder where prepared corpora are saved to skip preparing them again, None
+# to keep them only in memory
+LDA_CORPUS_PATH = 'output/corpora'
+# Last used corpora kept on disk and in the memory of each worker
+LDA_MAX_CORPORA = 1000
+LDA_CORPUS_CACHE_SIZE = 8
+# Bytes that saved models can take before deleting the least recently used
+# ones, None for no limit
+LDA_MODELS_MAX_SIZE = 1024**3
+# Update the last model of a user with the new tweets only, instead of
+# inferring it again, while its timeline has grown less than LDA_MAX_DRIFT
+# times the tweets of its last full inference
+LDA_INCREMENTAL = True
+LDA_MAX_DRIFT = 0.3
+# Topics and passes combinations inferred by `python profiler.py sweep_topics`
+LDA_SWEEP_TOPICS = [3, 5, 8, 10, 15]
+LDA_SWEEP_PASSES = [LDA_N_PASSES]
+# Folder of the models inferred with the tweets of many users by
+# `python profiler.py find_joint_topics`, and users whose topic vectors are
+# computed at once
+LDA_JOINT_PATH = 'output/joint'
+LDA_JOINT_BATCH_SIZE = 500
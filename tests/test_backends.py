@@ -1,14 +1,23 @@
 # -*- coding: UTF-8 -*-
 
+import os
+from datetime import datetime
+
 import pymongo
 import pytest
-from mock import patch
+from mock import MagicMock, patch
+from pymongo.errors import BulkWriteError
 
-from src.classes.backends import MongoBackend
+from src.classes.backends import MongoBackend, MongoTweetsBackend, batches
 from src.classes.exceptions import DatabaseDoesNotExist
 from src.settings import MONGO_DB, MONGO_PORT, MONGO_URL, USE_EXISTING_DATABASE
 
 
+@pytest.mark.unit
+def test_batches():
+    assert list(batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
 @pytest.mark.unit
 class TestMongoBackend:
     @classmethod
@@ -43,3 +52,337 @@ class TestMongoBackend:
         logger_mock.assert_called_with(
             'Database doesn\'t exist, it will be created'
         )
+
+    @patch('pymongo.collection.Collection.aggregate')
+    def test_get_newest_tweet_id(self, aggregate_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        aggregate_mock.return_value = iter([{'newest_id': 111}])
+        assert self.backend.get_newest_tweet_id('@test') == 111
+
+    @patch('pymongo.collection.Collection.aggregate')
+    def test_get_newest_tweet_id_without_timeline(self, aggregate_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        aggregate_mock.return_value = iter([])
+        assert self.backend.get_newest_tweet_id('@test') is None
+
+    @patch('pymongo.collection.Collection.update_one')
+    def test_append_tweets(self, update_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        tweets = [{'id': 112, 'created_at': '', 'text': 'Ouh mama'}]
+        self.backend.append_tweets('@test', tweets)
+        update_mock.assert_called_once_with(
+            {'user': '@test'},
+            {'$push': {'tweets': {'$each': tweets, '$position': 0}}},
+        )
+
+    def test_get_client_is_reused(self):
+        MongoBackend.reset_clients()
+        client = MongoBackend.get_client(MONGO_URL, MONGO_PORT)
+        assert MongoBackend.get_client(MONGO_URL, MONGO_PORT) is client
+        MongoBackend.reset_clients()
+        assert MongoBackend.get_client(MONGO_URL, MONGO_PORT) is not client
+
+    @patch('src.classes.backends.MongoBackend.get_db')
+    def test_enter_checks_db_once(self, get_db_mock):
+        MongoBackend.reset_clients()
+        backend = MongoBackend(MONGO_URL, MONGO_PORT, MONGO_DB)
+        with backend:
+            pass
+        with backend:
+            pass
+        get_db_mock.assert_called_once()
+        assert backend.client is MongoBackend.get_client(MONGO_URL, MONGO_PORT)
+
+    def test_clients_are_reset_after_fork(self):
+        MongoBackend.get_client(MONGO_URL, MONGO_PORT)
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.write(write, str(len(MongoBackend._clients)).encode())
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert os.read(read, 1) == b'0'
+
+    @patch('pymongo.collection.Collection.insert_many')
+    def test_insert_timelines(self, insert_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        timelines = [{'user': '@a', 'tweets': []}, {'user': '@b', 'tweets': []}]
+        insert_mock.return_value.inserted_ids = [1, 2]
+        assert self.backend.insert_timelines(timelines) == [1, 2]
+        insert_mock.assert_called_once_with(timelines, ordered=False)
+
+    @patch('pymongo.collection.Collection.find')
+    def test_get_timelines(self, find_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        find_mock.return_value = iter([{'user': '@a', 'tweets': []}])
+        timelines = self.backend.get_timelines(['@a', '@b'], ['tweets'])
+        assert timelines == {'@a': {'user': '@a', 'tweets': []}}
+        find_mock.assert_called_once_with(
+            {'user': {'$in': ['@a', '@b']}}, ['user', 'tweets']
+        )
+
+    @patch('pymongo.collection.Collection.bulk_write')
+    def test_update_timelines(self, bulk_write_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        self.backend.update_timelines({'@a': {'x': 1}, '@b': {'x': 2}})
+        requests = bulk_write_mock.call_args[0][0]
+        assert requests == [
+            pymongo.UpdateOne({'user': '@a'}, {'$set': {'x': 1}}),
+            pymongo.UpdateOne({'user': '@b'}, {'$set': {'x': 2}}),
+        ]
+        assert bulk_write_mock.call_args[1] == {'ordered': False}
+
+    @patch('pymongo.collection.Collection.update_one')
+    @patch('gridfs.GridFSBucket.upload_from_stream')
+    @patch('pymongo.collection.Collection.find_one')
+    def test_save_model(self, find_one_mock, upload_mock, update_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        find_one_mock.return_value = None
+        upload_mock.return_value = 'file_id'
+        self.backend.save_model('@test', '@test-t5', b'model')
+        upload_mock.assert_called_once_with(
+            '@test-t5', b'model', metadata={'user': '@test'}
+        )
+        (query, values), _ = update_mock.call_args
+        assert query == {'user': '@test'}
+        assert list(values['$set']) == ['models.@test-t5']
+        assert values['$set']['models.@test-t5']['file_id'] == 'file_id'
+
+    @patch('pymongo.collection.Collection.update_one')
+    @patch('gridfs.GridFSBucket.open_download_stream')
+    @patch('pymongo.collection.Collection.find_one')
+    def test_load_model(self, find_one_mock, download_mock, update_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        find_one_mock.return_value = {'models': {'@test-t5': {'file_id': 1}}}
+        download_mock.return_value.read.return_value = b'model'
+        assert self.backend.load_model('@test', '@test-t5') == b'model'
+        download_mock.assert_called_once_with(1)
+        (query, values), _ = update_mock.call_args
+        assert list(values['$set']) == ['models.@test-t5.last_used']
+
+    @patch('pymongo.collection.Collection.find')
+    def test_list_models(self, find_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        last_used = datetime(2020, 1, 1)
+        find_mock.return_value = iter(
+            [
+                {
+                    'user': '@test',
+                    'models': {
+                        'a': {'size': 10, 'last_used': last_used},
+                        'b': b'model',
+                    },
+                }
+            ]
+        )
+        assert self.backend.list_models() == [
+            {'user': '@test', 'key': 'a', 'size': 10, 'last_used': last_used},
+            {
+                'user': '@test',
+                'key': 'b',
+                'size': 5,
+                'last_used': datetime.min,
+            },
+        ]
+
+    @patch('gridfs.GridFSBucket.delete')
+    @patch('pymongo.collection.Collection.update_one')
+    @patch('pymongo.collection.Collection.find_one')
+    def test_delete_model(self, find_one_mock, update_mock, delete_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        find_one_mock.return_value = {'models': {'a': {'file_id': 1}}}
+        self.backend.delete_model('@test', 'a')
+        update_mock.assert_called_once_with(
+            {'user': '@test'}, {'$unset': {'models.a': True}}
+        )
+        delete_mock.assert_called_once_with(1)
+
+    @patch('pymongo.collection.Collection.find_one')
+    def test_load_model_saved_in_timeline(self, find_one_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        find_one_mock.return_value = {'models': {'@test-t5': b'model'}}
+        assert self.backend.load_model('@test', '@test-t5') == b'model'
+
+    @patch('pymongo.collection.Collection.find_one')
+    def test_load_model_that_does_not_exist(self, find_one_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        find_one_mock.return_value = {'user': '@test'}
+        assert self.backend.load_model('@test', '@test-t5') is None
+
+    @patch('pymongo.collection.Collection.find_one')
+    def test_get_timeline_fields(self, find_one_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        self.backend.get_timeline('@test', ['cleaned_tweets.text'])
+        find_one_mock.assert_called_once_with(
+            {'user': '@test'}, ['user', 'cleaned_tweets.text']
+        )
+
+    @patch('pymongo.collection.Collection.count_documents')
+    def test_exists_timeline(self, count_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        count_mock.return_value = 1
+        assert self.backend.exists_timeline('@test') is True
+        count_mock.assert_called_once_with({'user': '@test'}, limit=1)
+
+    @patch('pymongo.collection.Collection.aggregate')
+    def test_get_timeline_metadata(self, aggregate_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        metadata = {
+            'user': '@test',
+            'tweets': 2,
+            'cleaned_tweets': 0,
+            'models': [],
+        }
+        aggregate_mock.return_value = iter([metadata])
+        assert self.backend.get_timeline_metadata('@test') == metadata
+
+    @patch('pymongo.collection.Collection.update_one')
+    def test_write_tweets(self, update_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        tweets = ({'id': i, 'created_at': '', 'text': 'a'} for i in range(5))
+        written = self.backend.write_tweets(
+            '@test', 'cleaned_tweets', tweets, 2
+        )
+        assert written == 5
+        values = [args[0][1] for args in update_mock.call_args_list]
+        assert values[0] == {'$set': {'cleaned_tweets': []}}
+        assert [
+            len(value['$push']['cleaned_tweets']['$each'])
+            for value in values[1:]
+        ] == [2, 2, 1]
+
+    @patch('pymongo.collection.Collection.aggregate')
+    def test_iter_tweets(self, aggregate_mock):
+        self.backend.db = self.backend.client[MONGO_DB]
+        aggregate_mock.return_value = iter([{'id': 1}])
+        assert list(self.backend.iter_tweets('@test', batch_size=10)) == [
+            {'id': 1}
+        ]
+        assert aggregate_mock.call_args[1] == {'batchSize': 10}
+
+
+@pytest.mark.unit
+class TestMongoTweetsBackend:
+    @classmethod
+    def setup_class(cls):
+        cls.backend = MongoTweetsBackend(
+            MONGO_URL, MONGO_PORT, MONGO_DB, USE_EXISTING_DATABASE
+        )
+        cls.backend.client = pymongo.MongoClient(MONGO_URL, MONGO_PORT)
+        cls.backend.db = cls.backend.client[MONGO_DB]
+
+    @patch('pymongo.collection.Collection.find', autospec=True)
+    @patch('pymongo.collection.Collection.find_one')
+    def test_get_timeline(self, find_one_mock, find_mock):
+        find_one_mock.return_value = {'user': '@test'}
+        documents = {
+            'tweets': [{'id': 112, 'text': 'b'}, {'id': 111, 'text': 'a'}],
+            'cleaned_tweets': [],
+            'models': [{'user': '@test', 'key': '@test-t5', 'size': 1}],
+        }
+        find_mock.side_effect = lambda collection, *args: MagicMock(
+            sort=MagicMock(return_value=documents[collection.name]),
+            __iter__=lambda _: iter(documents[collection.name]),
+        )
+        assert self.backend.get_timeline('@test') == {
+            'user': '@test',
+            'tweets': documents['tweets'],
+            'models': {'@test-t5': {'size': 1}},
+        }
+
+    @patch('pymongo.collection.Collection.find_one')
+    def test_get_timeline_that_does_not_exist(self, find_one_mock):
+        find_one_mock.return_value = None
+        assert self.backend.get_timeline('@test') is None
+
+    @patch('pymongo.collection.Collection.update_one')
+    @patch('pymongo.collection.Collection.insert_many', autospec=True)
+    @patch('pymongo.collection.Collection.delete_many', autospec=True)
+    def test_update_timeline(self, delete_mock, insert_mock, update_mock):
+        cleaned_tweets = [{'id': 111, 'created_at': '', 'text': 'a'}]
+        self.backend.update_timeline(
+            '@test', {'cleaned_tweets': cleaned_tweets}
+        )
+        (collection, query), _ = delete_mock.call_args
+        assert (collection.name, query) == ('cleaned_tweets', {'user': '@test'})
+        (collection, documents), kwargs = insert_mock.call_args
+        assert collection.name == 'cleaned_tweets'
+        assert documents == [{'user': '@test', **cleaned_tweets[0]}]
+        assert kwargs == {'ordered': False}
+        update_mock.assert_not_called()
+
+    @patch('pymongo.collection.Collection.insert_many')
+    def test_append_tweets_skips_saved_tweets(self, insert_mock):
+        insert_mock.side_effect = BulkWriteError(
+            {'writeErrors': [{'index': 0, 'code': 11000}]}
+        )
+        self.backend.append_tweets('@test', [{'id': 111, 'text': 'a'}])
+
+    @patch('pymongo.collection.Collection.insert_many')
+    def test_append_tweets_raises_other_errors(self, insert_mock):
+        insert_mock.side_effect = BulkWriteError(
+            {'writeErrors': [{'index': 0, 'code': 2}]}
+        )
+        with pytest.raises(BulkWriteError):
+            self.backend.append_tweets('@test', [{'id': 111, 'text': 'a'}])
+
+    @patch('pymongo.collection.Collection.insert_many', autospec=True)
+    def test_insert_timelines_skips_saved_users(self, insert_mock):
+        collections = []
+
+        def insert_many(collection, documents, ordered):
+            collections.append(collection.name)
+            for i, document in enumerate(documents):
+                document['_id'] = i
+            if collection.name == 'users':
+                raise BulkWriteError(
+                    {'writeErrors': [{'index': 0, 'code': 11000}]}
+                )
+
+        insert_mock.side_effect = insert_many
+        timelines = [
+            {'user': '@a', 'tweets': [{'id': 111}]},
+            {'user': '@b', 'tweets': [{'id': 112}]},
+        ]
+        assert self.backend.insert_timelines(timelines) == [1]
+        # Users are written once their tweets are saved
+        assert collections == ['tweets', 'users']
+
+    @patch('pymongo.collection.Collection.find_one')
+    def test_get_newest_tweet_id(self, find_one_mock):
+        find_one_mock.return_value = {'id': 112}
+        assert self.backend.get_newest_tweet_id('@test') == 112
+        find_one_mock.assert_called_once_with(
+            {'user': '@test'}, {'id': True}, sort=[('id', pymongo.DESCENDING)]
+        )
+
+    @patch('src.classes.backends.MongoTweetsBackend.insert_timeline')
+    @patch('pymongo.collection.Collection.count_documents')
+    @patch('pymongo.collection.Collection.find')
+    def test_migrate(self, find_mock, count_mock, insert_mock):
+        timelines = [{'user': '@a', 'tweets': []}, {'user': '@b', 'tweets': []}]
+        find_mock.return_value = iter(timelines)
+        count_mock.side_effect = [1, 0]
+        assert self.backend.migrate() == 1
+        insert_mock.assert_called_once_with(timelines[1])
+
+    def test_get_projections(self):
+        assert self.backend.get_projections(
+            ['cleaned_tweets.text', 'lang']
+        ) == (
+            ['user', 'lang'],
+            {'cleaned_tweets': {'_id': False, 'user': True, 'text': True}},
+            False,
+        )
+
+    def test_get_projections_of_whole_fields(self):
+        assert self.backend.get_projections(['tweets', 'models']) == (
+            ['user'],
+            {'tweets': {'_id': False}},
+            True,
+        )
+
+    @patch('pymongo.collection.Collection.count_documents')
+    def test_get_timeline_metadata_that_does_not_exist(self, count_mock):
+        count_mock.return_value = 0
+        assert self.backend.get_timeline_metadata('@test') is None
@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+from mock import patch
+
+from benchmarks.suite import BENCHMARKS, compare_results, run_benchmarks
+from benchmarks.timelines import EMOJIS, URLS, make_timeline
+from src.classes.backends import MongoBackend
+
+
+def to_results(times: dict) -> dict:
+    return {'results': {name: {'time': time} for name, time in times.items()}}
+
+
+@pytest.mark.unit
+class TestBenchmarks:
+    def test_make_timeline_is_seeded(self):
+        assert make_timeline(20, seed=1) == make_timeline(20, seed=1)
+        assert make_timeline(20, seed=1) != make_timeline(20, seed=2)
+
+    def test_make_timeline_densities(self):
+        timeline = make_timeline(
+            50,
+            languages={'en': 1},
+            url_density=0,
+            emoji_density=1,
+            mention_density=0,
+        )
+        assert len(timeline['tweets']) == 50
+        for tweet in timeline['tweets']:
+            assert all(token in EMOJIS for token in tweet['text'].split())
+        timeline = make_timeline(10, url_density=0, emoji_density=0)
+        for tweet in timeline['tweets']:
+            assert not set(tweet['text'].split()) & set(URLS + EMOJIS)
+
+    def test_run_benchmarks(self):
+        report = run_benchmarks('regex.replace_emojis', tweets=10, repeat=1)
+        assert list(report['results']) == ['regex.replace_emojis']
+        assert report['results']['regex.replace_emojis']['items'] == 10
+        assert report['metadata']['tweets'] == 10
+        assert report['skipped'] == {}
+        assert 'mongo.tweet' in BENCHMARKS
+
+    def test_run_backend_benchmarks(self):
+        pytest.importorskip('mongomock')
+        clients = dict(MongoBackend._clients)
+        report = run_benchmarks('mongo', tweets=10, repeat=1)
+        assert report['skipped'] == {}
+        assert sorted(report['results']) == ['mongo.timeline', 'mongo.tweet']
+        assert MongoBackend._clients == clients
+
+    @patch('src.classes.languages.LanguageDetector.clear')
+    def test_run_benchmarks_resets_caches(self, clear_mock):
+        run_benchmarks('clean_timeline.stopwords', tweets=10, repeat=3)
+        assert clear_mock.call_count == 3
+
+    def test_run_benchmarks_with_errors(self):
+        def setup(timeline: dict, **options):
+            raise ValueError('No server')
+
+        with patch.dict(BENCHMARKS, {'failing': setup}):
+            report = run_benchmarks('failing', tweets=10, repeat=1)
+        assert report['results'] == {}
+        assert report['skipped'] == {'failing': 'ValueError: No server'}
+
+    def test_compare_results(self):
+        baseline = to_results({'a': 1.0, 'b': 1.0, 'c': 1.0})
+        current = to_results({'a': 1.05, 'b': 1.5, 'd': 9.0})
+        assert compare_results(baseline, current, tolerance=0.1) == ['b']
+        assert compare_results(baseline, current, tolerance=0.6) == []
+
+    def test_compare_results_with_skipped(self):
+        baseline = to_results({'a': 1.0, 'b': 1.0})
+        current = {**to_results({'a': 1.0}), 'skipped': {'b': 'Error', 'c': ''}}
+        assert compare_results(baseline, current) == ['b']
+        assert compare_results(baseline, to_results({'a': 1.0})) == []
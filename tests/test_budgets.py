@@ -0,0 +1,54 @@
+# -*- coding: UTF-8 -*-
+
+import os
+
+import pytest
+from mock import patch
+
+from src.classes.budgets import THREAD_VARIABLES, CpuBudget
+from src.classes.engines import AutoEngine, MulticoreEngine
+
+
+@pytest.mark.unit
+class TestCpuBudget:
+    def test_split(self):
+        budget = CpuBudget(16)
+        assert budget.split(10) == (10, 1)
+        assert budget.split(4) == (4, 4)
+        assert budget.split(32) == (16, 1)
+        assert CpuBudget(2).split(4) == (2, 1)
+
+    def test_measure(self):
+        budget = CpuBudget(2)
+        with budget.measure('find_topics', 2, 1):
+            sum(range(100000))
+        usage = budget.usage['find_topics']
+        assert usage['workers'] == 2
+        assert usage['cores_per_worker'] == 1
+        assert usage['cores_used'] >= 0
+
+    @patch('src.classes.budgets.threadpool_limits')
+    def test_limit_threads(self, threadpool_limits_mock):
+        with patch.dict(os.environ):
+            CpuBudget.limit_threads(2)
+            assert all(os.environ[name] == '2' for name in THREAD_VARIABLES)
+        threadpool_limits_mock.assert_called_once_with(2)
+
+
+@pytest.mark.unit
+class TestEngineCores:
+    def test_multicore_workers(self):
+        engine = MulticoreEngine()
+        assert engine.get_workers() is None
+        engine.set_cores(4)
+        assert engine.get_workers() == 3
+        engine.set_cores(1)
+        assert engine.get_workers() == 0
+        engine = MulticoreEngine(2)
+        engine.set_cores(8)
+        assert engine.get_workers() == 2
+
+    def test_auto_engine_cores(self):
+        engine = AutoEngine()
+        engine.set_cores(3)
+        assert all(engine.cores == 3 for engine in engine.engines)
@@ -0,0 +1,64 @@
+# -*- coding: UTF-8 -*-
+
+import re
+
+import pytest
+
+from src.classes.emojis import (
+    EMOJIS_SOURCE,
+    compile_candidate_regex,
+    compile_emojis_regex,
+    load_table,
+    merge_ranges,
+    parse_pattern,
+)
+
+
+@pytest.mark.unit
+class TestEmojis:
+    @classmethod
+    def setup_class(cls):
+        with open(EMOJIS_SOURCE) as file:
+            cls.alternation = re.compile(file.read().strip())
+        cls.table = load_table()
+        cls.regex = compile_emojis_regex(cls.table)
+
+    def test_merge_ranges(self):
+        assert merge_ranges([[5, 6], [1, 2], [3, 3], [8, 9]]) == [
+            [1, 3],
+            [5, 6],
+            [8, 9],
+        ]
+
+    def test_parse_pattern(self):
+        table = parse_pattern(
+            r'(\U00000041|[\U00000042-\U00000044]|\U00000050'
+            r'|[\U00000061-\U00000062][\U00000063-\U00000064])'
+        )
+        assert table == {
+            'ranges': [[0x41, 0x44], [0x50, 0x50]],
+            'sequences': [[[0x61, 0x62], [0x63, 0x64]]],
+        }
+
+    def test_table_is_up_to_date(self):
+        with open(EMOJIS_SOURCE) as file:
+            assert parse_pattern(file.read()) == self.table
+
+    def test_same_matches_as_source(self):
+        text = ''.join(map(chr, range(0x2000, 0x1FA00)))
+        assert self.regex.sub('<EMOJI>', text) == self.alternation.sub(
+            '<EMOJI>', text
+        )
+
+    def test_flags(self):
+        text = 'a 🇪🇸🇺 b'
+        assert self.regex.findall(text) == ['🇪🇸']
+        assert self.regex.sub('<EMOJI>', text) == self.alternation.sub(
+            '<EMOJI>', text
+        )
+
+    def test_candidate_regex(self):
+        candidate = compile_candidate_regex(self.table)
+        assert candidate.search('🇪🇸')
+        assert candidate.search('😀')
+        assert not candidate.search('中文 text')
@@ -0,0 +1,80 @@
+# -*- coding: UTF-8 -*-
+
+import numpy as np
+import pytest
+from gensim import corpora
+from mock import patch
+
+from src.classes.engines import (
+    ENGINES,
+    AutoEngine,
+    GibbsEngine,
+    MulticoreEngine,
+    OnlineEngine,
+)
+
+TEXTS = [
+    ['ball', 'goal', 'match', 'team'],
+    ['song', 'guitar', 'band', 'concert'],
+] * 20
+
+
+@pytest.mark.unit
+class TestEngines:
+    @classmethod
+    def setup_class(cls):
+        cls.dictionary = corpora.Dictionary(TEXTS)
+        cls.bow = [cls.dictionary.doc2bow(text) for text in TEXTS]
+
+    def test_engines(self):
+        assert set(ENGINES) == {'multicore', 'online', 'gibbs', 'auto'}
+
+    def test_get_tokens(self):
+        documents, terms, n_documents = GibbsEngine.get_tokens(
+            [[(0, 2.0), (3, 1.0)], [], [(1, 1.0)]]
+        )
+        assert documents.tolist() == [0, 0, 0, 2]
+        assert terms.tolist() == [0, 0, 3, 1]
+        assert n_documents == 3
+
+    def test_gibbs_engine(self):
+        model = GibbsEngine(iterations_per_pass=10).infer(
+            self.bow, self.dictionary, 2, 5
+        )
+        assert model.num_topics == 2
+        assert model.state.sstats.sum() == sum(map(len, TEXTS))
+        topics = [
+            {word for word, _ in model.show_topic(topic, 4)}
+            for topic in range(2)
+        ]
+        assert sorted(map(sorted, topics)) == [
+            ['ball', 'goal', 'match', 'team'],
+            ['band', 'concert', 'guitar', 'song'],
+        ]
+        first, second = model.inference(self.bow[:2])[0]
+        assert np.argmax(first) != np.argmax(second)
+
+    def test_gibbs_engine_iterations(self):
+        with patch.object(
+            GibbsEngine, 'count', wraps=GibbsEngine.count
+        ) as count_mock:
+            GibbsEngine(iterations_per_pass=2).infer(
+                self.bow, self.dictionary, 2, 3
+            )
+        # A count per iteration and the final one
+        assert count_mock.call_count == 7
+
+    def test_gibbs_engine_without_terms(self):
+        with pytest.raises(ValueError):
+            GibbsEngine().infer([[]], corpora.Dictionary(), 2, 1)
+
+    def test_online_engine(self):
+        model = OnlineEngine().infer(self.bow, self.dictionary, 2, 1)
+        assert model.num_topics == 2
+
+    def test_auto_engine(self):
+        engine = AutoEngine(gibbs_max_documents=1, online_max_documents=2)
+        assert isinstance(engine.choose([[]]), GibbsEngine)
+        assert isinstance(engine.choose([[], []]), OnlineEngine)
+        assert isinstance(engine.choose([[], [], []]), MulticoreEngine)
+        assert isinstance(engine.choose(iter([])), MulticoreEngine)
@@ -0,0 +1,68 @@
+# -*- coding: UTF-8 -*-
+
+import multiprocessing as mp
+import os
+
+import pytest
+
+from src.classes.executors import Executor
+
+
+def task(user, fail=None):
+    if user == fail:
+        raise ValueError('Timeline not found')
+
+
+def crash(user):
+    if user == '@b':
+        os._exit(1)
+
+
+class Counter:
+    def __init__(self):
+        self.lock = mp.Lock()
+        self.value = mp.Value('i', 0, lock=False)
+
+    def task(self, user):
+        with self.lock:
+            self.value.value += 1
+
+
+@pytest.mark.unit
+class TestExecutor:
+    def test_invalid_kind(self):
+        with pytest.raises(ValueError):
+            Executor(kind='fiber')
+
+    @pytest.mark.parametrize('kind', Executor.KINDS)
+    def test_run(self, kind):
+        results = Executor(2, kind).run(
+            task, (f'@user{i}' for i in range(5)), fail='@user3'
+        )
+        assert len(results) == 5
+        assert results['@user0']['status'] == 'done'
+        assert results['@user3']['status'] == 'failed: Timeline not found'
+
+    def test_run_inherits_locks(self):
+        counter = Counter()
+        results = Executor(2, 'process', max_pending=1).run(
+            counter.task, ['@a', '@b', '@c']
+        )
+        assert all(result['status'] == 'done' for result in results.values())
+        assert counter.value.value == 3
+
+    def test_run_with_forkserver(self):
+        results = Executor(2, 'process', start_method='forkserver').run(
+            task, ['@a', '@b'], fail='@b'
+        )
+        assert results['@a']['status'] == 'done'
+        assert results['@b']['status'] == 'failed: Timeline not found'
+
+    def test_run_with_dead_worker(self):
+        users = [f'@{name}' for name in 'abcdef']
+        results = Executor(1, 'process', max_pending=1).run(crash, users)
+        assert sorted(results) == users
+        assert results['@a']['status'] == 'done'
+        assert all(
+            results[user]['status'].startswith('failed') for user in users[1:]
+        )
@@ -0,0 +1,73 @@
+# -*- coding: UTF-8 -*-
+
+import numpy as np
+import pytest
+from mock import MagicMock
+
+from src.classes.joint import JointLDA, JointTexts
+
+TIMELINES = {
+    '@sports': ['ball goal match', 'goal ball team', 'match team ball'] * 5,
+    '@music': ['song guitar band', 'band song concert'] * 5,
+}
+
+
+def iter_tweets(user, field='tweets', batch_size=1000):
+    for i, text in enumerate(TIMELINES.get(user, [])):
+        yield {'id': i, 'text': text}
+
+
+@pytest.mark.unit
+class TestJointLDA:
+    def setup_method(self):
+        self.backend = MagicMock()
+        self.backend.__enter__.return_value = self.backend
+        self.backend.iter_tweets.side_effect = iter_tweets
+
+    def test_joint_texts(self):
+        texts = JointTexts(self.backend, ['@music', '@nobody'])
+        assert list(texts) == list(texts)
+        assert next(iter(texts)) == ['song', 'guitar', 'band']
+
+    def test_run(self, tmp_path):
+        lda = JointLDA(
+            self.backend,
+            path=str(tmp_path),
+            batch_size=1,
+            cpu_budget=2,
+            n_topics=2,
+            n_passes=5,
+            min_df=0,
+        )
+        key = lda.run(list(TIMELINES))
+        assert key.startswith('joint-')
+        assert (tmp_path / f'{key}.lda').exists()
+        assert self.backend.update_timelines.call_count == 2
+        vectors = {}
+        for call in self.backend.update_timelines.call_args_list:
+            for user, values in call[0][0].items():
+                vectors[user] = np.frombuffer(
+                    values[f'topic_vectors.{key}'], np.float32
+                )
+        assert set(vectors) == set(TIMELINES)
+        for vector in vectors.values():
+            assert vector.shape == (2,)
+            assert vector.sum() == pytest.approx(1.0, abs=1e-5)
+        self.backend.update_timelines.reset_mock()
+        assert lda.run(list(TIMELINES)) == key
+        assert self.backend.update_timelines.call_count == 2
+
+    def test_load_topic_vectors(self):
+        vector = np.array([0.25, 0.75], np.float32)
+        self.backend.get_timelines.return_value = {
+            '@music': {'topic_vectors': {'key': vector.tobytes()}},
+            '@sports': {},
+        }
+        vectors = JointLDA.load_topic_vectors(
+            self.backend, ['@music', '@sports'], 'key'
+        )
+        assert list(vectors) == ['@music']
+        assert np.array_equal(vectors['@music'], vector)
+        self.backend.get_timelines.assert_called_once_with(
+            ['@music', '@sports'], ['topic_vectors.key']
+        )
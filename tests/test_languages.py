@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from mock import patch
+
+from src.classes.languages import LanguageDetector
+
+SPANISH = 'hola don pepito que tal está usted esta mañana'
+ENGLISH = 'hello mister pepito how are you doing this morning'
+
+
+@pytest.mark.unit
+class TestLanguageDetector:
+    def setup_method(self):
+        LanguageDetector.clear()
+
+    def test_wrong_mode(self):
+        with pytest.raises(ValueError):
+            LanguageDetector('user')
+
+    def test_detect(self):
+        assert LanguageDetector.detect(SPANISH) == 'es'
+
+    def test_detect_without_features(self):
+        assert LanguageDetector.detect('123', default_lang='ca') == 'ca'
+
+    @patch('src.classes.languages.detect')
+    def test_detect_is_cached(self, detect_mock):
+        detect_mock.return_value = 'es'
+        LanguageDetector.detect(SPANISH)
+        LanguageDetector.detect(SPANISH)
+        detect_mock.assert_called_once_with(SPANISH)
+
+    @patch('src.classes.languages.detect')
+    def test_detect_from_threads(self, detect_mock):
+        detect_mock.side_effect = lambda text: text[-1]
+        texts = [f'text {i % 50}' for i in range(2000)]
+        with patch.object(LanguageDetector, 'CACHE_SIZE', 10):
+            with ThreadPoolExecutor(8) as pool:
+                langs = list(pool.map(LanguageDetector.detect, texts))
+        assert langs == [text[-1] for text in texts]
+        assert len(LanguageDetector._cache) == 10
+
+    def test_sample(self):
+        detector = LanguageDetector('timeline', sample_size=2)
+        assert detector.sample(['a', '', 'b', 'c', 'd']) == ['a', 'c']
+
+    def test_histogram(self):
+        detector = LanguageDetector('histogram', batch_size=1)
+        histogram = detector.histogram([SPANISH, SPANISH, SPANISH, ENGLISH])
+        assert histogram == {'es': 0.75, 'en': 0.25}
+
+    def test_histogram_empty_timeline(self):
+        detector = LanguageDetector('histogram')
+        assert detector.histogram(['']) == {'en': 1.0}
+
+    def test_timeline_languages(self):
+        detector = LanguageDetector('timeline', batch_size=1)
+        languages = detector.get_languages([SPANISH, SPANISH, ENGLISH])
+        assert languages == ['es']
+
+    def test_histogram_languages(self):
+        detector = LanguageDetector('histogram', batch_size=1, threshold=0.3)
+        languages = detector.get_languages([SPANISH, SPANISH, ENGLISH])
+        assert languages == ['es', 'en']
+
+    def test_tweet_stopwords(self):
+        detector = LanguageDetector('tweet')
+        assert detector.get_stopwords([SPANISH]) is None
+
+    def test_timeline_stopwords(self):
+        detector = LanguageDetector('timeline')
+        stopwords = detector.get_stopwords([SPANISH])
+        assert 'nosotras' in stopwords
@@ -1,11 +1,15 @@
 # -*- coding: UTF-8 -*-
 
 import pytest
+from gensim import corpora
 from mock import patch
 
 from src.classes.backends import MongoBackend
+from src.classes.engines import GibbsEngine
 from src.classes.exceptions import TimelineDoesNotExist
 from src.classes.lda import LDA
+from src.classes.reports import ReportGenerator
+from src.classes.stores import CorpusStore
 from src.settings import MONGO_DB, MONGO_PORT, MONGO_URL, USE_EXISTING_DATABASE
 
 
@@ -42,6 +46,7 @@ class TestLDA:
         with pytest.raises(TimelineDoesNotExist):
             self.lda.get_timeline('@test', self.backend)
 
+    @patch('src.classes.backends.MongoBackend.load_model')
     @patch('src.classes.lda.LDA.generate_html')
     @patch('pickle.loads')
     @patch('loguru.logger.info')
@@ -54,15 +59,18 @@ class TestLDA:
         logger_mock,
         pickle_mock,
         generate_html_mock,
+        load_model_mock,
     ):
         prepare_data_mock.return_value = None, None
         already_inferred_mock.return_value = True
         pickle_mock.return_value = 'model'
         model = self.lda.infer_model(self.timeline, '111')
+        load_model_mock.assert_called_once_with('@test', '111')
         logger_mock.called_with('Model is already inferred')
         assert model == 'model'
         generate_html_mock.assert_called_once()
 
+    @patch('src.classes.backends.MongoBackend.load_model')
     @patch('src.classes.lda.LDA.print_terms')
     @patch('src.classes.lda.LDA.generate_html')
     @patch('pickle.loads')
@@ -77,6 +85,7 @@ class TestLDA:
         pickle_mock,
         generate_html_mock,
         print_terms_mock,
+        load_model_mock,
     ):
         prepare_data_mock.return_value = None, None
         already_inferred_mock.return_value = True
@@ -87,6 +96,28 @@ class TestLDA:
         generate_html_mock.assert_called_once()
         print_terms_mock.assert_called_once()
 
+    @patch('src.classes.backends.MongoBackend.load_model')
+    @patch('src.classes.lda.LDA.html_is_already_generated')
+    @patch('src.classes.lda.LDA.generate_html')
+    @patch('pickle.loads')
+    @patch('src.classes.lda.LDA.prepare_data')
+    @patch('src.classes.lda.LDA.model_is_already_inferred')
+    def test_infer_model_already_inferred_skips_preparation(
+        self,
+        already_inferred_mock,
+        prepare_data_mock,
+        pickle_mock,
+        generate_html_mock,
+        html_generated_mock,
+        load_model_mock,
+    ):
+        already_inferred_mock.return_value = True
+        html_generated_mock.return_value = True
+        pickle_mock.return_value = 'model'
+        assert self.lda.infer_model(self.timeline, '111') == 'model'
+        assert not prepare_data_mock.called
+        assert not generate_html_mock.called
+
     @patch('gensim.models.ldamulticore.LdaMulticore.__init__')
     @patch('src.classes.lda.LDA.print_terms')
     @patch('src.classes.lda.LDA.generate_html')
@@ -111,6 +142,35 @@ class TestLDA:
         assert generate_html_mock.called
         assert not print_terms_mock.called
 
+    @patch('src.classes.lda.LDA.generate_html')
+    @patch('src.classes.lda.LDA.prepare_data')
+    @patch('src.classes.lda.LDA.model_is_already_inferred')
+    def test_infer_model_lazy_reports(
+        self, already_inferred_mock, prepare_data_mock, generate_html_mock
+    ):
+        already_inferred_mock.return_value = False
+        prepare_data_mock.return_value = [[(0, 1.0)]], corpora.Dictionary(
+            [['ouh']]
+        )
+        lda = LDA(
+            self.backend,
+            engine=GibbsEngine(1),
+            reports=ReportGenerator(mode='lazy'),
+        )
+        assert lda.infer_model(self.timeline, '111')
+        assert not generate_html_mock.called
+
+    @patch('src.classes.backends.MongoBackend.get_timeline')
+    @patch('src.classes.reports.ReportGenerator.build')
+    def test_generate_report_from_cache(
+        self, build_mock, get_timeline_mock, tmp_path
+    ):
+        reports = ReportGenerator(str(tmp_path))
+        open(reports.get_paths('111')[1], 'w').close()
+        LDA(self.backend, reports=reports).generate_report('@test', '111')
+        build_mock.assert_called_once_with('111')
+        assert not get_timeline_mock.called
+
     def test_model_is_already_inferred(self):
         result = self.lda.model_is_already_inferred(self.timeline, '111')
         assert result is True
@@ -119,6 +179,55 @@ class TestLDA:
         result = self.lda.model_is_already_inferred(self.timeline, '222')
         assert result is False
 
+    @patch('src.classes.backends.MongoBackend.save_model')
+    @patch('pickle.dumps')
+    def test_save_model(self, pickle_mock, save_model_mock):
+        pickle_mock.return_value = b'model'
+        self.lda.save_model('model', self.timeline, '111')
+        save_model_mock.assert_called_once_with(
+            '@test',
+            '111',
+            b'model',
+            {
+                'family': self.lda.get_model_family('@test'),
+                'newest_id': 2,
+                'n_documents': 2,
+                'base_documents': 2,
+            },
+        )
+
+    @pytest.mark.parametrize('exec_key, saved', [('111', False), ('222', True)])
+    @patch('src.classes.lda.LDA.save_model')
+    @patch('src.classes.lda.LDA.infer_model')
+    @patch('src.classes.lda.LDA.get_execution_key')
+    @patch('src.classes.lda.LDA.get_timeline')
+    def test_run_saves_new_models(
+        self,
+        get_timeline_mock,
+        get_execution_key_mock,
+        infer_model_mock,
+        save_model_mock,
+        exec_key,
+        saved,
+    ):
+        get_timeline_mock.return_value = self.timeline
+        get_execution_key_mock.return_value = exec_key
+        infer_model_mock.return_value = 'model'
+        with patch.object(MongoBackend, '__enter__', return_value=self.backend):
+            self.lda.run('@test')
+        assert save_model_mock.called is saved
+
+    def test_get_execution_key(self):
+        key = self.lda.get_execution_key(self.timeline)
+        assert key.startswith('@test-')
+        assert key == self.lda.get_execution_key(self.timeline)
+        lda = LDA(self.backend, use_bigrams=not self.lda.use_bigrams)
+        assert key != lda.get_execution_key(self.timeline)
+        lda = LDA(self.backend, engine=GibbsEngine())
+        assert key != lda.get_execution_key(self.timeline)
+        timeline = {**self.timeline, 'cleaned_tweets': []}
+        assert key != self.lda.get_execution_key(timeline)
+
     @patch('src.classes.lda.LDA.make_bigrams')
     @patch('src.classes.lda.LDA.make_bag_of_words')
     def test_prepare_data(self, make_bow_mock, make_bigrams_mock):
@@ -134,3 +243,119 @@ class TestLDA:
         self.lda.prepare_data(self.timeline)
         make_bow_mock.assert_called_once()
         make_bigrams_mock.assert_called_once()
+
+    def test_prepare_data_with_corpus_store(self, tmp_path):
+        lda = LDA(
+            self.backend, min_df=0, corpus_store=CorpusStore(str(tmp_path))
+        )
+        bow, dictionary = lda.prepare_data(self.timeline)
+        with patch('src.classes.lda.LDA.make_dictionary') as dictionary_mock:
+            cached_bow, cached_dictionary = lda.prepare_data(self.timeline)
+            assert not dictionary_mock.called
+        assert list(cached_bow) == list(bow)
+        assert cached_dictionary.token2id == dictionary.token2id
+
+
+@pytest.mark.unit
+class TestIncrementalLDA:
+    @classmethod
+    def setup_class(cls):
+        cls.backend = MongoBackend(
+            MONGO_URL, MONGO_PORT, MONGO_DB, USE_EXISTING_DATABASE
+        )
+        cls.lda = LDA(
+            cls.backend, n_topics=2, n_passes=2, min_df=0, incremental=True
+        )
+        words = ['futbol gol partit', 'python codi dades', 'gol futbol camp']
+        cls.tweets = [
+            {
+                'id': i,
+                'text': f'{words[i % 3]} paraula{i % 5}'
+                + (' novetat' if i > 25 else ''),
+            }
+            for i in range(1, 31)
+        ]
+
+    def get_timeline(self, n_tweets: int, models: dict = None) -> dict:
+        return {
+            'user': '@test',
+            'cleaned_tweets': self.tweets[:n_tweets],
+            'models': models or {},
+        }
+
+    def get_metadata(self, timeline: dict) -> dict:
+        with patch('src.classes.stores.ModelRegistry.save') as save_mock:
+            self.lda.save_model(self.model, timeline, 'base')
+        (_, _, model, metadata), _ = save_mock.call_args
+        self.serialized_model = model
+        return metadata
+
+    @patch('src.classes.lda.LDA.generate_html')
+    def test_update_model_with_new_tweets(self, generate_html_mock):
+        timeline = self.get_timeline(25)
+        self.model = self.lda.infer_model(timeline, 'base')
+        metadata = self.get_metadata(timeline)
+        assert metadata['base_documents'] == 25
+        timeline = self.get_timeline(30, {'base': metadata})
+        assert self.lda.can_update_model(timeline)
+        with patch(
+            'src.classes.stores.ModelRegistry.load',
+            return_value=self.serialized_model,
+        ), patch('src.classes.lda.LDA.prepare_data') as prepare_data_mock:
+            model = self.lda.infer_model(timeline, 'updated')
+        assert not prepare_data_mock.called
+        assert model.base_documents == 25
+        assert 'novetat' in model.id2word.token2id
+        assert model.state.sstats.shape[1] == len(model.id2word)
+        bow = generate_html_mock.call_args[0][1]
+        assert len(bow) == 30
+
+    def test_update_model_without_inline_report(self):
+        timeline = self.get_timeline(25)
+        with patch('src.classes.lda.LDA.generate_html'):
+            self.model = self.lda.infer_model(timeline, 'base')
+        timeline = self.get_timeline(30, {'base': self.get_metadata(timeline)})
+        lda = LDA(
+            self.backend,
+            n_topics=2,
+            n_passes=2,
+            min_df=0,
+            incremental=True,
+            reports=ReportGenerator(mode='background'),
+        )
+        with patch(
+            'src.classes.stores.ModelRegistry.load',
+            return_value=self.serialized_model,
+        ), patch('src.classes.lda.LDA.get_model_bow') as get_model_bow_mock:
+            model = lda.infer_model(timeline, 'updated')
+        assert not get_model_bow_mock.called
+        assert 'novetat' in model.id2word.token2id
+
+    def test_can_not_update_model_with_large_drift(self):
+        metadata = {
+            'family': self.lda.get_model_family('@test'),
+            'newest_id': 10,
+            'n_documents': 10,
+            'base_documents': 10,
+        }
+        timeline = self.get_timeline(20, {'base': metadata})
+        assert not self.lda.can_update_model(timeline)
+        timeline = self.get_timeline(12, {'base': metadata})
+        assert self.lda.can_update_model(timeline)
+
+    def test_can_not_update_model_of_other_settings(self):
+        metadata = {
+            'family': 'other',
+            'newest_id': 10,
+            'n_documents': 10,
+            'base_documents': 10,
+        }
+        assert not self.lda.can_update_model(
+            self.get_timeline(11, {'base': metadata})
+        )
+
+    def test_apply_known_bigrams(self):
+        lda = LDA(self.backend, use_bigrams=True)
+        dictionary = corpora.Dictionary([['new_york', 'a']])
+        tokens = lda.apply_known_bigrams(['a', 'new', 'york', 'b'], dictionary)
+        assert tokens == ['a', 'new_york', 'b']
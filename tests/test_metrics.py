@@ -0,0 +1,163 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+
+import pytest
+
+from src.classes.decorators import timeit
+from src.classes.executors import Executor
+from src.classes.metrics import BUCKETS, MetricsRegistry
+
+
+class Cleaner:
+    @timeit
+    def run(self, user: str, tweets: int = 3):
+        MetricsRegistry.count('tweets_in', tweets)
+
+
+cleaner = Cleaner()
+
+
+def get_values(metrics: dict, kind: str, name: str) -> dict:
+    return {
+        tuple(sorted(metric['labels'].items())): metric['value']
+        for metric in metrics[kind]
+        if metric['name'] == name
+    }
+
+
+@pytest.mark.unit
+class TestMetricsRegistry:
+    def setup_method(self):
+        MetricsRegistry.start()
+
+    def teardown_method(self):
+        MetricsRegistry.start()
+
+    def test_count_with_timer_labels(self):
+        MetricsRegistry.count('api_pages')
+        with MetricsRegistry.timer('download', 'vidamoderna'):
+            MetricsRegistry.count('api_pages', 2)
+            with MetricsRegistry.timer('page'):
+                MetricsRegistry.count('api_pages', reason='retry')
+        counters = get_values(
+            MetricsRegistry.snapshot(), 'counters', 'api_pages'
+        )
+        assert counters == {
+            (): 1,
+            (('stage', 'download'), ('user', 'vidamoderna')): 2,
+            (
+                ('reason', 'retry'),
+                ('stage', 'page'),
+                ('user', 'vidamoderna'),
+            ): 1,
+        }
+
+    def test_timer(self):
+        with MetricsRegistry.timer('clean', 'a'):
+            pass
+        metrics = MetricsRegistry.snapshot()
+        labels = (('stage', 'clean'), ('user', 'a'))
+        histogram = get_values(metrics, 'histograms', 'stage_seconds')[labels]
+        assert histogram['count'] == 1
+        assert histogram['buckets'][0] == 1
+        assert metrics['gauges'] == []
+
+    def test_flush(self, tmpdir):
+        path = str(tmpdir)
+        MetricsRegistry.start(path)
+        MetricsRegistry.count('tweets_in', 1)
+        MetricsRegistry.flush(10)
+        MetricsRegistry.count('tweets_in', 1)
+        MetricsRegistry.flush(10)
+        metrics = MetricsRegistry.collect(path)
+        assert get_values(metrics, 'counters', 'tweets_in') == {(): 1}
+        peak_memory = get_values(metrics, 'gauges', 'process_peak_memory_bytes')
+        assert peak_memory[()] > 0
+        MetricsRegistry.flush()
+        metrics = MetricsRegistry.collect(path)
+        assert get_values(metrics, 'counters', 'tweets_in') == {(): 2}
+
+    def test_observe(self):
+        for value in (0.001, 2, 10**6):
+            MetricsRegistry.observe('size', value)
+        histogram = get_values(MetricsRegistry.snapshot(), 'histograms', 'size')
+        histogram = histogram[()]
+        assert histogram['buckets'][0] == 1
+        assert histogram['buckets'][BUCKETS.index(5)] == 1
+        assert histogram['buckets'][-1] == 1
+        assert (histogram['min'], histogram['max']) == (0.001, 10**6)
+
+    def test_timeit(self):
+        cleaner.run('vidamoderna')
+        cleaner.run(user='joanfont', tweets=2)
+        counters = get_values(
+            MetricsRegistry.snapshot(), 'counters', 'tweets_in'
+        )
+        assert counters == {
+            (('stage', 'Cleaner.run'), ('user', 'vidamoderna')): 3,
+            (('stage', 'Cleaner.run'), ('user', 'joanfont')): 2,
+        }
+        assert Cleaner.run.__name__ == 'run'
+
+    def test_merge(self):
+        MetricsRegistry.count('tweets_in', 2, user='a')
+        MetricsRegistry.observe('stage_seconds', 1)
+        MetricsRegistry.set_max('peak_memory_bytes', 10)
+        first = MetricsRegistry.snapshot()
+        MetricsRegistry.start()
+        MetricsRegistry.count('tweets_in', 3, user='a')
+        MetricsRegistry.observe('stage_seconds', 100)
+        MetricsRegistry.set_max('peak_memory_bytes', 5)
+        merged = MetricsRegistry.merge([first, MetricsRegistry.snapshot()])
+        assert get_values(merged, 'counters', 'tweets_in') == {
+            (('user', 'a'),): 5
+        }
+        assert get_values(merged, 'gauges', 'peak_memory_bytes') == {(): 10}
+        histogram = get_values(merged, 'histograms', 'stage_seconds')[()]
+        assert histogram['count'] == 2
+        assert histogram['sum'] == 101
+        assert sum(histogram['buckets']) == 2
+
+    def test_to_prometheus(self):
+        MetricsRegistry.count('tweets_in', 2, stage='run', user='a"b')
+        MetricsRegistry.observe('stage_seconds', 0.2, stage='run')
+        text = MetricsRegistry.to_prometheus(MetricsRegistry.snapshot())
+        lines = text.splitlines()
+        assert '# TYPE profiler_tweets_in_total counter' in lines
+        assert 'profiler_tweets_in_total{stage="run",user="a\\"b"} 2' in lines
+        assert '# TYPE profiler_stage_seconds histogram' in lines
+        assert 'profiler_stage_seconds_bucket{le="0.1",stage="run"} 0' in lines
+        assert 'profiler_stage_seconds_bucket{le="0.5",stage="run"} 1' in lines
+        assert 'profiler_stage_seconds_bucket{le="+Inf",stage="run"} 1' in lines
+        assert 'profiler_stage_seconds_count{stage="run"} 1' in lines
+
+    def test_without_users(self):
+        MetricsRegistry.count('tweets_in', 2, stage='run', user='a')
+        MetricsRegistry.count('tweets_in', 3, stage='run', user='b')
+        metrics = MetricsRegistry.without_users(MetricsRegistry.snapshot())
+        assert get_values(metrics, 'counters', 'tweets_in') == {
+            (('stage', 'run'),): 5
+        }
+
+    @pytest.mark.parametrize('kind', ['process', 'thread'])
+    def test_export_from_workers(self, kind, tmpdir):
+        path = str(tmpdir)
+        MetricsRegistry.start(path, clean=True)
+        MetricsRegistry.count('tweets_in', 100)
+        Executor(2, kind, metrics_path=path).run(
+            cleaner.run, ['a', 'b', 'c'], tweets=4
+        )
+        MetricsRegistry.flush()
+        metrics = MetricsRegistry.export(path, 'Cleaner.run')
+        counters = get_values(metrics, 'counters', 'tweets_in')
+        assert counters[()] == 100
+        assert counters[(('stage', 'Cleaner.run'), ('user', 'b'))] == 4
+        assert get_values(metrics, 'counters', 'users') == {
+            (('stage', 'Cleaner.run'), ('status', 'done')): 3
+        }
+        with open(os.path.join(path, 'Cleaner.run.json')) as file:
+            assert json.load(file) == metrics
+        with open(os.path.join(path, 'Cleaner.run.prom')) as file:
+            assert 'user=' not in file.read()
@@ -1,8 +1,85 @@
 # -*- coding: UTF-8 -*-
 
+import random
+
 import pytest
+from mock import MagicMock
+
+from src.classes.exceptions import TimelineDoesNotExist
+from src.classes.executors import Executor
+from src.classes.languages import LanguageDetector
+from src.classes.preprocessors import MyPreprocessor, compile_cleaning_plan
 
-from src.classes.preprocessors import MyPreprocessor
+TWEETS = [
+    'Ouh mama @joanfont mira www.albertopou.herokuapp.com 😀',
+    'Escríbeme a test@test.com, son 15€ o $20!!!',
+    'Hay 3,200 tweets y 12.5 de media... -> 🇪🇸',
+    'zł5 a+@bob.com <-45 1.000.000 n0t3',
+    'RT @vidamoderna: ¿Qué? https://t.co/abc123',
+    '',
+]
+# Pieces of random tweets, with tokens of every step and the characters
+# around them
+TOKENS = [
+    'www.foo.es',
+    'https://t.co/a',
+    'ftp://x.org',
+    'www2.a.cat/p',
+    '.es',
+    '@bob',
+    'a@b.com',
+    '$',
+    '€',
+    'zł',
+    '12',
+    '3,200',
+    '1.5',
+    '😀',
+    '🇪🇸',
+    'the',
+    'RT',
+    'ñ',
+    ' ',
+    ' ',
+    '\n',
+    ':',
+    '?',
+    '=',
+    '<',
+    '>',
+    '@',
+    '-',
+    '.',
+    '/',
+    ',',
+    '!',
+    '[',
+    ')',
+    '\\',
+    '_',
+    '+',
+    '<-',
+    '->',
+]
+FLAG_PROBABILITIES = {
+    **{
+        f'{action}_{step}': probability
+        for step in (
+            'mentions',
+            'emails',
+            'currencies',
+            'urls',
+            'numbers',
+            'digits',
+            'emojis',
+        )
+        for action, probability in (('replace', 0.6), ('filter', 0.5))
+    },
+    'remove_punct': 0.8,
+    'remove_multiple_spaces': 0.8,
+    'to_lower': 0.8,
+    'filter_empty_rows': 0.5,
+}
 
 
 @pytest.mark.unit
@@ -118,3 +195,121 @@ class TestMyPreprocessor:
         text = 'casa azul'
         filtered_text = self.preprocessor.filter_stopwords(text)
         assert filtered_text == 'casa azul'
+
+    @pytest.mark.parametrize('seed', range(20))
+    def test_clean_timeline_matches_stepwise(self, seed):
+        rand = random.Random(seed)
+        texts = [
+            ''.join(rand.choices(TOKENS, k=rand.randint(1, 8)))
+            for _ in range(3000)
+        ]
+        kwargs = {
+            flag: rand.random() < probability
+            for flag, probability in FLAG_PROBABILITIES.items()
+        }
+        self.assert_matches_stepwise(texts, **kwargs)
+
+    @pytest.mark.parametrize(
+        'text', ['www.foo.es:$', 'www.foo.esthe?$', '-ftp://x.org?€']
+    )
+    def test_url_touching_replacement_matches_stepwise(self, text):
+        for filter_tokens in (True, False):
+            self.assert_matches_stepwise(
+                [text],
+                filter_currencies=filter_tokens,
+                filter_urls=filter_tokens,
+                # Only context free steps follow URLs
+                replace_numbers=False,
+            )
+
+    def assert_matches_stepwise(self, texts: list, **kwargs):
+        timeline = {
+            'user': '@test',
+            'tweets': [
+                {'id': i, 'created_at': '', 'text': text}
+                for i, text in enumerate(texts)
+            ],
+        }
+        kwargs = {'filter_stopwords': False, **kwargs}
+        result = self.preprocessor.clean_timeline(timeline, **kwargs)
+        expected = self.preprocessor.clean_timeline_stepwise(timeline, **kwargs)
+        assert result == expected
+
+    def test_clean_timeline_replacements(self):
+        timeline = {
+            'user': '@test',
+            'tweets': [{'id': 1, 'created_at': '', 'text': TWEETS[0]}],
+        }
+        result = self.preprocessor.clean_timeline(
+            timeline, filter_mentions=False, filter_stopwords=False
+        )
+        assert result['cleaned_tweets'][0]['text'] == 'ouh mama <mention> mira '
+
+    def test_compile_cleaning_plan_is_cached(self):
+        plan = compile_cleaning_plan(filter_stopwords=False)
+        assert plan is compile_cleaning_plan(filter_stopwords=False)
+
+    def test_clean_stream(self):
+        timeline = {
+            'user': '@test',
+            'tweets': [
+                {'id': i, 'created_at': '', 'text': text}
+                for i, text in enumerate(TWEETS)
+            ],
+        }
+        result = self.preprocessor.clean_stream(
+            iter(TWEETS), LanguageDetector('tweet'), filter_mentions=False
+        )
+        expected = self.preprocessor.clean_timeline(
+            timeline,
+            filter_mentions=False,
+            filter_empty_rows=False,
+            language_detector=LanguageDetector('tweet'),
+        )
+        assert list(result) == [
+            tweet['text'] for tweet in expected['cleaned_tweets']
+        ]
+
+    def test_clean_tweet_stream(self):
+        tweets = (
+            {'id': i, 'created_at': '', 'text': text}
+            for i, text in enumerate(TWEETS)
+        )
+        timeline = {'user': '@test', 'tweets': list(tweets)}
+        result = self.preprocessor.clean_tweet_stream(
+            iter(timeline['tweets']), filter_stopwords=False
+        )
+        assert not isinstance(result, list)
+        expected = self.preprocessor.clean_timeline(
+            timeline, filter_stopwords=False
+        )
+        assert list(result) == expected['cleaned_tweets']
+
+    def test_run_stream(self):
+        backend = MagicMock()
+        backend.__enter__.return_value = backend
+        backend.iter_tweets.return_value = iter(
+            [{'id': 1, 'created_at': '', 'text': TWEETS[0]}]
+        )
+        backend.write_tweets.side_effect = (
+            lambda user, field, tweets, size: len(list(tweets))
+        )
+        result = MyPreprocessor(backend).run(
+            '@test', stream=True, batch_size=10, filter_stopwords=False
+        )
+        assert result is None
+        backend.iter_tweets.assert_called_once_with('@test', 'tweets', 10)
+        (user, field, _, batch_size), _ = backend.write_tweets.call_args
+        assert (user, field, batch_size) == ('@test', 'cleaned_tweets', 10)
+
+    def test_run_without_timeline(self):
+        backend = MagicMock()
+        backend.__enter__.return_value = backend
+        backend.get_timeline.return_value = None
+        with pytest.raises(TimelineDoesNotExist):
+            MyPreprocessor(backend).run('@test')
+        results = Executor(1, 'thread').run(
+            MyPreprocessor(backend).run, ['@test']
+        )
+        assert results['@test']['status'].startswith('failed')
+        assert not backend.update_timeline.called
@@ -1,7 +1,10 @@
 # -*- coding: UTF-8 -*-
 
 import pytest
+import tweepy
+from mock import MagicMock, patch
 
+from src.classes.exceptions import UserDoesNotExist
 from src.classes.providers import TweepyProvider
 from src.settings import (
     TWITTER_ACCESS_TOKEN,
@@ -51,3 +54,34 @@ class TestTweepyProvider:
         tweet = Tweet(False, 'Ouh mama')
         result = self.provider.is_retweet(tweet)
         assert result is False
+
+    @patch('src.classes.rate_limits.RateLimitScheduler.acquire')
+    def test_download_page(self, acquire_mock):
+        pages = MagicMock()
+        pages.next.return_value = [Tweet(False, 'Ouh mama')]
+        page = self.provider.download_page(pages, '@test')
+        assert len(page) == 1
+        acquire_mock.assert_called_once()
+
+    @patch('src.classes.rate_limits.RateLimitScheduler.acquire')
+    def test_download_last_page(self, acquire_mock):
+        pages = MagicMock()
+        pages.next.side_effect = StopIteration
+        assert self.provider.download_page(pages, '@test') is None
+
+    @patch('src.classes.rate_limits.RateLimitScheduler.exhaust')
+    @patch('src.classes.rate_limits.RateLimitScheduler.acquire')
+    def test_download_page_rate_limited(self, acquire_mock, exhaust_mock):
+        pages = MagicMock()
+        pages.next.side_effect = [tweepy.RateLimitError('429'), []]
+        page = self.provider.download_page(pages, '@test', first=True)
+        assert page == []
+        exhaust_mock.assert_called_once()
+        assert acquire_mock.call_count == 2
+
+    @patch('src.classes.rate_limits.RateLimitScheduler.acquire')
+    def test_download_page_of_unknown_user(self, acquire_mock):
+        pages = MagicMock()
+        pages.next.side_effect = tweepy.TweepError('404')
+        with pytest.raises(UserDoesNotExist):
+            self.provider.download_page(pages, '@test', first=True)
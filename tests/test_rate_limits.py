@@ -0,0 +1,69 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+from mock import MagicMock, patch
+
+from src.classes.rate_limits import RateLimitScheduler
+
+
+def response(remaining, reset):
+    return MagicMock(
+        headers={
+            'x-rate-limit-remaining': str(remaining),
+            'x-rate-limit-reset': str(reset),
+        }
+    )
+
+
+@pytest.mark.unit
+class TestRateLimitScheduler:
+    @patch('time.time')
+    def test_acquire(self, time_mock):
+        time_mock.return_value = 100.0
+        scheduler = RateLimitScheduler(limit=2, window=10)
+        assert scheduler.acquire() == 0.0
+        assert scheduler.remaining == 1
+        assert scheduler.reset_at == 110.0
+
+    @patch('time.sleep')
+    @patch('time.time')
+    def test_acquire_waits_window_reset(self, time_mock, sleep_mock):
+        time_mock.return_value = 100.0
+        scheduler = RateLimitScheduler(limit=1, window=10)
+        scheduler.acquire()
+        sleep_mock.side_effect = lambda seconds: setattr(
+            time_mock, 'return_value', time_mock.return_value + seconds
+        )
+        time_mock.return_value = 104.0
+        assert scheduler.acquire() == 6.0
+        sleep_mock.assert_called_once_with(6.0)
+
+    @patch('time.time')
+    def test_update(self, time_mock):
+        time_mock.return_value = 100.0
+        scheduler = RateLimitScheduler(limit=900, window=900)
+        scheduler.acquire()
+        scheduler.update(response(10, 500))
+        assert scheduler.remaining == 10
+        assert scheduler.reset_at == 500.0
+
+    @patch('time.time')
+    def test_update_new_window(self, time_mock):
+        time_mock.return_value = 100.0
+        scheduler = RateLimitScheduler(limit=900, window=900)
+        scheduler.acquire()
+        scheduler.update(response(900, 2000))
+        assert scheduler.remaining == 900
+
+    def test_update_without_headers(self):
+        scheduler = RateLimitScheduler(limit=5)
+        scheduler.update(None)
+        assert scheduler.remaining == 5
+
+    @patch('time.time')
+    def test_exhaust(self, time_mock):
+        time_mock.return_value = 100.0
+        scheduler = RateLimitScheduler(limit=900, window=900)
+        scheduler.exhaust(response(0, 300))
+        assert scheduler.remaining == 0
+        assert scheduler.reset_at == 300.0
@@ -0,0 +1,87 @@
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+
+import pytest
+from gensim import corpora
+from gensim.models import LdaModel
+from mock import MagicMock, patch
+
+from src.classes.reports import ReportGenerator
+
+TEXTS = [['ouh', 'mama', 'ey'], ['ey', 'yo', 'mama'], ['ball', 'goal']] * 3
+
+
+class ReportWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def generate_report(self, user, key):
+        with open(os.path.join(self.path, key), 'w') as file:
+            file.write(user)
+
+
+@pytest.mark.unit
+class TestReportGenerator:
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            ReportGenerator(mode='eager')
+
+    def test_build(self, tmp_path):
+        reports = ReportGenerator(str(tmp_path))
+        dictionary = corpora.Dictionary(TEXTS)
+        bow = [dictionary.doc2bow(text) for text in TEXTS]
+        model = LdaModel(bow, id2word=dictionary, num_topics=2)
+        assert not reports.is_fresh('key')
+        reports.build('key', model, bow, dictionary)
+        html_path, data_path = reports.get_paths('key')
+        with open(data_path) as file:
+            data = file.read()
+        assert ', ' not in data
+        assert json.loads(data)['topic.order']
+        assert data in open(html_path).read()
+        assert reports.is_fresh('key')
+
+    @patch('src.classes.reports.ReportGenerator.prepare')
+    def test_build_from_cache(self, prepare_mock, tmp_path):
+        reports = ReportGenerator(str(tmp_path))
+        html_path, data_path = reports.get_paths('key')
+        with open(data_path, 'w') as file:
+            file.write('{"cached":1}')
+        assert reports.is_cached('key')
+        reports.build('key')
+        assert not prepare_mock.called
+        assert '{"cached":1}' in open(html_path).read()
+
+    def test_stale_report(self, tmp_path):
+        reports = ReportGenerator(str(tmp_path))
+        html_path, data_path = reports.get_paths('key')
+        for i, path in enumerate((html_path, data_path)):
+            open(path, 'w').close()
+            os.utime(path, (i, i))
+        assert not reports.is_fresh('key')
+        os.remove(data_path)
+        assert reports.is_fresh('key')
+
+    @patch('loguru.logger.warning')
+    def test_defer_without_process(self, warning_mock):
+        ReportGenerator(mode='background').defer('@test', 'key')
+        assert warning_mock.called
+        ReportGenerator(mode='lazy').defer('@test', 'key')
+        assert warning_mock.call_count == 1
+
+    def test_background(self, tmp_path):
+        reports = ReportGenerator(str(tmp_path), mode='background')
+        reports.start(ReportWriter(str(tmp_path)))
+        reports.defer('@a', 'a')
+        reports.defer('@b', 'b')
+        reports.stop()
+        assert open(tmp_path / 'a').read() == '@a'
+        assert open(tmp_path / 'b').read() == '@b'
+
+    def test_start_other_modes(self):
+        reports = ReportGenerator(mode='lazy')
+        reports.start(MagicMock())
+        reports.stop()
+        assert reports._process is None
@@ -0,0 +1,58 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+from mock import patch
+
+from src.classes.stopwords import StopwordRegistry
+
+
+@pytest.mark.unit
+class TestStopwordRegistry:
+    def setup_method(self):
+        StopwordRegistry.clear()
+
+    def test_get(self):
+        stopwords = StopwordRegistry.get('es')
+        assert isinstance(stopwords, frozenset)
+        assert 'nosotras' in stopwords
+
+    @patch('nltk.download', return_value=True)
+    @patch('src.classes.stopwords.StopwordRegistry.get_nltk_stopwords')
+    def test_download_missing_nltk_stopwords(self, nltk_mock, download_mock):
+        nltk_mock.side_effect = LookupError
+        with patch.object(StopwordRegistry, '_download_tried', False):
+            assert 'nosotras' in StopwordRegistry.get('es')
+            StopwordRegistry.get('en')
+        download_mock.assert_called_once_with('stopwords', quiet=True)
+        assert nltk_mock.call_count == 3
+
+    def test_get_unknown_language(self):
+        assert StopwordRegistry.get('xx') == frozenset()
+
+    @patch('src.classes.stopwords.StopwordRegistry.build')
+    def test_get_builds_once(self, build_mock):
+        build_mock.return_value = frozenset(['la'])
+        StopwordRegistry.get('es')
+        StopwordRegistry.get('es')
+        build_mock.assert_called_once_with('es')
+
+    @patch('src.classes.stopwords.StopwordRegistry.build')
+    def test_preload(self, build_mock):
+        build_mock.return_value = frozenset()
+        StopwordRegistry.preload(['es', 'en'])
+        assert build_mock.call_count == 2
+
+    def test_save_and_load_bundle(self, tmp_path):
+        path = str(tmp_path / 'stopwords.json')
+        StopwordRegistry.save_bundle(path)
+        StopwordRegistry.clear()
+        assert StopwordRegistry.load_bundle(path)
+        with patch(
+            'src.classes.stopwords.StopwordRegistry.build_from_packages'
+        ) as build_mock:
+            assert 'nosotras' in StopwordRegistry.get('es')
+            assert StopwordRegistry.get('xx') == build_mock.return_value
+            build_mock.assert_called_once_with('xx')
+
+    def test_load_missing_bundle(self, tmp_path):
+        assert not StopwordRegistry.load_bundle(str(tmp_path / 'missing'))
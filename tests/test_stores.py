@@ -0,0 +1,93 @@
+# -*- coding: UTF-8 -*-
+
+import os
+
+import pytest
+from gensim import corpora
+from mock import MagicMock
+
+from src.classes.stores import CorpusStore, ModelRegistry
+
+TEXTS = [['ouh', 'mama'], ['ey', 'yo', 'mama']]
+
+
+@pytest.mark.unit
+class TestCorpusStore:
+    def test_get_key(self):
+        key = CorpusStore.get_key(['ouh mama'], True, 0)
+        assert key == CorpusStore.get_key(['ouh mama'], True, 0)
+        assert key != CorpusStore.get_key(['ouh mama'], False, 0)
+        assert key != CorpusStore.get_key(['ouh', 'mama'], True, 0)
+
+    def test_load_without_corpus(self, tmp_path):
+        assert CorpusStore(str(tmp_path)).load('key') is None
+
+    def test_save_and_load(self, tmp_path):
+        store = CorpusStore(str(tmp_path))
+        dictionary = corpora.Dictionary(TEXTS)
+        bow = [dictionary.doc2bow(text) for text in TEXTS]
+        corpus, _ = store.save('key', iter(bow), dictionary)
+        assert list(corpus) == [
+            [(i, float(n)) for i, n in document] for document in bow
+        ]
+        corpus, loaded_dictionary = store.load('key')
+        assert len(corpus) == 2
+        assert loaded_dictionary.token2id == dictionary.token2id
+        assert not list(tmp_path.glob('*.tmp*'))
+
+    def test_load_from_memory(self, tmp_path):
+        store = CorpusStore(str(tmp_path))
+        dictionary = corpora.Dictionary(TEXTS)
+        prepared_data = store.save('key', [], dictionary)
+        assert store.load('key') is prepared_data
+
+    def test_memory_store(self):
+        store = CorpusStore(None, cache_size=1)
+        dictionary = corpora.Dictionary(TEXTS)
+        store.save('a', iter([[(0, 1)]]), dictionary)
+        assert store.load('a') == ([[(0, 1)]], dictionary)
+        store.save('b', iter([]), dictionary)
+        assert store.load('a') is None
+
+    def test_evict_least_recently_used(self, tmp_path):
+        store = CorpusStore(str(tmp_path), max_corpora=2, cache_size=0)
+        dictionary = corpora.Dictionary(TEXTS)
+        for i, key in enumerate(('a', 'b')):
+            store.save(key, [], dictionary)
+            os.utime(store.get_paths(key)[1], (i, i))
+        store.load('a')
+        store.save('c', [], dictionary)
+        assert store.exists('a')
+        assert not store.exists('b')
+        assert not list(tmp_path.glob('b.*'))
+
+
+@pytest.mark.unit
+class TestModelRegistry:
+    def test_get_key(self):
+        key = ModelRegistry.get_key('@test', ['ouh mama'], n_topics=5)
+        assert key == ModelRegistry.get_key('@test', ['ouh mama'], n_topics=5)
+        assert key != ModelRegistry.get_key('@test', ['ouh mama'], n_topics=6)
+        assert key != ModelRegistry.get_key('@test', ['ouh'], n_topics=5)
+
+    def test_save_does_not_evict(self):
+        backend = MagicMock()
+        ModelRegistry(backend, max_size=11).save('@a', 'new', b'model')
+        backend.save_model.assert_called_once_with('@a', 'new', b'model', None)
+        assert not backend.list_models.called
+
+    def test_evict_least_recently_used(self):
+        backend = MagicMock()
+        backend.__enter__.return_value = backend
+        backend.list_models.return_value = [
+            {'user': '@a', 'key': 'new', 'size': 6, 'last_used': 2},
+            {'user': '@a', 'key': 'old', 'size': 5, 'last_used': 0},
+            {'user': '@b', 'key': 'used', 'size': 5, 'last_used': 1},
+        ]
+        ModelRegistry(backend, max_size=11).evict()
+        backend.delete_model.assert_called_once_with('@a', 'old')
+
+    def test_evict_without_budget(self):
+        backend = MagicMock()
+        ModelRegistry(backend).evict()
+        assert not backend.list_models.called
@@ -0,0 +1,101 @@
+# -*- coding: UTF-8 -*-
+
+import pickle
+
+import pytest
+from gensim import corpora
+from mock import patch
+
+from src.classes.backends import MongoBackend
+from src.classes.sweeps import LDASweep, SharedCorpus
+from src.settings import MONGO_DB, MONGO_PORT, MONGO_URL, USE_EXISTING_DATABASE
+
+TEXTS = [
+    ['ouh', 'mama', 'ey'],
+    ['ey', 'yo', 'mama'],
+    ['ball', 'goal', 'match'],
+    ['goal', 'ball', 'team'],
+] * 5
+
+
+@pytest.mark.unit
+class TestSharedCorpus:
+    def test_create(self):
+        dictionary = corpora.Dictionary(TEXTS)
+        bow = [dictionary.doc2bow(text) for text in TEXTS]
+        corpus = SharedCorpus.create(iter(bow))
+        try:
+            assert len(corpus) == len(TEXTS)
+            assert list(corpus) == [
+                [(i, float(n)) for i, n in document] for document in bow
+            ]
+            attached = pickle.loads(pickle.dumps(corpus))
+            assert list(attached) == list(corpus)
+            attached.close()
+        finally:
+            corpus.unlink()
+
+    def test_create_empty(self):
+        corpus = SharedCorpus.create(iter([]))
+        assert list(corpus) == []
+        corpus.unlink()
+
+
+@pytest.mark.unit
+class TestLDASweep:
+    @classmethod
+    def setup_class(cls):
+        cls.backend = MongoBackend(
+            MONGO_URL, MONGO_PORT, MONGO_DB, USE_EXISTING_DATABASE
+        )
+        cls.timeline = {
+            'user': '@test',
+            'cleaned_tweets': [
+                {'id': i, 'text': ' '.join(text)}
+                for i, text in enumerate(TEXTS)
+            ],
+        }
+
+    def test_plan(self):
+        sweep = LDASweep(self.backend, topics=[2, 3], cpu_budget=8)
+        assert sweep.plan(2) == (2, 4)
+        assert sweep.plan(16) == (8, 1)
+        sweep.cpu_budget = 3
+        assert sweep.plan(2) == (2, 1)
+
+    def test_get_grid(self):
+        sweep = LDASweep(self.backend, topics=[2, 3], passes=[1, 5])
+        assert sweep.get_grid() == [(2, 1), (2, 5), (3, 1), (3, 5)]
+        assert (sweep.n_topics, sweep.n_passes) == (2, 1)
+
+    def test_sweep(self):
+        sweep = LDASweep(
+            self.backend, topics=[2, 3], passes=[2], cpu_budget=2, min_df=0
+        )
+        bow, dictionary = sweep.prepare_data(self.timeline)
+        results = sweep.sweep(bow, dictionary)
+        assert sorted(result['n_topics'] for result in results) == [2, 3]
+        for result in results:
+            assert result['model'].num_topics == result['n_topics']
+            assert result['perplexity'] > 0
+
+    def test_choose(self):
+        results = [
+            {'coherence': -2.0, 'perplexity': 10.0},
+            {'coherence': -1.0, 'perplexity': 30.0},
+            {'coherence': -1.0, 'perplexity': 20.0},
+        ]
+        assert LDASweep.choose(results) is results[2]
+        assert LDASweep.choose([]) is None
+
+    @patch('src.classes.lda.LDA.generate_html')
+    @patch('src.classes.lda.LDA.save_model')
+    def test_save_best(self, save_model_mock, generate_html_mock):
+        sweep = LDASweep(self.backend, topics=[2, 3], passes=[2])
+        best = {'n_topics': 3, 'n_passes': 2, 'model': type('Model', (), {})()}
+        sweep.save_best(best, self.timeline, [], None)
+        exec_key = save_model_mock.call_args[0][2]
+        lda = LDASweep(self.backend, topics=[3], passes=[2])
+        assert exec_key == lda.get_execution_key(self.timeline)
+        assert best['model'].base_documents == len(TEXTS)
+        assert sweep.n_topics == 2
@@ -0,0 +1,51 @@
+# -*- coding: UTF-8 -*-
+
+import pytest
+from mock import MagicMock
+
+from src.classes.timeline_downloader import TimelineDownloader
+
+
+@pytest.mark.unit
+class TestTimelineDownloader:
+    def setup_method(self):
+        self.provider = MagicMock()
+        self.provider.__enter__.return_value = self.provider
+        self.backend = MagicMock()
+        self.backend.__enter__.return_value = self.backend
+        self.downloader = TimelineDownloader(self.provider, self.backend)
+
+    def test_get_timeline_already_saved(self):
+        self.backend.exists_timeline.return_value = True
+        self.downloader.get_timeline('@test', save=True)
+        assert not self.provider.download_timeline.called
+
+    def test_get_timeline(self):
+        self.backend.exists_timeline.return_value = False
+        self.provider.download_timeline.return_value = {'tweets': [1]}
+        self.downloader.get_timeline('@test', save=True)
+        self.provider.download_timeline.assert_called_once()
+        self.backend.insert_timeline.assert_called_once_with({'tweets': [1]})
+
+    def test_refresh_timeline(self):
+        self.backend.exists_timeline.return_value = True
+        self.backend.get_newest_tweet_id.return_value = 111
+        self.provider.download_timeline.return_value = {'tweets': [112]}
+        self.downloader.get_timeline('@test', save=True, refresh=True)
+        self.provider.download_timeline.assert_called_once_with(
+            '@test', None, filter_rts=False, since_id=111
+        )
+        self.backend.append_tweets.assert_called_once_with('@test', [112])
+
+    def test_refresh_timeline_without_new_tweets(self):
+        self.backend.exists_timeline.return_value = True
+        self.provider.download_timeline.return_value = {'tweets': []}
+        self.downloader.get_timeline('@test', save=True, refresh=True)
+        assert not self.backend.append_tweets.called
+
+    def test_get_timeline_error(self):
+        self.backend.exists_timeline.return_value = False
+        self.provider.download_timeline.side_effect = ValueError('Not found')
+        with pytest.raises(ValueError):
+            self.downloader.get_timeline('@test', save=True)
+        assert not self.backend.insert_timeline.called